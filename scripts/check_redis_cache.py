@@ -0,0 +1,146 @@
+"""Check the shared Redis cache backend against a running server
+
+Exercises RedisCacheBackend the way replicas use it: several keys read in one
+pipelined round trip, entry lifetimes carried over from Redis into the local
+copy, and local copies dropped when another replica changes an entry, both
+through _apply_invalidation directly and over the invalidation channel. Any
+server speaking the Redis protocol works, e.g. one started with
+`docker run --rm -p 6379:6379 redis`. Keys are written under a throwaway
+namespace and removed afterwards.
+
+Usage:
+    python scripts/check_redis_cache.py [--url redis://localhost:6379/0]
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+import uuid
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+
+from src.config.settings import Config
+from src.api.cache_backends import RedisCacheBackend, close_cache_backends
+
+failures = []
+
+def check(label, condition, detail=""):
+    """Print the outcome of one check and remember failures"""
+    print(f"  {'ok  ' if condition else 'FAIL'} {label}{f' ({detail})' if detail and not condition else ''}")
+    if not condition:
+        failures.append(label)
+
+async def wait_until(condition, timeout=2.0):
+    """Poll condition until it holds or timeout seconds pass, returning whether it held"""
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        await asyncio.sleep(0.02)
+    return True
+
+async def check_pipeline_reads(backend):
+    print("Pipelined reads")
+    await backend.set_many({("a",): {"value": 1}, ("b",): [1, 2, 3], ("c",): "x" * 5000})
+    backend.forget(lambda key: key != ("a",))
+    
+    client = RedisCacheBackend._client()
+    original = client.pipeline
+    pipelines = []
+    def counting_pipeline(*args, **kwargs):
+        pipelines.append(kwargs)
+        return original(*args, **kwargs)
+    client.pipeline = counting_pipeline
+    shared_hits = backend.shared_hits
+    try:
+        values = await backend.get_many([("a",), ("b",), ("c",), ("missing",)], default="default")
+    finally:
+        client.pipeline = original
+    
+    check("values come back in key order", values == [{"value": 1}, [1, 2, 3], "x" * 5000, "default"], repr(values)[:80])
+    check("local misses are read in one pipeline", len(pipelines) == 1, f"{len(pipelines)} pipelines")
+    check("shared hits are counted", backend.shared_hits - shared_hits == 2, f"{backend.shared_hits - shared_hits} shared hits")
+    check("read entries are kept locally", backend._local.get(("b",)) == [1, 2, 3])
+
+async def check_ttl_propagation(backend):
+    print("TTL propagation")
+    await backend.set(("short",), "soon gone", ttl=1.0)
+    backend.forget(lambda key: key == ("short",))
+    check("entry is read back from Redis", await backend.get(("short",)) == "soon gone")
+    
+    entry = backend._local._entries.get(("short",))
+    remaining = entry[1] - time.monotonic() if entry else None
+    check("local copy expires with the shared entry", remaining is not None and 0 < remaining <= 1.0, f"expires in {remaining}")
+    await asyncio.sleep(1.2)
+    check("expired entry is gone everywhere", await backend.get(("short",), default="expired") == "expired")
+
+async def check_invalidation(namespace, reader):
+    print("Cross-replica invalidation")
+    origin = RedisCacheBackend._origin
+    
+    reader._local.set(("k",), "old")
+    RedisCacheBackend._apply_invalidation(json.dumps({"origin": origin, "namespace": namespace, "keys": [["k"]]}))
+    check("own messages are ignored", reader._local.get(("k",)) == "old")
+    RedisCacheBackend._apply_invalidation(json.dumps({"origin": "other", "namespace": f"{namespace}-other", "keys": [["k"]]}))
+    check("other namespaces are left alone", reader._local.get(("k",)) == "old")
+    RedisCacheBackend._apply_invalidation(b"not json")
+    check("malformed messages are ignored", reader._local.get(("k",)) == "old")
+    RedisCacheBackend._apply_invalidation(json.dumps({"origin": "other", "namespace": namespace, "keys": [["k"]]}).encode())
+    check("other replicas' changes drop the local copy", reader._local.get(("k",)) is None)
+    
+    # A second backend on the same namespace, posing as another replica
+    writer = RedisCacheBackend(namespace, ttl=reader.ttl)
+    writer._origin = uuid.uuid4().hex
+    RedisCacheBackend._namespaces[namespace] = reader
+    
+    await reader.set(("shared",), "v1")
+    # Give the invalidation listener time to subscribe
+    await asyncio.sleep(0.3)
+    await writer.set(("shared",), "v2")
+    dropped = await wait_until(lambda: ("shared",) not in reader._local._entries)
+    check("published writes drop the local copy", dropped)
+    check("next read returns the new value", await reader.get(("shared",)) == "v2")
+    
+    await writer.delete(("shared",))
+    dropped = await wait_until(lambda: ("shared",) not in reader._local._entries)
+    check("published deletes drop the local copy", dropped)
+    check("deleted entry is gone", await reader.get(("shared",), default="gone") == "gone")
+
+async def run():
+    namespace = f"check-{uuid.uuid4().hex[:8]}"
+    backend = RedisCacheBackend(namespace, ttl=600)
+    client = RedisCacheBackend._client()
+    try:
+        await client.ping()
+    except Exception as e:
+        print(f"Cannot reach {Config.CACHE_REDIS_URL}: {e}")
+        await close_cache_backends()
+        return False
+    
+    try:
+        await check_pipeline_reads(backend)
+        await check_ttl_propagation(backend)
+        await check_invalidation(namespace, backend)
+    finally:
+        keys = [backend._redis_key(key) for key in [("a",), ("b",), ("c",), ("short",), ("shared",)]]
+        await client.delete(*keys)
+        RedisCacheBackend._namespaces.pop(namespace, None)
+        await close_cache_backends()
+    return not failures
+
+def main():
+    parser = argparse.ArgumentParser(description="Check the Redis cache backend against a running server")
+    parser.add_argument("--url", default=Config.CACHE_REDIS_URL, help=f"Redis server to use (default: {Config.CACHE_REDIS_URL})")
+    args = parser.parse_args()
+    Config.CACHE_REDIS_URL = args.url
+    
+    passed = asyncio.run(run())
+    if failures:
+        print(f"{len(failures)} check(s) failed")
+    sys.exit(0 if passed else 1)
+
+if __name__ == "__main__":
+    main()
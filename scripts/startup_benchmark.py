@@ -0,0 +1,133 @@
+"""Measure the cold start latency of the MCP server over the stdio transport
+
+Each run launches a fresh server process, the way an assistant session does,
+and records the time until the initialize response and the first tools/list
+response arrive. With --first-call, it also times the first call of a tool
+against the configured Metabase, optionally after waiting for the connection
+warm-up (WARMUP_ENABLED) to finish.
+
+Usage:
+    python scripts/startup_benchmark.py [--runs N] [--importtime] [--first-call TOOL [--wait SECONDS]]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def send(process, message):
+    """Write one JSON-RPC message to the server"""
+    process.stdin.write((json.dumps(message) + "\n").encode())
+    process.stdin.flush()
+
+def receive(process, request_id):
+    """Read messages from the server until the response to request_id arrives"""
+    while True:
+        line = process.stdout.readline()
+        if not line:
+            raise RuntimeError("Server exited before responding")
+        # Skip anything else the server wrote to stdout, such as diagnostics
+        try:
+            message = json.loads(line)
+        except ValueError:
+            continue
+        if isinstance(message, dict) and message.get("id") == request_id:
+            return message
+
+def measure_once(first_call=None, wait=0.0):
+    """Start the server and return the seconds to initialize, to the first tool list and of the first tool call"""
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "src.server.mcp_server"],
+        cwd=PROJECT_ROOT,
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        send(process, {
+            "jsonrpc": "2.0", "id": 1, "method": "initialize",
+            "params": {
+                "protocolVersion": "2024-11-05",
+                "capabilities": {},
+                "clientInfo": {"name": "startup-benchmark", "version": "0.1.0"},
+            },
+        })
+        receive(process, 1)
+        initialized = time.perf_counter() - start
+        
+        send(process, {"jsonrpc": "2.0", "method": "notifications/initialized"})
+        send(process, {"jsonrpc": "2.0", "id": 2, "method": "tools/list"})
+        tools = receive(process, 2)["result"]["tools"]
+        listed = time.perf_counter() - start
+        
+        called = None
+        if first_call:
+            time.sleep(wait)
+            call_start = time.perf_counter()
+            send(process, {"jsonrpc": "2.0", "id": 3, "method": "tools/call", "params": {"name": first_call, "arguments": {}}})
+            receive(process, 3)
+            called = time.perf_counter() - call_start
+    finally:
+        process.kill()
+        process.wait()
+    return initialized, listed, called, len(tools)
+
+def report_import_times(limit=15):
+    """Print the modules with the highest cumulative import time"""
+    output = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import src.server.mcp_server"],
+        cwd=PROJECT_ROOT,
+        capture_output=True,
+        text=True,
+    ).stderr
+    rows = []
+    for line in output.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        # Lines look like "import time:  <self us> | <cumulative us> | <module>"
+        _, cumulative_us, module = line[len("import time:"):].split("|", 2)
+        rows.append((int(cumulative_us), module.strip()))
+    
+    print("\nSlowest imports (cumulative ms):")
+    for cumulative_us, module in sorted(rows, reverse=True)[:limit]:
+        print(f"  {cumulative_us / 1000:8.1f}  {module}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure MCP server time to first tool list")
+    parser.add_argument("--runs", type=int, default=10, help="Number of cold starts to measure (default: 10)")
+    parser.add_argument("--importtime", action="store_true", help="Also show the slowest module imports")
+    parser.add_argument("--first-call", metavar="TOOL", help="Also time the first call of a tool without arguments, e.g. list_databases")
+    parser.add_argument("--wait", type=float, default=0.0, help="Seconds to wait before the first call, e.g. for the warm-up (default: 0)")
+    args = parser.parse_args()
+    
+    # One untimed run so every run reads compiled bytecode from the cache
+    measure_once()
+    
+    initialize_times, list_times, call_times = [], [], []
+    for _ in range(args.runs):
+        initialized, listed, called, tool_count = measure_once(args.first_call, args.wait)
+        initialize_times.append(initialized * 1000)
+        list_times.append(listed * 1000)
+        if called is not None:
+            call_times.append(called * 1000)
+    
+    print(f"Cold starts: {args.runs}, tools listed: {tool_count}")
+    rows = [("initialize", initialize_times), ("first tools/list", list_times)]
+    if call_times:
+        rows.append((f"first {args.first_call}", call_times))
+    for label, samples in rows:
+        print(
+            f"  {label:<22} median {statistics.median(samples):7.1f} ms"
+            f"  min {min(samples):7.1f} ms  max {max(samples):7.1f} ms"
+        )
+    
+    if args.importtime:
+        report_import_times()
+
+if __name__ == "__main__":
+    main()
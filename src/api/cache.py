@@ -0,0 +1,61 @@
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional, Tuple
+
+class TTLCache:
+    """Small in-process cache with per-entry expiry and LRU eviction"""
+    
+    def __init__(self, ttl: float, max_entries: int = 1024):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+    
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Return the cached value for key, or default if missing or expired"""
+        entry = self._entries.get(key)
+        if entry is None or entry[1] < time.monotonic():
+            self.misses += 1
+            return default
+        
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[0]
+    
+    def get_stale(self, key: Hashable) -> Optional[Tuple[Any, float]]:
+        """Return (value, age in seconds) for key even if it expired, or None if it was evicted
+        
+        Used to keep serving data while its source is unavailable.
+        """
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        return entry[0], time.monotonic() - entry[2]
+    
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        """Store a value, evicting the least recently used entry when full"""
+        now = time.monotonic()
+        self._entries[key] = (value, now + (self.ttl if ttl is None else ttl), now)
+        self._entries.move_to_end(key)
+        
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+    
+    def delete(self, key: Hashable) -> None:
+        """Remove a single entry if present"""
+        self._entries.pop(key, None)
+    
+    def invalidate(self, predicate: Callable[[Hashable], bool]) -> int:
+        """Remove every entry whose key matches predicate, returning the count"""
+        keys = [key for key in self._entries if predicate(key)]
+        for key in keys:
+            del self._entries[key]
+        return len(keys)
+    
+    def clear(self) -> None:
+        """Remove all entries"""
+        self._entries.clear()
+    
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -0,0 +1,290 @@
+import asyncio
+import json
+import uuid
+import zlib
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Optional, Tuple
+from src.config.settings import Config
+from src.api.cache import TTLCache
+
+# Optional fast JSON library; the standard library is used when missing
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Encoded values at least this large are compressed
+COMPRESS_THRESHOLD = 1024
+
+def encode_value(value: Any) -> bytes:
+    """Serialize a JSON-compatible value compactly, compressing large payloads
+    
+    The first byte tells how the rest is encoded: b"j" for plain JSON and
+    b"z" for zlib-compressed JSON.
+    """
+    if orjson is not None:
+        data = orjson.dumps(value)
+    else:
+        data = json.dumps(value, separators=(",", ":")).encode()
+    if len(data) >= COMPRESS_THRESHOLD:
+        return b"z" + zlib.compress(data, 1)
+    return b"j" + data
+
+def decode_value(data: bytes) -> Any:
+    """Deserialize a value written by encode_value"""
+    body = zlib.decompress(data[1:]) if data[:1] == b"z" else data[1:]
+    return orjson.loads(body) if orjson is not None else json.loads(body)
+
+class CacheBackend:
+    """Interface of the metadata and query result caches
+    
+    Keys are tuples of strings and numbers, values must be JSON-compatible
+    so shared backends can serialize them. Writes and deletes made through a
+    shared backend are published, so every replica drops its outdated copy.
+    """
+    
+    # Whether entries are shared with other server processes
+    shared = False
+    
+    async def get(self, key: Hashable, default: Any = None) -> Any:
+        """Return the cached value for key, or default if missing or expired"""
+        return (await self.get_many([key], default))[0]
+    
+    async def get_many(self, keys: List[Hashable], default: Any = None) -> List[Any]:
+        """Return the cached values for several keys, with default for each missing one"""
+        raise NotImplementedError
+    
+    def get_stale(self, key: Hashable) -> Optional[Tuple[Any, float]]:
+        """Return (value, age in seconds) of the local copy of key even if it expired, or None"""
+        raise NotImplementedError
+    
+    async def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        """Store a value"""
+        await self.set_many({key: value}, ttl)
+    
+    async def set_many(self, items: Dict[Hashable, Any], ttl: Optional[float] = None) -> None:
+        """Store several values at once"""
+        raise NotImplementedError
+    
+    async def delete(self, key: Hashable) -> None:
+        """Remove a single entry"""
+        raise NotImplementedError
+    
+    def forget(self, predicate: Callable[[Hashable], bool]) -> int:
+        """Drop the local copies of every entry whose key matches predicate, returning the count"""
+        raise NotImplementedError
+    
+    def stats(self) -> Dict[str, int]:
+        """Return the number of cache hits and misses so far"""
+        raise NotImplementedError
+
+class MemoryCacheBackend(CacheBackend):
+    """Cache held in this process only"""
+    
+    def __init__(self, ttl: float, max_entries: int = 1024):
+        self._cache = TTLCache(ttl=ttl, max_entries=max_entries)
+    
+    async def get_many(self, keys: List[Hashable], default: Any = None) -> List[Any]:
+        return [self._cache.get(key, default) for key in keys]
+    
+    def get_stale(self, key: Hashable) -> Optional[Tuple[Any, float]]:
+        return self._cache.get_stale(key)
+    
+    async def set_many(self, items: Dict[Hashable, Any], ttl: Optional[float] = None) -> None:
+        for key, value in items.items():
+            self._cache.set(key, value, ttl)
+    
+    async def delete(self, key: Hashable) -> None:
+        self._cache.delete(key)
+    
+    def forget(self, predicate: Callable[[Hashable], bool]) -> int:
+        return self._cache.invalidate(predicate)
+    
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self._cache.hits, "misses": self._cache.misses}
+
+class RedisCacheBackend(CacheBackend):
+    """Cache shared by all replicas through a server speaking the Redis protocol
+    
+    Recently used entries are also kept in a local cache, so repeated reads do
+    not go over the network. Every write and delete is published on an
+    invalidation channel and the other replicas drop their local copy, so the
+    next read there picks up the new value. Needs the optional redis package.
+    When the server cannot be reached the local copies keep working.
+    """
+    
+    shared = True
+    
+    # Redis clients and invalidation listeners keyed by event loop, shared by every namespace
+    _clients: Dict[asyncio.AbstractEventLoop, Any] = {}
+    _listeners: Dict[asyncio.AbstractEventLoop, asyncio.Task] = {}
+    
+    # Backends keyed by namespace, so published invalidations reach the right local cache
+    _namespaces: Dict[str, "RedisCacheBackend"] = {}
+    
+    # Identifies this process, so it ignores its own invalidation messages
+    _origin = uuid.uuid4().hex
+    
+    def __init__(self, namespace: str, ttl: float, max_entries: int = 1024):
+        self.namespace = namespace
+        self.ttl = ttl
+        self._local = TTLCache(ttl=ttl, max_entries=max_entries)
+        # Local misses that were then found in Redis
+        self.shared_hits = 0
+        self._prefix = f"{Config.CACHE_KEY_PREFIX}:{namespace}:"
+        RedisCacheBackend._namespaces[namespace] = self
+    
+    @staticmethod
+    def channel() -> str:
+        """Return the channel invalidations are published on"""
+        return f"{Config.CACHE_KEY_PREFIX}:invalidate"
+    
+    def _redis_key(self, key: Hashable) -> str:
+        """Turn a tuple key into a Redis key"""
+        return self._prefix + json.dumps(list(key), separators=(",", ":"))
+    
+    @classmethod
+    def _client(cls):
+        """Return the Redis client of the running event loop, starting its invalidation listener
+        
+        Clients of event loops that have since closed are dropped, since the web
+        interface runs each request in its own loop.
+        """
+        loop = asyncio.get_running_loop()
+        client = cls._clients.get(loop)
+        if client is None:
+            # Imported here so the dependency is only needed when the backend is used
+            import redis.asyncio as redis
+            
+            for stale in [stale for stale in cls._clients if stale.is_closed()]:
+                cls._clients.pop(stale)
+                cls._listeners.pop(stale, None)
+            client = redis.Redis.from_url(Config.CACHE_REDIS_URL)
+            cls._clients[loop] = client
+            cls._listeners[loop] = loop.create_task(cls._listen(client))
+        return client
+    
+    @classmethod
+    async def _listen(cls, client) -> None:
+        """Drop local copies of entries other replicas changed, reconnecting after errors"""
+        while True:
+            try:
+                pubsub = client.pubsub(ignore_subscribe_messages=True)
+                await pubsub.subscribe(cls.channel())
+                try:
+                    async for message in pubsub.listen():
+                        cls._apply_invalidation(message.get("data"))
+                finally:
+                    await pubsub.aclose()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Cache invalidation listener failed: {e}; reconnecting")
+                await asyncio.sleep(1)
+    
+    @classmethod
+    def _apply_invalidation(cls, data: Any) -> None:
+        """Drop the local copies named in an invalidation message"""
+        try:
+            message = json.loads(data)
+        except (TypeError, ValueError):
+            return
+        if message.get("origin") == cls._origin:
+            return
+        backend = cls._namespaces.get(message.get("namespace"))
+        if backend is not None:
+            for key in message.get("keys", []):
+                backend._local.delete(tuple(key))
+    
+    async def _publish(self, client, keys: Iterable[Hashable]) -> None:
+        """Tell the other replicas to drop their local copies of keys"""
+        message = {"origin": self._origin, "namespace": self.namespace, "keys": [list(key) for key in keys]}
+        await client.publish(self.channel(), json.dumps(message, separators=(",", ":")))
+    
+    async def get_many(self, keys: List[Hashable], default: Any = None) -> List[Any]:
+        values = [self._local.get(key) for key in keys]
+        missing = [index for index, value in enumerate(values) if value is None]
+        if not missing:
+            return values
+        
+        try:
+            async with self._client().pipeline(transaction=False) as pipe:
+                for index in missing:
+                    redis_key = self._redis_key(keys[index])
+                    pipe.get(redis_key).pttl(redis_key)
+                replies = await pipe.execute()
+        except Exception as e:
+            print(f"Shared cache read failed: {e}")
+            replies = [None, None] * len(missing)
+        
+        for index, data, remaining_ms in zip(missing, replies[::2], replies[1::2]):
+            if data is None:
+                values[index] = default
+                continue
+            values[index] = decode_value(data)
+            self.shared_hits += 1
+            # Keep the local copy no longer than the shared entry lives
+            self._local.set(keys[index], values[index], remaining_ms / 1000 if remaining_ms and remaining_ms > 0 else self.ttl)
+        return values
+    
+    def get_stale(self, key: Hashable) -> Optional[Tuple[Any, float]]:
+        return self._local.get_stale(key)
+    
+    async def set_many(self, items: Dict[Hashable, Any], ttl: Optional[float] = None) -> None:
+        ttl = self.ttl if ttl is None else ttl
+        for key, value in items.items():
+            self._local.set(key, value, ttl)
+        if not items or ttl <= 0:
+            return
+        
+        try:
+            client = self._client()
+            async with client.pipeline(transaction=False) as pipe:
+                for key, value in items.items():
+                    pipe.set(self._redis_key(key), encode_value(value), px=int(ttl * 1000))
+                await pipe.execute()
+            await self._publish(client, items)
+        except Exception as e:
+            print(f"Shared cache write failed: {e}")
+    
+    async def delete(self, key: Hashable) -> None:
+        self._local.delete(key)
+        try:
+            client = self._client()
+            await client.delete(self._redis_key(key))
+            await self._publish(client, [key])
+        except Exception as e:
+            print(f"Shared cache delete failed: {e}")
+    
+    def forget(self, predicate: Callable[[Hashable], bool]) -> int:
+        return self._local.invalidate(predicate)
+    
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self._local.hits + self.shared_hits, "misses": self._local.misses - self.shared_hits}
+    
+    @classmethod
+    async def close(cls) -> None:
+        """Stop the invalidation listener and close the Redis client of the running event loop"""
+        loop = asyncio.get_running_loop()
+        listener = cls._listeners.pop(loop, None)
+        if listener is not None:
+            listener.cancel()
+            try:
+                await listener
+            except asyncio.CancelledError:
+                pass
+        client = cls._clients.pop(loop, None)
+        if client is not None:
+            await client.aclose()
+
+def create_cache_backend(namespace: str, ttl: float, max_entries: int = 1024) -> CacheBackend:
+    """Create the cache backend selected by Config.CACHE_BACKEND ("memory" or "redis")"""
+    if Config.CACHE_BACKEND == "redis":
+        return RedisCacheBackend(namespace, ttl, max_entries)
+    if Config.CACHE_BACKEND != "memory":
+        print(f"Unknown CACHE_BACKEND {Config.CACHE_BACKEND!r}, using the in-process cache")
+    return MemoryCacheBackend(ttl, max_entries)
+
+async def close_cache_backends() -> None:
+    """Release the connections of shared cache backends"""
+    if RedisCacheBackend._clients:
+        await RedisCacheBackend.close()
@@ -0,0 +1,189 @@
+import re
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Tuple
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+# Parameter types for template tags bound as plain variables rather than field filters
+VARIABLE_TAG_TYPES = {"text": "category", "number": "number/=", "date": "date/single", "boolean": "category"}
+
+def _tokens(text: Optional[str]) -> List[str]:
+    """Split text into lowercase alphanumeric search tokens"""
+    return _TOKEN.findall((text or "").lower())
+
+class CardParameter:
+    """A parameter a saved question accepts, with the target Metabase binds its value to"""
+    
+    __slots__ = ("slug", "name", "type", "target", "required", "default")
+    
+    def __init__(self, slug, name, type, target, required=False, default=None):
+        self.slug = slug
+        self.name = name
+        self.type = type
+        self.target = target
+        self.required = required
+        self.default = default
+    
+    @classmethod
+    def from_card(cls, card: Dict) -> List["CardParameter"]:
+        """Read a card's parameters, falling back to its template tags on older Metabase versions"""
+        tags = ((card.get('dataset_query') or {}).get('native') or {}).get('template-tags') or {}
+        parameters = []
+        for parameter in card.get('parameters') or []:
+            tag = tags.get(parameter.get('slug')) or {}
+            parameters.append(cls(
+                parameter.get('slug'),
+                parameter.get('name') or parameter.get('slug'),
+                parameter.get('type'),
+                parameter.get('target'),
+                bool(parameter.get('required') or tag.get('required')),
+                parameter.get('default', tag.get('default')),
+            ))
+        if parameters:
+            return parameters
+        
+        for name, tag in tags.items():
+            if tag.get('type') == 'card':
+                continue
+            kind = "variable" if tag.get('type') in VARIABLE_TAG_TYPES else "dimension"
+            parameters.append(cls(
+                name,
+                tag.get('display-name') or name,
+                tag.get('widget-type') or VARIABLE_TAG_TYPES.get(tag.get('type'), "category"),
+                [kind, ["template-tag", name]],
+                bool(tag.get('required')),
+                tag.get('default'),
+            ))
+        return parameters
+
+class CardRecord:
+    """Compact representation of a saved question, keeping what search and execution need"""
+    
+    __slots__ = ("id", "name", "description", "collection", "database_id", "display", "query_type", "parameters", "updated_at")
+    
+    def __init__(self, id, name, description, collection, database_id, display, query_type, parameters: List[CardParameter], updated_at):
+        self.id = id
+        self.name = name
+        self.description = description
+        self.collection = collection
+        self.database_id = database_id
+        self.display = display
+        self.query_type = query_type
+        self.parameters = parameters
+        self.updated_at = updated_at
+    
+    @classmethod
+    def from_metadata(cls, card: Dict) -> "CardRecord":
+        """Build a record from a card dict in a Metabase /api/card response"""
+        return cls(
+            card.get('id'),
+            card.get('name'),
+            card.get('description'),
+            (card.get('collection') or {}).get('name') or "Our analytics",
+            card.get('database_id'),
+            card.get('display'),
+            card.get('query_type') or (card.get('dataset_query') or {}).get('type'),
+            CardParameter.from_card(card),
+            card.get('updated_at'),
+        )
+    
+    def bind_parameters(self, values: Dict[str, Any]) -> List[Dict]:
+        """Turn values keyed by parameter slug or name into the parameter list of a card query
+        
+        Raises:
+            ValueError: If a value names an unknown parameter or a required one is missing
+        """
+        by_key = {}
+        for parameter in self.parameters:
+            by_key[parameter.slug.lower()] = parameter
+            by_key[(parameter.name or parameter.slug).lower()] = parameter
+        
+        bound = {}
+        for key, value in (values or {}).items():
+            parameter = by_key.get(str(key).lower())
+            if parameter is None:
+                available = ", ".join(parameter.slug for parameter in self.parameters) or "none"
+                raise ValueError(f"Card {self.id} has no parameter '{key}'. Available parameters: {available}")
+            bound[parameter.slug] = value
+        
+        missing = [p.slug for p in self.parameters if p.required and p.slug not in bound and p.default is None]
+        if missing:
+            raise ValueError(f"Card {self.id} requires parameter(s): {', '.join(missing)}")
+        
+        return [
+            {"type": parameter.type, "target": parameter.target, "value": bound[parameter.slug]}
+            for parameter in self.parameters if parameter.slug in bound
+        ]
+
+class CardCatalog:
+    """All saved questions of a Metabase instance with an inverted index over names and descriptions"""
+    
+    # Name matches rank above description matches
+    NAME_WEIGHT = 3
+    DESCRIPTION_WEIGHT = 1
+    
+    def __init__(self, cards: List[CardRecord]):
+        self.cards: Dict[int, CardRecord] = {card.id: card for card in cards}
+        self.loaded_at = time.time()
+        # Set while the catalog is served because Metabase could not be reached
+        self.stale = False
+        self._index: Dict[str, Dict[int, int]] = defaultdict(dict)
+        for card in cards:
+            for weight, text in ((self.NAME_WEIGHT, card.name), (self.DESCRIPTION_WEIGHT, card.description)):
+                for token in _tokens(text):
+                    postings = self._index[token]
+                    postings[card.id] = max(postings.get(card.id, 0), weight)
+        self._sorted_tokens = sorted(self._index)
+    
+    def stale_age(self) -> Optional[float]:
+        """Return the seconds since the catalog was fetched if it is stale, else None"""
+        return time.time() - self.loaded_at if self.stale else None
+    
+    def _matching_tokens(self, prefix: str) -> List[str]:
+        """Return the indexed tokens starting with prefix, using binary search over the sorted tokens"""
+        tokens = self._sorted_tokens
+        index = bisect_left(tokens, prefix)
+        matches = []
+        while index < len(tokens) and tokens[index].startswith(prefix):
+            matches.append(tokens[index])
+            index += 1
+        return matches
+    
+    def search(self, query: str, limit: int = 10) -> List[Tuple[CardRecord, int]]:
+        """Rank cards by how many query terms match their name or description
+        
+        Every term must match a token, by prefix, in the name or description.
+        Returns (card, score) pairs, best first.
+        """
+        terms = _tokens(query)
+        if not terms:
+            return []
+        
+        scores: Optional[Dict[int, int]] = None
+        for term in terms:
+            term_scores: Dict[int, int] = {}
+            for token in self._matching_tokens(term):
+                # An exact token match counts double a prefix match
+                bonus = 2 if token == term else 1
+                for card_id, weight in self._index[token].items():
+                    term_scores[card_id] = max(term_scores.get(card_id, 0), weight * bonus)
+            if scores is None:
+                scores = term_scores
+            else:
+                scores = {card_id: score + term_scores[card_id] for card_id, score in scores.items() if card_id in term_scores}
+            if not scores:
+                return []
+        
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], self.cards[item[0]].name or ""))
+        return [(self.cards[card_id], score) for card_id, score in ranked[:limit]]
+    
+    def filter(self, database_id: Optional[int] = None, collection: Optional[str] = None) -> List[CardRecord]:
+        """Return the cards of a database and/or collection, sorted by collection and name"""
+        cards = [
+            card for card in self.cards.values()
+            if (database_id is None or card.database_id == database_id)
+            and (collection is None or (card.collection or "").lower() == collection.lower())
+        ]
+        return sorted(cards, key=lambda card: (card.collection or "", card.name or ""))
@@ -0,0 +1,138 @@
+import re
+import time
+from typing import Any, Dict, Tuple
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half-open"
+
+# Endpoint classes get separate breakers, so slow warehouse queries cannot
+# take metadata browsing down with them or the other way round
+_QUERY_ENDPOINT = re.compile(r"^(dataset|card/\d+/query)")
+_ACTION_ENDPOINT = re.compile(r"^action/\d+/execute")
+
+def endpoint_class(endpoint: str) -> str:
+    """Classify an API endpoint as "query", "action" or "metadata" """
+    endpoint = endpoint.lstrip('/')
+    if _QUERY_ENDPOINT.match(endpoint):
+        return "query"
+    if _ACTION_ENDPOINT.match(endpoint):
+        return "action"
+    return "metadata"
+
+def is_outage(response: Any, include_timeouts: bool = True) -> bool:
+    """Check whether a response means Metabase itself is unreachable or failing
+    
+    Connection failures, 5xx responses and open circuits count; 4xx responses
+    are the caller's fault and do not. Timeouts can be excluded for endpoints
+    where a slow query is more likely than a slow Metabase.
+    """
+    if not isinstance(response, dict) or "error" not in response:
+        return False
+    error = str(response.get("error"))
+    if error in ("Circuit open", "Failed to make request"):
+        return True
+    if error == "Timeout":
+        return include_timeouts
+    return error.startswith("HTTP error: 5")
+
+# Responses of a proxy or load balancer in front of an unavailable Metabase
+_GATEWAY_ERRORS = ("HTTP error: 502", "HTTP error: 503", "HTTP error: 504")
+
+def is_unreachable(response: Any, include_timeouts: bool = True) -> bool:
+    """Check whether a response means Metabase could not be reached at all
+    
+    Only connection failures, gateway errors and optionally timeouts count.
+    Unlike is_outage, an ordinary 500 does not: Metabase answered, and one
+    broken endpoint must not make every request of its class fail fast.
+    """
+    if not isinstance(response, dict) or "error" not in response:
+        return False
+    error = str(response.get("error"))
+    if error == "Timeout":
+        return include_timeouts
+    return error == "Failed to make request" or error in _GATEWAY_ERRORS
+
+class CircuitBreaker:
+    """Consecutive-failure circuit breaker for one Metabase instance and endpoint class
+    
+    After failure_threshold consecutive outages the circuit opens and calls
+    fail fast. Once reset_timeout seconds have passed a single probe request
+    is let through (half-open): its success closes the circuit, its failure
+    opens it for another reset_timeout.
+    """
+    
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probing = False
+    
+    @property
+    def retry_after(self) -> float:
+        """Seconds until the next probe is allowed, 0 if requests may be sent now"""
+        if self.state != OPEN:
+            return 0.0
+        return max(self.opened_at + self.reset_timeout - time.monotonic(), 0.0)
+    
+    def allow(self) -> bool:
+        """Check whether a request may be sent, claiming the probe slot when half-open"""
+        if self.state == OPEN and self.retry_after == 0:
+            self.state = HALF_OPEN
+        if self.state == HALF_OPEN:
+            if self._probing:
+                return False
+            self._probing = True
+            return True
+        return self.state == CLOSED
+    
+    def record_success(self) -> None:
+        """Close the circuit after a request reached Metabase"""
+        if self.state != CLOSED:
+            print("Metabase is reachable again, closing circuit")
+        self.state = CLOSED
+        self.failures = 0
+        self._probing = False
+    
+    def record_failure(self) -> None:
+        """Count an outage, opening the circuit at the threshold or when a probe fails"""
+        self.failures += 1
+        self._probing = False
+        if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+            if self.state != OPEN:
+                print(f"Opening circuit after {self.failures} consecutive failures; retrying in {self.reset_timeout:g}s")
+            self.state = OPEN
+            self.opened_at = time.monotonic()
+    
+    def record_abandoned(self) -> None:
+        """Release the probe slot of a request that was cancelled before it finished"""
+        self._probing = False
+
+class CircuitBreakerRegistry:
+    """Circuit breakers keyed by (metabase_url, endpoint class), created on first use"""
+    
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._breakers: Dict[Tuple[str, str], CircuitBreaker] = {}
+    
+    def get(self, metabase_url: str, endpoint_kind: str) -> CircuitBreaker:
+        """Return the breaker of a Metabase instance and endpoint class"""
+        key = (metabase_url, endpoint_kind)
+        breaker = self._breakers.get(key)
+        if breaker is None:
+            breaker = CircuitBreaker(self.failure_threshold, self.reset_timeout)
+            self._breakers[key] = breaker
+        return breaker
+    
+    def is_open(self, metabase_url: str, endpoint_kind: str = "metadata") -> bool:
+        """Check whether requests of an endpoint class are currently failing fast"""
+        breaker = self._breakers.get((metabase_url, endpoint_kind))
+        return breaker is not None and breaker.state != CLOSED
+    
+    def discard(self, metabase_url: str) -> None:
+        """Forget the breakers of a Metabase instance"""
+        for key in [key for key in self._breakers if key[0] == metabase_url]:
+            del self._breakers[key]
@@ -0,0 +1,140 @@
+import asyncio
+import contextvars
+import json
+from typing import Any, Callable
+from src.config.settings import Config
+from src.api.tracing import span
+
+# Optional fast JSON library; the standard library is used when missing
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Optional streaming parser, imported on first use since most sessions never stream
+_ijson = None
+
+# Receives the result rows of a dataset response as they are parsed, instead of keeping them in
+# the decoded response; set by callers that only need the rows one at a time
+row_consumer: contextvars.ContextVar = contextvars.ContextVar("row_consumer", default=None)
+
+def _load_ijson():
+    """Import ijson on first use, returning None if it is not installed"""
+    global _ijson
+    if _ijson is None:
+        try:
+            import ijson
+        except ImportError:
+            ijson = False
+        _ijson = ijson
+    return _ijson or None
+
+def select_decoder(name: str) -> Callable[[bytes], Any]:
+    """Return the JSON decode function for a decoder name ("auto", "orjson" or "json")"""
+    if name in ("auto", "orjson") and orjson is not None:
+        return orjson.loads
+    if name == "orjson":
+        print("JSON_DECODER is set to orjson but it is not installed, falling back to json")
+    return json.loads
+
+json_loads = select_decoder(Config.JSON_DECODER)
+
+async def decode_json(body: bytes) -> Any:
+    """Decode a JSON body, moving large payloads off the event loop
+    
+    Bodies of at least Config.JSON_THREAD_THRESHOLD bytes are decoded in a
+    worker thread so other concurrent tool calls keep running meanwhile.
+    """
+    if len(body) < Config.JSON_THREAD_THRESHOLD:
+        return json_loads(body)
+    
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, json_loads, body)
+
+async def decode_response(response) -> Any:
+    """Decode the JSON body of a streamed httpx response
+    
+    With Config.JSON_STREAM_DECODE enabled and ijson installed, large or
+    unsized bodies are parsed incrementally as chunks arrive instead of being
+    buffered and decoded in one blocking step. While row_consumer is set and
+    ijson is installed, result rows are passed to it as they are parsed and
+    the decoded response keeps an empty "rows" list.
+    
+    Raises:
+        ValueError: If the body is not valid JSON
+    """
+    consume_row = row_consumer.get()
+    if consume_row is not None:
+        ijson = _load_ijson()
+        if ijson is not None:
+            with span("json.decode", **{"json.mode": "rows"}):
+                return await _decode_row_stream(response, ijson, consume_row)
+    
+    content_length = response.headers.get("content-length")
+    is_large = content_length is None or int(content_length) >= Config.JSON_THREAD_THRESHOLD
+    
+    if Config.JSON_STREAM_DECODE and is_large:
+        ijson = _load_ijson()
+        if ijson is not None:
+            # Streamed parsing overlaps with reading the body, so the span includes network time
+            with span("json.decode", **{"json.mode": "stream"}):
+                return await _decode_stream(response, ijson)
+    
+    body = await response.aread()
+    threaded = len(body) >= Config.JSON_THREAD_THRESHOLD
+    with span("json.decode", **{"json.mode": "thread" if threaded else "inline", "json.bytes": len(body)}):
+        return await decode_json(body)
+
+async def _decode_stream(response, ijson) -> Any:
+    """Incrementally parse a streamed response body with ijson"""
+    documents = ijson.sendable_list()
+    parser = ijson.items_coro(documents, "", use_float=True)
+    try:
+        async for chunk in response.aiter_bytes():
+            parser.send(chunk)
+            # Yield to the event loop between chunks so other requests make progress
+            await asyncio.sleep(0)
+        parser.close()
+    except ijson.JSONError as e:
+        raise ValueError(f"Invalid JSON in response stream: {e}") from e
+    
+    if not documents:
+        raise ValueError("Empty response body")
+    return documents[0]
+
+async def _decode_row_stream(response, ijson, consume_row: Callable[[list], None]) -> Any:
+    """Incrementally parse a dataset response, passing each row of data.rows to consume_row"""
+    events = ijson.sendable_list()
+    parser = ijson.parse_coro(events, use_float=True)
+    document = ijson.ObjectBuilder()
+    row = None
+    
+    def drain():
+        nonlocal row
+        for prefix, event, value in events:
+            if row is not None:
+                row.event(event, value)
+                if prefix == "data.rows.item" and event == "end_array":
+                    consume_row(row.value)
+                    row = None
+            elif prefix == "data.rows.item" and event == "start_array":
+                row = ijson.ObjectBuilder()
+                row.event(event, value)
+            else:
+                document.event(event, value)
+        del events[:]
+    
+    try:
+        async for chunk in response.aiter_bytes():
+            parser.send(chunk)
+            drain()
+            # Yield to the event loop between chunks so other requests make progress
+            await asyncio.sleep(0)
+        parser.close()
+        drain()
+    except ijson.JSONError as e:
+        raise ValueError(f"Invalid JSON in response stream: {e}") from e
+    
+    if not hasattr(document, "value"):
+        raise ValueError("Empty response body")
+    return document.value
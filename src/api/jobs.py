@@ -0,0 +1,125 @@
+import asyncio
+import time
+import uuid
+from collections import OrderedDict
+from typing import List, Optional
+from src.api.metabase import MetabaseAPI
+from src.config.settings import Config
+
+FINISHED_STATUSES = ("completed", "failed", "cancelled", "timed out")
+
+class QueryJob:
+    """A native query running in the background with its bounded result"""
+    
+    def __init__(self, job_id: str, database_id: int, query: str, row_limit: int, timeout: float):
+        self.job_id = job_id
+        self.database_id = database_id
+        self.query = query
+        self.row_limit = row_limit
+        self.timeout = timeout
+        self.status = "running"
+        self.created_at = time.time()
+        self.finished_at: Optional[float] = None
+        self.columns: List[str] = []
+        self.rows: List[list] = []
+        self.error: Optional[str] = None
+        self.task: Optional[asyncio.Task] = None
+    
+    @property
+    def is_finished(self) -> bool:
+        return self.status in FINISHED_STATUSES
+    
+    @property
+    def elapsed(self) -> float:
+        """Seconds the job has been running, or ran for if finished"""
+        return (self.finished_at or time.time()) - self.created_at
+
+class QueryJobStore:
+    """Bounded store of background query jobs
+    
+    Finished jobs are kept for result_ttl seconds and the oldest finished jobs
+    are evicted first once max_jobs is reached. Running jobs are never evicted;
+    new submissions are refused while the store is full of running jobs.
+    """
+    
+    def __init__(self, max_jobs: int, result_ttl: float):
+        self.max_jobs = max_jobs
+        self.result_ttl = result_ttl
+        self._jobs: "OrderedDict[str, QueryJob]" = OrderedDict()
+    
+    def submit(self, database_id: int, query: str, row_limit: Optional[int] = None, timeout: Optional[float] = None) -> Optional[QueryJob]:
+        """Start a query in a background task and return its job, or None if the store is full"""
+        self._evict(make_room=True)
+        if len(self._jobs) >= self.max_jobs:
+            return None
+        
+        job = QueryJob(
+            uuid.uuid4().hex[:12],
+            database_id,
+            query,
+            row_limit or Config.QUERY_JOB_ROW_LIMIT,
+            timeout or Config.QUERY_JOB_TIMEOUT,
+        )
+        job.task = asyncio.ensure_future(self._run(job))
+        self._jobs[job.job_id] = job
+        return job
+    
+    def get(self, job_id: str) -> Optional[QueryJob]:
+        """Look up a job by id"""
+        self._evict()
+        return self._jobs.get(job_id)
+    
+    def cancel(self, job_id: str) -> Optional[QueryJob]:
+        """Cancel a running job; the closed request makes Metabase cancel the query"""
+        job = self.get(job_id)
+        if job is not None and not job.is_finished and job.task is not None:
+            job.task.cancel()
+        return job
+    
+    def all(self) -> List[QueryJob]:
+        """Return all retained jobs, oldest first"""
+        self._evict()
+        return list(self._jobs.values())
+    
+    async def _run(self, job: QueryJob) -> None:
+        """Execute the job's query within its own timeout budget"""
+        try:
+            response = await asyncio.wait_for(
+                MetabaseAPI.run_query(job.database_id, job.query, row_limit=job.row_limit, timeout=job.timeout),
+                job.timeout
+            )
+        except asyncio.TimeoutError:
+            job.status = "timed out"
+            job.error = f"Query did not finish within {job.timeout:g}s"
+        except asyncio.CancelledError:
+            job.status = "cancelled"
+        except Exception as e:
+            job.status = "failed"
+            job.error = str(e)
+        else:
+            if response is None or (isinstance(response, dict) and "error" in response):
+                job.status = "failed"
+                job.error = str(response.get('message', 'Unknown error')) if response else "No response"
+            else:
+                data = response.get('data') or {}
+                job.columns = [col.get('name', f"Column {i}") for i, col in enumerate(data.get('cols', []))]
+                job.rows = (data.get('rows') or [])[:job.row_limit]
+                job.status = "completed"
+        finally:
+            job.finished_at = time.time()
+            job.task = None
+    
+    def _evict(self, make_room: bool = False) -> None:
+        """Drop expired finished jobs, and the oldest finished ones when room is needed"""
+        now = time.time()
+        for job_id in [job_id for job_id, job in self._jobs.items() if job.is_finished and now - job.finished_at > self.result_ttl]:
+            del self._jobs[job_id]
+        
+        if not make_room:
+            return
+        
+        finished = [job_id for job_id, job in self._jobs.items() if job.is_finished]
+        while len(self._jobs) >= self.max_jobs and finished:
+            del self._jobs[finished.pop(0)]
+
+query_jobs = QueryJobStore(max_jobs=Config.QUERY_JOB_MAX_JOBS, result_ttl=Config.QUERY_JOB_RESULT_TTL)
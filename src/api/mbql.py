@@ -0,0 +1,165 @@
+import hashlib
+import json
+from typing import Any, Dict, List, Optional
+from src.api.records import FieldRecord, TableRecord
+
+# Aggregations that take no field, and those that need one
+FIELDLESS_AGGREGATIONS = ("count",)
+FIELD_AGGREGATIONS = ("sum", "avg", "min", "max", "distinct", "median", "stddev")
+NUMERIC_AGGREGATIONS = ("sum", "avg", "median", "stddev")
+
+TEMPORAL_UNITS = (
+    "minute", "hour", "day", "week", "month", "quarter", "year",
+    "minute-of-hour", "hour-of-day", "day-of-week", "day-of-month", "day-of-year",
+    "week-of-year", "month-of-year", "quarter-of-year",
+)
+
+# Filter operators and how many values each takes (None for one or more)
+FILTER_OPERATORS = {
+    "=": None,
+    "!=": None,
+    "<": 1,
+    "<=": 1,
+    ">": 1,
+    ">=": 1,
+    "between": 2,
+    "contains": 1,
+    "does-not-contain": 1,
+    "starts-with": 1,
+    "ends-with": 1,
+    "is-null": 0,
+    "not-null": 0,
+    "is-empty": 0,
+    "not-empty": 0,
+}
+
+NUMERIC_BASE_TYPES = ("type/Integer", "type/BigInteger", "type/Float", "type/Decimal", "type/Number")
+TEMPORAL_BASE_TYPES = ("type/Date", "type/DateTime", "type/Time", "type/Temporal")
+
+def _is_numeric(field: FieldRecord) -> bool:
+    """Check whether a field holds numbers"""
+    return (field.base_type or "").startswith(NUMERIC_BASE_TYPES)
+
+def _is_temporal(field: FieldRecord) -> bool:
+    """Check whether a field holds dates or times"""
+    return (field.base_type or "").startswith(TEMPORAL_BASE_TYPES)
+
+class StructuredQueryBuilder:
+    """Build an MBQL query for one table, checking every field against its cached metadata
+    
+    Raises:
+        ValueError: From any method, with a message naming the offending input
+    """
+    
+    def __init__(self, table: TableRecord):
+        self.table = table
+        self._fields_by_name = {(field.name or '').lower(): field for field in table.fields}
+        self._fields_by_id = {field.id: field for field in table.fields}
+        self._aggregation_names: List[str] = []
+    
+    def field(self, reference: Any) -> FieldRecord:
+        """Find a field of the table by ID or (case-insensitive) name"""
+        if isinstance(reference, int) or str(reference).strip().isdigit():
+            field = self._fields_by_id.get(int(reference))
+        else:
+            field = self._fields_by_name.get(str(reference).strip().lower())
+        if field is None:
+            available = ", ".join(sorted(field.name for field in self.table.fields))
+            raise ValueError(f"Table {self.table.name} has no field '{reference}'. Available fields: {available}")
+        return field
+    
+    @staticmethod
+    def field_ref(field: FieldRecord, temporal_unit: Optional[str] = None) -> list:
+        """Reference a field by ID, optionally bucketed by a temporal unit"""
+        return ["field", field.id, {"temporal-unit": temporal_unit} if temporal_unit else None]
+    
+    def aggregation(self, spec: str) -> list:
+        """Build an aggregation clause from "count" or "<operator>:<field>", e.g. "sum:amount" """
+        operator, _, reference = spec.strip().partition(":")
+        operator = operator.strip().lower()
+        if operator in FIELDLESS_AGGREGATIONS and not reference:
+            clause = [operator]
+        elif operator in FIELD_AGGREGATIONS and reference:
+            field = self.field(reference)
+            if operator in NUMERIC_AGGREGATIONS and not _is_numeric(field):
+                raise ValueError(f"Cannot {operator} non-numeric field {field.name} ({field.base_type})")
+            clause = [operator, self.field_ref(field)]
+        else:
+            operators = ", ".join(FIELDLESS_AGGREGATIONS + tuple(f"{op}:<field>" for op in FIELD_AGGREGATIONS))
+            raise ValueError(f"Invalid aggregation '{spec}'. Use one of: {operators}")
+        self._aggregation_names.append(spec.strip().lower())
+        return clause
+    
+    def breakout(self, spec: str) -> list:
+        """Build a breakout clause from "<field>" or "<field>:<temporal unit>", e.g. "created_at:month" """
+        reference, _, unit = spec.strip().partition(":")
+        field = self.field(reference)
+        unit = unit.strip().lower() or None
+        if unit is not None:
+            if unit not in TEMPORAL_UNITS:
+                raise ValueError(f"Invalid temporal unit '{unit}'. Use one of: {', '.join(TEMPORAL_UNITS)}")
+            if not _is_temporal(field):
+                raise ValueError(f"Cannot group non-temporal field {field.name} ({field.base_type}) by {unit}")
+        return self.field_ref(field, unit)
+    
+    def filter(self, spec: Dict) -> list:
+        """Build a filter clause from {"field": ..., "op": ..., "value": ...}"""
+        operator = str(spec.get("op", "=")).strip().lower()
+        if operator not in FILTER_OPERATORS:
+            raise ValueError(f"Invalid filter operator '{operator}'. Use one of: {', '.join(FILTER_OPERATORS)}")
+        field = self.field(spec.get("field"))
+        
+        values = spec.get("value")
+        if values is None:
+            values = []
+        elif not isinstance(values, list):
+            values = [values]
+        arity = FILTER_OPERATORS[operator]
+        if (arity is None and not values) or (arity is not None and len(values) != arity):
+            expected = "one or more values" if arity is None else f"{arity} value(s)"
+            raise ValueError(f"Filter '{operator}' on {field.name} takes {expected}, got {len(values)}")
+        return [operator, self.field_ref(field), *values]
+    
+    def order_by(self, spec: str) -> list:
+        """Build an order-by clause from "<field or aggregation> [asc|desc]", e.g. "count desc" """
+        reference, _, direction = spec.strip().rpartition(" ")
+        direction = direction.lower()
+        if direction not in ("asc", "desc"):
+            reference, direction = spec.strip(), "asc"
+        reference = reference.strip().lower()
+        if reference in self._aggregation_names:
+            return [direction, ["aggregation", self._aggregation_names.index(reference)]]
+        return [direction, self.field_ref(self.field(reference))]
+
+def build_structured_query(database_id: int, table: TableRecord, aggregations: Optional[List[str]] = None,
+                           breakouts: Optional[List[str]] = None, filters: Optional[List[Dict]] = None,
+                           order_by: Optional[List[str]] = None, limit: Optional[int] = None) -> Dict:
+    """Build a structured (MBQL) dataset request for a table
+    
+    Filters are combined with "and" and put in a canonical order, so the same
+    request always yields the same query and Metabase can serve it from cache.
+    
+    Raises:
+        ValueError: If a field, operator or value does not fit the table
+    """
+    builder = StructuredQueryBuilder(table)
+    query: Dict[str, Any] = {"source-table": table.id}
+    
+    if aggregations:
+        query["aggregation"] = [builder.aggregation(spec) for spec in aggregations]
+    if breakouts:
+        query["breakout"] = [builder.breakout(spec) for spec in breakouts]
+    if filters:
+        clauses = sorted((builder.filter(spec) for spec in filters), key=lambda clause: json.dumps(clause, sort_keys=True))
+        query["filter"] = clauses[0] if len(clauses) == 1 else ["and", *clauses]
+    if order_by:
+        query["order-by"] = [builder.order_by(spec) for spec in order_by]
+    if limit is not None:
+        query["limit"] = limit
+    
+    return {"database": database_id, "type": "query", "query": query}
+
+def query_fingerprint(dataset_query: Dict) -> str:
+    """Return a stable hash identifying a dataset query"""
+    canonical = json.dumps(dataset_query, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode()).hexdigest()[:16]
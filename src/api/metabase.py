@@ -1,22 +1,107 @@
+import asyncio
+import hashlib
+import json
+import math
+import time
 import httpx
-from typing import Dict, Any, Optional
+from typing import Callable, Dict, Any, List, Optional
 from src.config.settings import Config
+from src.api.cache_backends import create_cache_backend, close_cache_backends
+from src.api.circuit import CircuitBreakerRegistry, endpoint_class, is_outage, is_unreachable
+from src.api.decoding import decode_response, row_consumer
+from src.api.records import DatabaseRecord, TableRecord
+from src.api.query_guard import estimate_cost, supports_explain
+from src.api.relationships import RelationshipGraph, join_clause
+from src.api.schema_index import TableIndex
+from src.api.schema_sync import SchemaFilter, SchemaSnapshot, table_signature
+from src.api.sql_statements import parse_cache_stats, parse_statement
+from src.api.summary import ResultSummarizer
+from src.api.mbql import build_structured_query, query_fingerprint
+from src.api.cards import CardCatalog, CardRecord
+from src.api.recording import session_recorder
+from src.api.tracing import annotate, span
+
+# Base types that cannot be compared or counted distinctly on most engines
+UNPROFILABLE_BASE_TYPES = ("type/Structured", "type/JSON", "type/Array", "type/Dictionary", "type/SerializedJSON")
+
+# Engines that quote identifiers with backticks instead of double quotes
+BACKTICK_ENGINES = ("mysql", "mariadb", "bigquery", "bigquery-cloud-sdk", "sparksql", "databricks")
 
 class MetabaseAPI:
     """Class for interacting with the Metabase API"""
     
+    # Column profiles keyed by (metabase_url, "field", field_id), the field ids
+    # of each profiled table keyed by (metabase_url, "table", table_id) and
+    # database engines keyed by (metabase_url, "engine", database_id). With a
+    # shared backend, table metadata keyed by (metabase_url, "query_metadata",
+    # table_id, include_hidden, signature) is cached too, so replicas fetch
+    # each table once
+    _metadata_cache = create_cache_backend("metadata", ttl=Config.PROFILE_CACHE_TTL, max_entries=Config.PROFILE_CACHE_SIZE)
+    
+    # Incrementally synced schema snapshots keyed by (metabase_url, database_id)
+    _schema_snapshots: Dict[tuple, SchemaSnapshot] = {}
+    
+    # Outstanding GET requests keyed by (event loop, method, url)
+    _inflight: Dict[tuple, asyncio.Future] = {}
+    
+    # Pooled HTTP clients keyed by (event loop, metabase_url), so connections are reused
+    _clients: Dict[tuple, httpx.AsyncClient] = {}
+    
+    # Saved question catalogs keyed by metabase_url
+    _card_catalogs: Dict[str, CardCatalog] = {}
+    
+    # Saved question results keyed by (metabase_url, card_id, bound parameters)
+    _card_results = create_cache_backend("card_results", ttl=Config.CARD_RESULT_CACHE_TTL, max_entries=Config.CARD_RESULT_CACHE_SIZE)
+    
+    # Results of executed actions keyed by (metabase_url, "action", action_id,
+    # idempotency key), so a retried execution is answered without running it again
+    _action_results = create_cache_backend("action_results", ttl=Config.ACTION_IDEMPOTENCY_WINDOW, max_entries=Config.ACTION_IDEMPOTENCY_SIZE)
+    
+    # Action executions in progress keyed by (event loop, metabase_url, action_id, idempotency key)
+    _action_inflight: Dict[tuple, asyncio.Future] = {}
+    
+    # Requests sent to Metabase, joined to an identical in-flight request or rejected by an open circuit
+    _request_stats: Dict[str, int] = {"sent": 0, "coalesced": 0, "rejected": 0}
+    
+    # Tables a schema sync reused from the snapshot (hits) or had to refetch (misses)
+    _schema_table_stats: Dict[str, int] = {"hits": 0, "misses": 0}
+    
+    # Circuit breakers keyed by (metabase_url, endpoint class)
+    _circuit_breakers = CircuitBreakerRegistry(Config.CIRCUIT_FAILURE_THRESHOLD, Config.CIRCUIT_RESET_TIMEOUT)
+    
     @staticmethod
-    async def make_request(endpoint: str, method: str = "GET", data: Optional[Dict] = None) -> Any:
+    async def make_request(endpoint: str, method: str = "GET", data: Optional[Dict] = None, timeout: float = 30.0) -> Any:
         """Make a request to the Metabase API with proper error handling.
         
+        Identical concurrent GET requests are coalesced: while one is in flight,
+        later callers await the same outstanding request instead of issuing
+        their own. The shared response must be treated as read-only.
+        
+        Requests go through a circuit breaker per Metabase instance and endpoint
+        class (metadata, query, action). While it is open they fail fast with a
+        "Circuit open" error instead of waiting for an unreachable Metabase.
+        
+        With Config.RECORD_MODE set to "record" the requests sent and their
+        responses are logged; with "replay" they are answered from that log.
+        
         Args:
             endpoint: API endpoint to call (without the base URL)
             method: HTTP method to use (GET, POST, etc.)
             data: Optional JSON data to send with the request
+            timeout: Seconds to wait for Metabase before giving up
             
         Returns:
             JSON response from the API or error dict
         """
+        with span("metabase.request", **{"http.method": method, "metabase.endpoint": endpoint.split('?')[0]}) as request_span:
+            response = await MetabaseAPI._dispatch_request(endpoint, method, data, timeout)
+            if isinstance(response, dict) and "error" in response:
+                request_span.set_error(str(response["error"]))
+            return response
+    
+    @staticmethod
+    async def _dispatch_request(endpoint: str, method: str, data: Optional[Dict], timeout: float) -> Any:
+        """Send a request through its circuit breaker, joining an identical in-flight GET if there is one"""
         # Get fresh values from config using the getter methods
         metabase_url = Config.get_metabase_url()
         api_key = Config.get_metabase_api_key()
@@ -27,40 +112,207 @@ class MetabaseAPI:
         }
         
         url = f"{metabase_url}/api/{endpoint.lstrip('/')}"
+        client = MetabaseAPI._get_client(metabase_url)
+        kind = endpoint_class(endpoint)
+        breaker = MetabaseAPI._circuit_breakers.get(metabase_url, kind)
+        annotate(**{"metabase.endpoint_class": kind})
+        
+        if method != "GET":
+            if not breaker.allow():
+                MetabaseAPI._request_stats["rejected"] += 1
+                return MetabaseAPI._circuit_open_error(metabase_url, kind, breaker.retry_after)
+            MetabaseAPI._request_stats["sent"] += 1
+            return await MetabaseAPI._send_through_breaker(breaker, kind, client, url, method, headers, data, timeout)
+        
+        # Futures belong to an event loop, so in-flight requests are tracked per loop
+        key = (asyncio.get_running_loop(), method, url)
+        inflight = MetabaseAPI._inflight.get(key)
+        if inflight is None:
+            # Callers joining an in-flight request, including a probe, skip the breaker
+            if not breaker.allow():
+                MetabaseAPI._request_stats["rejected"] += 1
+                return MetabaseAPI._circuit_open_error(metabase_url, kind, breaker.retry_after)
+            MetabaseAPI._request_stats["sent"] += 1
+            inflight = asyncio.ensure_future(
+                MetabaseAPI._send_through_breaker(breaker, kind, client, url, method, headers, data, timeout)
+            )
+            MetabaseAPI._inflight[key] = inflight
+            inflight.add_done_callback(lambda _: MetabaseAPI._inflight.pop(key, None))
+        else:
+            annotate(**{"metabase.coalesced": True})
+            MetabaseAPI._request_stats["coalesced"] += 1
+        
+        # Shield the shared request so one cancelled caller does not cancel it for the others
+        return await asyncio.shield(inflight)
+    
+    @staticmethod
+    async def _send_through_breaker(breaker, kind: str, client: httpx.AsyncClient, url: str, method: str,
+                                    headers: Dict, data: Optional[Dict], timeout: float) -> Any:
+        """Send a request and record its outcome on the circuit breaker of its endpoint class
+        
+        Every outcome is recorded, including exceptions, so a half-open circuit
+        always releases its probe slot.
+        """
+        try:
+            response = await session_recorder.send(
+                method, url, headers, data,
+                lambda: MetabaseAPI._send_request(client, url, method, headers, data, timeout)
+            )
+        except asyncio.CancelledError:
+            breaker.record_abandoned()
+            raise
+        except BaseException:
+            breaker.record_failure()
+            raise
+        
+        # A slow query or action says little about Metabase itself, so its timeout is not counted
+        if is_unreachable(response, include_timeouts=kind == "metadata"):
+            breaker.record_failure()
+        elif isinstance(response, dict) and response.get("error") == "Timeout":
+            breaker.record_abandoned()
+        else:
+            breaker.record_success()
+        return response
+    
+    @staticmethod
+    def _circuit_open_error(metabase_url: str, kind: str, retry_after: float) -> Dict:
+        """Build the error returned while the circuit of an endpoint class is open"""
+        retry = f"retrying in {math.ceil(retry_after)}s" if retry_after else "a probe request is in flight"
+        return {
+            "error": "Circuit open",
+            "message": f"Metabase at {metabase_url} is failing {kind} requests; {retry}",
+        }
+    
+    @classmethod
+    def _get_client(cls, metabase_url: str) -> httpx.AsyncClient:
+        """Return the pooled HTTP client for a Metabase instance on the running event loop
+        
+        Clients of event loops that have since closed are dropped whenever a new
+        client is created, since the web interface runs each request in its own loop.
+        """
+        key = (asyncio.get_running_loop(), metabase_url)
+        client = cls._clients.get(key)
+        if client is None or client.is_closed:
+            for stale in [stale for stale in cls._clients if stale[0].is_closed()]:
+                del cls._clients[stale]
+            # With keepalive pings, idle connections are kept past the ping interval instead of httpx's 5s
+            expiry = 2 * Config.KEEPALIVE_INTERVAL if Config.WARMUP_ENABLED and Config.KEEPALIVE_INTERVAL > 0 else 5.0
+            client = httpx.AsyncClient(limits=httpx.Limits(max_connections=100, max_keepalive_connections=20, keepalive_expiry=expiry))
+            cls._clients[key] = client
+        return client
+    
+    @classmethod
+    async def close_clients(cls, metabase_url: Optional[str] = None) -> None:
+        """Close the pooled HTTP clients of one Metabase instance, or of all instances
+        
+        Closing all instances also closes the connections of a shared cache backend.
+        """
+        loop = asyncio.get_running_loop()
+        for key in [key for key in cls._clients if metabase_url is None or key[1] == metabase_url]:
+            client = cls._clients.pop(key)
+            # Clients can only be closed from the loop that owns their connections
+            if key[0] is loop:
+                await client.aclose()
+        if metabase_url is None:
+            await close_cache_backends()
+    
+    @classmethod
+    async def close_loop_clients(cls) -> None:
+        """Close the pooled HTTP and cache connections owned by the running event loop"""
+        loop = asyncio.get_running_loop()
+        for key in [key for key in cls._clients if key[0] is loop]:
+            await cls._clients.pop(key).aclose()
+        await close_cache_backends()
+    
+    @classmethod
+    def stats(cls) -> Dict[str, Dict[str, int]]:
+        """Return the request counters and the hits and misses of each cache, for the web dashboard"""
+        return {
+            "requests": dict(cls._request_stats),
+            "caches": {
+                "schema_tables": dict(cls._schema_table_stats),
+                "metadata": cls._metadata_cache.stats(),
+                "card_results": cls._card_results.stats(),
+                "action_results": cls._action_results.stats(),
+                "sql_parse": parse_cache_stats(),
+            },
+        }
+    
+    @classmethod
+    async def reload_config(cls, values: Dict[str, str]) -> None:
+        """Apply Metabase settings re-read from the .env file
+        
+        Credentials are swapped in one step. Only when the Metabase URL changed
+        are the old instance's connection pool closed and its cached metadata
+        and schema snapshots dropped; a new API key keeps both.
+        """
+        old_url = Config.reload_metabase_config(values)
+        new_url = Config.get_metabase_url()
+        if new_url == old_url:
+            print(f"Reloaded Metabase credentials for {new_url}")
+            return
+        
+        print(f"Metabase URL changed from {old_url} to {new_url}, dropping its connections and caches")
+        await cls.close_clients(old_url)
+        cls._metadata_cache.forget(lambda key: key[0] == old_url)
+        cls._card_results.forget(lambda key: key[0] == old_url)
+        cls._action_results.forget(lambda key: key[0] == old_url)
+        cls._card_catalogs.pop(old_url, None)
+        cls._circuit_breakers.discard(old_url)
+        for key in [key for key in cls._schema_snapshots if key[0] == old_url]:
+            del cls._schema_snapshots[key]
+    
+    @staticmethod
+    async def _send_request(client: httpx.AsyncClient, url: str, method: str, headers: Dict,
+                            data: Optional[Dict] = None, timeout: float = 30.0) -> Any:
+        """Send a single HTTP request to Metabase over a pooled client and decode the response
+        
+        The connection is closed when the request times out or the calling task
+        is cancelled. Metabase cancels a running query when its connection
+        closes, so abandoned queries do not keep running on the warehouse.
+        """
         print(f"Making request to: {url}")  # Debugging
         
-        async with httpx.AsyncClient() as client:
+        if method not in ("GET", "POST", "PUT", "DELETE"):
+            return {"error": f"Unsupported HTTP method: {method}"}
+        
+        try:
+            request = client.build_request(
+                method, url, headers=headers,
+                json=data if method in ("POST", "PUT") else None,
+                timeout=timeout
+            )
+            # Stream the body so large payloads can be decoded off the event loop
+            response = await client.send(request, stream=True)
             try:
-                if method == "GET":
-                    response = await client.get(url, headers=headers, timeout=30.0)
-                elif method == "POST":
-                    response = await client.post(url, headers=headers, json=data, timeout=30.0)
-                elif method == "PUT":
-                    response = await client.put(url, headers=headers, json=data, timeout=30.0)
-                elif method == "DELETE":
-                    response = await client.delete(url, headers=headers, timeout=30.0)
-                else:
-                    return {"error": f"Unsupported HTTP method: {method}"}
-                
-                response.raise_for_status()
+                if not response.is_success:
+                    # Read the error body before the stream is closed
+                    await response.aread()
+                    # Try to get JSON error response
+                    try:
+                        error_json = response.json()
+                        return {"error": f"HTTP error: {response.status_code}", "message": str(error_json)}
+                    except ValueError:
+                        # If error is not JSON, return the text
+                        return {"error": f"HTTP error: {response.status_code}", "message": response.text}
                 
                 # Try to parse as JSON, but handle non-JSON responses
                 try:
-                    return response.json()
-                except ValueError:
+                    return await decode_response(response)
+                except ValueError as e:
                     # If response is not JSON, return as error with the text content
-                    return {"error": "Non-JSON response", "message": response.text}
-                
-            except httpx.HTTPStatusError as e:
-                # Try to get JSON error response
-                try:
-                    error_json = e.response.json()
-                    return {"error": f"HTTP error: {e.response.status_code}", "message": str(error_json)}
-                except ValueError:
-                    # If error is not JSON, return the text
-                    return {"error": f"HTTP error: {e.response.status_code}", "message": e.response.text}
-            except Exception as e:
-                return {"error": "Failed to make request", "message": str(e)}
+                    try:
+                        return {"error": "Non-JSON response", "message": response.text}
+                    except httpx.ResponseNotRead:
+                        # Incrementally decoded bodies are not kept in memory
+                        return {"error": "Non-JSON response", "message": str(e)}
+            finally:
+                await response.aclose()
+        
+        except httpx.TimeoutException:
+            return {"error": "Timeout", "message": f"Metabase did not respond within {timeout:g}s; the request was cancelled"}
+        except Exception as e:
+            return {"error": "Failed to make request", "message": str(e)}
     
     @classmethod
     async def get_request(cls, endpoint: str) -> Any:
@@ -68,9 +320,9 @@ class MetabaseAPI:
         return await cls.make_request(endpoint, method="GET")
     
     @classmethod
-    async def post_request(cls, endpoint: str, data: Dict) -> Any:
+    async def post_request(cls, endpoint: str, data: Dict, timeout: float = 30.0) -> Any:
         """Shorthand for POST requests"""
-        return await cls.make_request(endpoint, method="POST", data=data)
+        return await cls.make_request(endpoint, method="POST", data=data, timeout=timeout)
     
     @classmethod
     async def test_connection(cls) -> tuple:
@@ -100,9 +352,81 @@ class MetabaseAPI:
         return response
     
     @classmethod
-    async def get_database_metadata(cls, database_id: int):
-        """Get metadata for a specific database"""
-        return await cls.get_request(f"database/{database_id}/metadata")
+    async def get_database_metadata(cls, database_id: int, include_hidden: bool = False, skip_fields: bool = False):
+        """Get metadata for a specific database
+        
+        Args:
+            database_id: The ID of the database
+            include_hidden: Include hidden tables and fields
+            skip_fields: Leave out the fields of each table
+        """
+        params = []
+        if include_hidden:
+            params.append("include_hidden=true")
+        if skip_fields:
+            params.append("skip_fields=true")
+        query = f"?{'&'.join(params)}" if params else ""
+        return await cls.get_request(f"database/{database_id}/metadata{query}")
+    
+    @classmethod
+    async def get_databases_overview(cls, database_ids: Optional[List[int]] = None, top_tables: int = 5):
+        """Summarize several databases at once from their metadata, without fetching any table
+        
+        The metadata of every database is requested concurrently, at most
+        Config.OVERVIEW_CONCURRENCY at a time and without fields, so the
+        overview takes about as long as the slowest database.
+        
+        Args:
+            database_ids: IDs of the databases to include (all databases when None)
+            top_tables: Number of largest tables to list per database
+            
+        Returns:
+            List of dicts with the id, name, engine, table, schema and estimated row
+            counts and top tables of each database, or an error per database; or error dict
+        """
+        databases = await cls.get_databases()
+        if databases is None or isinstance(databases, dict):
+            return databases or {"error": "No response", "message": "No response received from Metabase API"}
+        
+        names = {db.get('id'): db for db in databases if isinstance(db, dict)}
+        if database_ids:
+            missing = [database_id for database_id in database_ids if database_id not in names]
+            if missing:
+                return {"error": "Database not found", "message": f"No database with ID {', '.join(map(str, missing))}"}
+            selected = [names[database_id] for database_id in database_ids]
+        else:
+            selected = list(names.values())
+        
+        semaphore = asyncio.Semaphore(Config.OVERVIEW_CONCURRENCY)
+        
+        async def summarize(database: Dict) -> Dict:
+            summary = {"id": database.get('id'), "name": database.get('name'), "engine": database.get('engine')}
+            with span("limiter.wait", limiter="overview"):
+                await semaphore.acquire()
+            try:
+                metadata = await cls.get_database_metadata(summary["id"], skip_fields=True)
+            finally:
+                semaphore.release()
+            if metadata is None or "error" in metadata:
+                summary["error"] = metadata.get('message', metadata.get('error')) if metadata else "No response"
+                return summary
+            
+            tables = metadata.get('tables') or []
+            row_counts = [table.get('estimated_row_count') for table in tables if table.get('estimated_row_count') is not None]
+            # Tables with a known row count first, largest first, then by name
+            ranked = sorted(tables, key=lambda table: (-(table.get('estimated_row_count') or -1), table.get('name') or ''))
+            summary.update({
+                "tables": len(tables),
+                "schemas": len({table.get('schema') for table in tables}),
+                "rows": sum(row_counts) if row_counts else None,
+                "top_tables": [
+                    {"name": table.get('name'), "schema": table.get('schema'), "rows": table.get('estimated_row_count')}
+                    for table in ranked[:top_tables]
+                ],
+            })
+            return summary
+        
+        return await asyncio.gather(*(summarize(database) for database in selected))
     
     @classmethod
     async def get_actions(cls):
@@ -128,8 +452,28 @@ class MetabaseAPI:
         return await cls.get_request(f"action/{action_id}")
     
     @classmethod
-    async def execute_action(cls, action_id: int, parameters: Dict = None):
-        """Execute an action with parameters"""
+    async def execute_action(cls, action_id: int, parameters: Dict = None, idempotency_key: Optional[str] = None):
+        """Execute an action with parameters, at most once per idempotency key
+        
+        Successful executions are recorded for Config.ACTION_IDEMPOTENCY_WINDOW
+        seconds per action and idempotency key. Executing again within the
+        window, such as retrying after a timeout, returns the recorded result
+        without calling Metabase; an execution arriving while the first is still
+        running waits for its result. Without a key, one is derived from the
+        parameters but only kept for Config.ACTION_RETRY_WINDOW seconds, so a
+        quick retry runs once while a deliberate repeat later runs again.
+        Failed executions are not recorded and run again when retried.
+        
+        Args:
+            action_id: The ID of the action
+            parameters: Parameter values keyed by parameter ID
+            idempotency_key: Key identifying one logical execution
+            
+        Returns:
+            Dict with the response, the idempotency key (None when nothing was
+            recorded), whether the recorded result was replayed instead of
+            running the action and its age, or error dict
+        """
         if parameters is None:
             parameters = {}
         
@@ -142,12 +486,155 @@ class MetabaseAPI:
         for key, value in parameters.items():
             sanitized_params[str(key)] = value
         
-        return await cls.post_request(f"action/{action_id}/execute", {"parameters": sanitized_params})
+        canonical = json.dumps(sanitized_params, sort_keys=True, default=str)
+        fingerprint = hashlib.sha256(canonical.encode()).hexdigest()[:32]
+        if idempotency_key:
+            idempotency_key, window = str(idempotency_key), Config.ACTION_IDEMPOTENCY_WINDOW
+        else:
+            # Derived keys only catch retries, so identical executions later on run again
+            idempotency_key, window = f"auto-{fingerprint}", min(Config.ACTION_RETRY_WINDOW, Config.ACTION_IDEMPOTENCY_WINDOW)
+        key = (Config.get_metabase_url(), "action", action_id, idempotency_key)
+        
+        if window <= 0:
+            response = await cls.post_request(f"action/{action_id}/execute", {"parameters": sanitized_params})
+            if response is None or (isinstance(response, dict) and "error" in response):
+                return response
+            return {"response": response, "idempotency_key": None, "replayed": False, "recorded_age": None}
+        
+        ran = False
+        recorded = await cls._action_results.get(key)
+        if recorded is None:
+            # Futures belong to an event loop, so executions in progress are tracked per loop
+            inflight_key = (asyncio.get_running_loop(),) + key
+            inflight = cls._action_inflight.get(inflight_key)
+            if inflight is None:
+                ran = True
+                inflight = asyncio.ensure_future(cls._execute_and_record(key, sanitized_params, fingerprint, window))
+                cls._action_inflight[inflight_key] = inflight
+                inflight.add_done_callback(lambda _: cls._action_inflight.pop(inflight_key, None))
+            else:
+                annotate(**{"action.joined": True})
+            # Shield the execution so a caller giving up does not stop it from being recorded
+            recorded = await asyncio.shield(inflight)
+            if recorded is None or "error" in recorded:
+                return recorded
+        
+        if recorded["parameters"] != fingerprint:
+            return {
+                "error": "Idempotency key reused",
+                "message": f"Idempotency key {idempotency_key} was already used to execute action {action_id} "
+                           "with different parameters; use a new key for a new execution"
+            }
+        if ran:
+            return {"response": recorded["response"], "idempotency_key": idempotency_key, "replayed": False, "recorded_age": None}
+        annotate(**{"action.replayed": True})
+        return {
+            "response": recorded["response"],
+            "idempotency_key": idempotency_key,
+            "replayed": True,
+            "recorded_age": max(time.time() - recorded["executed_at"], 0),
+        }
+    
+    @classmethod
+    async def _execute_and_record(cls, key: tuple, parameters: Dict, fingerprint: str, window: float):
+        """Execute an action and record its result under key for window seconds if it succeeded"""
+        action_id = key[2]
+        response = await cls.post_request(f"action/{action_id}/execute", {"parameters": parameters})
+        if response is None or (isinstance(response, dict) and "error" in response):
+            return response
+        recorded = {"response": response, "parameters": fingerprint, "executed_at": time.time()}
+        await cls._action_results.set(key, recorded, ttl=window)
+        return recorded
+    
+    @classmethod
+    async def get_card_catalog(cls, refresh: bool = False):
+        """Get all saved questions, indexed for search
+        
+        The catalog is fetched with a single request and kept for
+        Config.CARD_CATALOG_TTL seconds. While Metabase is unreachable the last
+        catalog is returned with its stale flag set.
+        
+        Args:
+            refresh: Ignore the cached catalog and fetch it again
+            
+        Returns:
+            A CardCatalog, or error dict
+        """
+        metabase_url = Config.get_metabase_url()
+        catalog = cls._card_catalogs.get(metabase_url)
+        if catalog is not None and not refresh and time.time() - catalog.loaded_at < Config.CARD_CATALOG_TTL:
+            return catalog
+        
+        response = await cls.get_request("card")
+        if response is None or isinstance(response, dict):
+            if catalog is not None and is_outage(response):
+                catalog.stale = True
+                return catalog
+            return response
+        
+        catalog = CardCatalog([CardRecord.from_metadata(card) for card in response if not card.get('archived')])
+        cls._card_catalogs[metabase_url] = catalog
+        return catalog
     
     @classmethod
-    async def get_table_metadata(cls, table_id: int):
-        """Get detailed metadata for a specific table"""
-        return await cls.get_request(f"table/{table_id}/query_metadata")
+    async def run_card(cls, card_id: int, parameters: Optional[Dict[str, Any]] = None, refresh: bool = False):
+        """Run a saved question with parameter values bound to its parameters
+        
+        Results are kept for Config.CARD_RESULT_CACHE_TTL seconds per card and
+        parameter values, on top of whatever caching Metabase applies itself.
+        
+        Args:
+            card_id: The ID of the saved question
+            parameters: Values keyed by parameter slug or name
+            refresh: Ignore the locally cached result
+            
+        Returns:
+            Dict with the card, the query response and whether it came from the local cache, or error dict
+        """
+        catalog = await cls.get_card_catalog()
+        if catalog is None or isinstance(catalog, dict):
+            return catalog
+        
+        card = catalog.cards.get(card_id)
+        if card is None:
+            # The card may have been created after the catalog was fetched
+            catalog = await cls.get_card_catalog(refresh=True)
+            if catalog is None or isinstance(catalog, dict):
+                return catalog
+            card = catalog.cards.get(card_id)
+            if card is None:
+                return {"error": "Card not found", "message": f"No saved question with ID {card_id}"}
+        
+        try:
+            bound = card.bind_parameters(parameters)
+        except ValueError as e:
+            return {"error": "Invalid parameters", "message": str(e)}
+        
+        key = (Config.get_metabase_url(), card_id, json.dumps(bound, sort_keys=True))
+        if not refresh:
+            cached = await cls._card_results.get(key)
+            if cached is not None:
+                return {"card": card, "response": cached, "cached": True}
+        
+        response = await cls.post_request(f"card/{card_id}/query", {"parameters": bound}, timeout=Config.QUERY_TIMEOUT)
+        if response is None or (isinstance(response, dict) and "error" in response):
+            return response
+        if isinstance(response, dict) and response.get("status") == "failed":
+            return {"error": "Query failed", "message": response.get("error", "Unknown error")}
+        
+        await cls._card_results.set(key, response)
+        return {"card": card, "response": response, "cached": False}
+    
+    @classmethod
+    async def get_table_metadata(cls, table_id: int, include_hidden: bool = False):
+        """Get detailed metadata for a specific table
+        
+        Args:
+            table_id: The ID of the table
+            include_hidden: Include hidden and sensitive fields
+        """
+        query = "?include_hidden_fields=true&include_sensitive_fields=true" if include_hidden else ""
+        return await cls.get_request(f"table/{table_id}/query_metadata{query}")
     
     @classmethod
     async def get_field_metadata(cls, field_id: int):
@@ -155,53 +642,502 @@ class MetabaseAPI:
         return await cls.get_request(f"field/{field_id}")
     
     @classmethod
-    async def get_database_schema(cls, database_id: int):
-        """Get the database schema with relationships between tables"""
-        # First get the basic metadata
-        metadata = await cls.get_database_metadata(database_id)
+    async def get_field_values(cls, field_id: int):
+        """Get the distinct values Metabase has cached for a specific field"""
+        return await cls.get_request(f"field/{field_id}/values")
+    
+    @classmethod
+    async def profile_table(cls, database_id: int, table_id: int, refresh: bool = False):
+        """Get column statistics and sample values for every field in a table
+        
+        Profiles are built from Metabase's fingerprints and cached field values
+        where available. Fields without a fingerprint are profiled with a single
+        aggregate query per table. Results are cached per field for
+        Config.PROFILE_CACHE_TTL seconds, so repeated calls do not touch Metabase
+        or the warehouse. While Metabase is unreachable, expired profiles are
+        returned with their age in "stale_age".
+        
+        Args:
+            database_id: The ID of the database containing the table
+            table_id: The ID of the table to profile
+            refresh: Ignore cached profiles and rebuild them
+            
+        Returns:
+            Dict with table information and a list of field profiles, or error dict
+        """
+        metabase_url = Config.get_metabase_url()
+        table_key = (metabase_url, "table", table_id)
         
+        if not refresh:
+            cached_table = await cls._metadata_cache.get(table_key)
+            if cached_table is not None:
+                profiles = await cls._metadata_cache.get_many([(metabase_url, "field", field_id) for field_id in cached_table["field_ids"]])
+                if all(profile is not None for profile in profiles):
+                    return {**cached_table["table"], "fields": profiles, "cached": True}
+        
+        metadata = await cls.get_table_metadata(table_id)
         if metadata is None or "error" in metadata:
+            if is_outage(metadata):
+                return cls._stale_profile(metabase_url, table_id) or metadata
             return metadata
         
-        # For each table, get detailed metadata including foreign keys
-        tables = metadata.get('tables', [])
-        enhanced_tables = []
-        
-        for table in tables:
-            table_id = table.get('id')
-            if table_id:
-                table_details = await cls.get_table_metadata(table_id)
-                if table_details and not "error" in table_details:
-                    enhanced_tables.append(table_details)
-                else:
-                    enhanced_tables.append(table)
-            else:
-                enhanced_tables.append(table)
+        table_db_id = metadata.get('db_id')
+        if table_db_id is not None and table_db_id != database_id:
+            return {"error": "Table not found", "message": f"Table {table_id} does not belong to database {database_id}"}
+        
+        engine = (metadata.get('db') or {}).get('engine', '')
+        fields = metadata.get('fields', [])
+        profiles = {}
+        
+        # Start with whatever Metabase already fingerprinted during its sync
+        for field in fields:
+            profiles[field.get('id')] = cls._profile_from_fingerprint(field)
+        
+        # Category-like fields have their distinct values cached by Metabase
+        list_fields = [field for field in fields if field.get('has_field_values') in ("list", "auto-list")]
+        if list_fields:
+            values_responses = await asyncio.gather(*[cls.get_field_values(field.get('id')) for field in list_fields])
+            for field, values_response in zip(list_fields, values_responses):
+                if not values_response or not isinstance(values_response, dict) or "error" in values_response:
+                    continue
+                values = [value[0] if isinstance(value, list) and value else value for value in values_response.get('values', [])]
+                profile = profiles[field.get('id')]
+                profile['sample_values'] = values[:Config.PROFILE_SAMPLE_VALUES]
+                if profile['distinct_count'] is None and not values_response.get('has_more_values'):
+                    profile['distinct_count'] = len(values)
+        
+        # Anything Metabase has not fingerprinted is profiled with one query
+        unprofiled = [
+            field for field in fields
+            if profiles[field.get('id')]['source'] is None
+            and not (field.get('base_type') or '').startswith(UNPROFILABLE_BASE_TYPES)
+        ]
+        if unprofiled:
+            await cls._profile_with_aggregate_query(database_id, metadata, engine, unprofiled, profiles)
+        
+        table_info = {
+            "id": metadata.get('id'),
+            "name": metadata.get('name'),
+            "schema": metadata.get('schema'),
+            "profiled_at": time.time(),
+        }
+        entries = {(metabase_url, "field", field_id): profile for field_id, profile in profiles.items()}
+        entries[table_key] = {"table": table_info, "field_ids": list(profiles)}
+        await cls._metadata_cache.set_many(entries)
         
-        # Replace tables with enhanced versions
-        metadata['tables'] = enhanced_tables
-        return metadata
+        return {**table_info, "fields": list(profiles.values()), "cached": False}
     
     @classmethod
-    async def run_query(cls, database_id: int, query_string: str, row_limit: int = 5):
+    def _stale_profile(cls, metabase_url: str, table_id: int) -> Optional[Dict]:
+        """Return the last profile of a table even if expired, or None if it is no longer cached"""
+        cached_table = cls._metadata_cache.get_stale((metabase_url, "table", table_id))
+        if cached_table is None:
+            return None
+        
+        profiles = []
+        for field_id in cached_table[0]["field_ids"]:
+            cached_profile = cls._metadata_cache.get_stale((metabase_url, "field", field_id))
+            if cached_profile is None:
+                return None
+            profiles.append(cached_profile[0])
+        return {**cached_table[0]["table"], "fields": profiles, "cached": True, "stale_age": cached_table[1]}
+    
+    @staticmethod
+    def _profile_from_fingerprint(field: Dict) -> Dict:
+        """Build a field profile from the fingerprint in table query_metadata"""
+        profile = {
+            "field_id": field.get('id'),
+            "name": field.get('name'),
+            "base_type": field.get('base_type'),
+            "distinct_count": None,
+            "null_fraction": None,
+            "min": None,
+            "max": None,
+            "avg": None,
+            "sample_values": [],
+            "source": None,
+        }
+        
+        fingerprint = field.get('fingerprint')
+        if not fingerprint:
+            return profile
+        
+        global_stats = fingerprint.get('global') or {}
+        profile['distinct_count'] = global_stats.get('distinct-count')
+        profile['null_fraction'] = global_stats.get('nil%')
+        
+        type_stats = fingerprint.get('type') or {}
+        number_stats = type_stats.get('type/Number')
+        datetime_stats = type_stats.get('type/DateTime')
+        text_stats = type_stats.get('type/Text')
+        if number_stats:
+            profile['min'] = number_stats.get('min')
+            profile['max'] = number_stats.get('max')
+            profile['avg'] = number_stats.get('avg')
+        elif datetime_stats:
+            profile['min'] = datetime_stats.get('earliest')
+            profile['max'] = datetime_stats.get('latest')
+        elif text_stats:
+            profile['avg'] = text_stats.get('average-length')
+        
+        profile['source'] = "fingerprint"
+        return profile
+    
+    @classmethod
+    async def _profile_with_aggregate_query(cls, database_id: int, metadata: Dict, engine: str, fields: List[Dict], profiles: Dict):
+        """Fill in profiles for the given fields with a single aggregate query"""
+        quote = lambda name: cls._quote_identifier(name, engine)
+        table_name = quote(metadata.get('name'))
+        if metadata.get('schema'):
+            table_name = f"{quote(metadata.get('schema'))}.{table_name}"
+        
+        expressions = ["COUNT(*) AS row_count"]
+        for index, field in enumerate(fields):
+            column = quote(field.get('name'))
+            expressions.append(f"COUNT({column}) AS c{index}_non_null")
+            expressions.append(f"COUNT(DISTINCT {column}) AS c{index}_distinct")
+            if not (field.get('base_type') or '').startswith("type/Boolean"):
+                expressions.append(f"MIN({column}) AS c{index}_min")
+                expressions.append(f"MAX({column}) AS c{index}_max")
+        
+        query = f"SELECT {', '.join(expressions)} FROM {table_name}"
+        response = await cls.run_query(database_id, query, row_limit=1)
+        
+        if not response or not isinstance(response, dict) or "error" in response:
+            print(f"Aggregate profiling query failed for table {metadata.get('id')}: {response}")
+            return
+        
+        data = response.get('data', {})
+        rows = data.get('rows', [])
+        if not rows:
+            return
+        
+        # Column names may come back upper-cased depending on the engine
+        values = {col.get('name', '').lower(): value for col, value in zip(data.get('cols', []), rows[0])}
+        row_count = values.get('row_count')
+        
+        for index, field in enumerate(fields):
+            profile = profiles[field.get('id')]
+            non_null = values.get(f"c{index}_non_null")
+            profile['distinct_count'] = values.get(f"c{index}_distinct")
+            if row_count and non_null is not None:
+                profile['null_fraction'] = (row_count - non_null) / row_count
+            profile['min'] = values.get(f"c{index}_min")
+            profile['max'] = values.get(f"c{index}_max")
+            profile['source'] = "aggregate query"
+    
+    @staticmethod
+    def _quote_identifier(name: str, engine: str) -> str:
+        """Quote an identifier using the convention of the database engine"""
+        if engine in BACKTICK_ENGINES:
+            return "`" + str(name).replace("`", "``") + "`"
+        return '"' + str(name).replace('"', '""') + '"'
+    
+    @classmethod
+    async def get_database_schema(cls, database_id: int, schema_name: Optional[str] = None,
+                                  table_pattern: Optional[str] = None, include_hidden: bool = False):
+        """Get the database schema with relationships between tables
+        
+        Args:
+            database_id: The ID of the database
+            schema_name: Only include tables in this schema
+            table_pattern: Only include tables whose name matches this glob pattern (e.g. "order*")
+            include_hidden: Include hidden tables and fields
+            
+        Returns:
+            DatabaseRecord with compact table and field records, or error dict
+        """
+        schema_filter = SchemaFilter(schema_name, table_pattern, include_hidden)
+        snapshot = await cls.sync_database_schema(database_id, schema_filter)
+        
+        if snapshot is None or isinstance(snapshot, dict):
+            return snapshot
+        
+        record = snapshot.as_record(schema_filter)
+        record.stale_age = snapshot.stale_age()
+        return record
+    
+    @classmethod
+    async def sync_database_schema(cls, database_id: int, schema_filter: Optional[SchemaFilter] = None, skip_fields: bool = False):
+        """Bring the cached schema snapshot of a database up to date
+        
+        Fetches the cheap database metadata, compares each table's signature
+        with the cached snapshot and refetches query_metadata only for tables
+        that were added or changed since the last sync. A filter restricting
+        tables by schema or name skips fields in the metadata request and
+        limits the refetch to the matching tables. With skip_fields, tables
+        are compared by their table-level attributes only.
+        
+        While Metabase is unreachable the last synced snapshot is returned
+        unchanged, with its stale flag set.
+        
+        Args:
+            database_id: The ID of the database to sync
+            schema_filter: Optional filter limiting the tables to sync
+            skip_fields: Leave out fields in the metadata request even without a restricting filter
+            
+        Returns:
+            The SchemaSnapshot for the database or error dict
+        """
+        if schema_filter is None:
+            schema_filter = SchemaFilter()
+        with_fields = not (schema_filter.restricts_tables or skip_fields)
+        
+        metadata = await cls.get_database_metadata(
+            database_id,
+            include_hidden=schema_filter.include_hidden,
+            skip_fields=not with_fields
+        )
+        
+        key = (Config.get_metabase_url(), database_id)
+        snapshot = cls._schema_snapshots.get(key)
+        
+        if metadata is None or "error" in metadata:
+            if snapshot is not None and snapshot.synced_at is not None and is_outage(metadata):
+                snapshot.stale = True
+                return snapshot
+            return metadata
+        
+        if snapshot is None:
+            snapshot = SchemaSnapshot(database_id, max_changes=Config.SCHEMA_CHANGE_LOG_SIZE)
+            cls._schema_snapshots[key] = snapshot
+        
+        # Filter before the enrichment fan-out so only matching tables are refetched
+        tables = [table for table in metadata.get('tables', []) if schema_filter.matches_metadata(table)]
+        stale_ids = snapshot.stale_table_ids(tables, with_fields, schema_filter.include_hidden)
+        cls._schema_table_stats["hits"] += len(tables) - len(stale_ids)
+        cls._schema_table_stats["misses"] += len(stale_ids)
+        
+        # Refetch detailed metadata (including foreign keys) for changed tables only
+        semaphore = asyncio.Semaphore(Config.SCHEMA_SYNC_CONCURRENCY)
+        shared = cls._metadata_cache.shared
+        signatures = {table.get('id'): table_signature(table, with_fields) for table in tables} if shared else {}
+        
+        async def fetch_table(table_id) -> Optional[TableRecord]:
+            # Another replica may already have fetched this version of the table
+            shared_key = (key[0], "query_metadata", table_id, schema_filter.include_hidden, signatures.get(table_id))
+            if shared:
+                cached = await cls._metadata_cache.get(shared_key)
+                if cached is not None:
+                    return TableRecord.from_compact(cached)
+            
+            with span("limiter.wait", limiter="schema_sync"):
+                await semaphore.acquire()
+            try:
+                table_details = await cls.get_table_metadata(table_id, schema_filter.include_hidden)
+            finally:
+                semaphore.release()
+            if not table_details or "error" in table_details:
+                return None
+            # Only the attributes the tools use are kept; the raw payload is dropped here
+            record = TableRecord.from_metadata(table_details)
+            if shared:
+                await cls._metadata_cache.set(shared_key, record.to_compact())
+            return record
+        
+        records = await asyncio.gather(*[fetch_table(table_id) for table_id in stale_ids])
+        refreshed = {table_id: record for table_id, record in zip(stale_ids, records) if record is not None}
+        
+        change = snapshot.apply(DatabaseRecord.from_metadata(metadata), tables, refreshed, with_fields, schema_filter)
+        if change:
+            print(f"Schema of database {database_id} is now at version {snapshot.version} "
+                  f"({len(stale_ids)} of {len(tables)} tables refetched)")
+        
+        return snapshot
+    
+    @classmethod
+    async def find_join_paths(cls, database_id: int, source_table: str, target_table: str, max_paths: int = 3):
+        """Find the shortest foreign key join paths between two tables
+        
+        Uses the adjacency index of the cached schema, so after the cheap
+        metadata sync no further requests are needed.
+        
+        Args:
+            database_id: The ID of the database containing both tables
+            source_table: Table ID, name or "schema.table" to start from
+            target_table: Table ID, name or "schema.table" to reach
+            max_paths: Maximum number of equally short paths to return
+            
+        Returns:
+            Dict with the resolved tables, a list of paths with their JOIN clause and the stale age, or error dict
+        """
+        snapshot = await cls.sync_database_schema(database_id)
+        if snapshot is None or isinstance(snapshot, dict):
+            return snapshot
+        
+        graph = snapshot.relationship_graph()
+        resolved = []
+        for reference in (source_table, target_table):
+            matches = graph.resolve_table(reference)
+            if not matches:
+                return {"error": "Table not found", "message": f"No table matching '{reference}' in database {database_id}"}
+            if len(matches) > 1:
+                candidates = ", ".join(f"{table.schema}.{table.name} (ID: {table.id})" for table in matches)
+                return {"error": "Ambiguous table", "message": f"'{reference}' matches several tables: {candidates}"}
+            resolved.append(matches[0])
+        
+        source, target = resolved
+        quote = lambda name: cls._quote_identifier(name, snapshot.database.engine)
+        paths = graph.shortest_paths(source.id, target.id, max_paths=max_paths)
+        return {
+            "source": source,
+            "target": target,
+            "paths": [{"edges": path, "sql": join_clause(path, quote)} for path in paths],
+            "stale_age": snapshot.stale_age(),
+        }
+    
+    @classmethod
+    async def rank_schema_tables(cls, database_id: int, focus: Optional[str] = None, schema_name: Optional[str] = None,
+                                 table_pattern: Optional[str] = None, include_hidden: bool = False):
+        """Rank the tables of a database by relevance to a focus, for packing a schema into a size budget
+        
+        Uses the search index and foreign key graph of the cached schema, which
+        are rebuilt only when the schema changes. A filter other than the
+        default builds them for the matching tables instead.
+        
+        Args:
+            database_id: The ID of the database
+            focus: Keywords or table names to rank by (optional)
+            schema_name: Only include tables in this schema
+            table_pattern: Only include tables whose name matches this glob pattern
+            include_hidden: Include hidden tables and fields
+            
+        Returns:
+            Dict with the database, the ranked (table, score) pairs, the relationship graph and stale age, or error dict
+        """
+        schema_filter = SchemaFilter(schema_name, table_pattern, include_hidden)
+        snapshot = await cls.sync_database_schema(database_id, schema_filter)
+        if snapshot is None or isinstance(snapshot, dict):
+            return snapshot
+        
+        if schema_filter.restricts_tables or include_hidden:
+            index = TableIndex(RelationshipGraph(snapshot.as_record(schema_filter)))
+        else:
+            index = snapshot.table_index()
+        
+        return {
+            "database": snapshot.database,
+            "tables": [(index.graph.tables[table_id], score) for table_id, score in index.rank(focus)],
+            "graph": index.graph,
+            "stale_age": snapshot.stale_age(),
+        }
+    
+    @classmethod
+    async def get_relationship_subgraph(cls, database_id: int, center_table: Optional[str] = None, radius: int = 1,
+                                        cluster_by: str = "schema", max_tables: Optional[int] = None):
+        """Select a bounded set of tables and the foreign keys between them for a diagram
+        
+        With a center table only its neighbourhood within radius hops is
+        walked. Without one, the most connected tables are kept. Either way at
+        most max_tables tables are returned, grouped into clusters.
+        
+        A schema synced within Config.DIAGRAM_SNAPSHOT_MAX_AGE seconds is used
+        as is. Otherwise the sync fetches the metadata without fields and
+        refetches only tables whose table-level attributes changed, so
+        drawing a diagram does not download every field of the database.
+        
+        Args:
+            database_id: The ID of the database to diagram
+            center_table: Table ID, name or "schema.table" to center on (optional)
+            radius: Number of foreign key hops around the center table
+            cluster_by: "schema", "component" or "none"
+            max_tables: Maximum number of tables (defaults to Config.DIAGRAM_MAX_TABLES)
+            
+        Returns:
+            Dict with the database, center table, clusters of tables, edges, omitted table count and stale age, or error dict
+        """
+        if cluster_by not in ("schema", "component", "none"):
+            return {"error": "Invalid cluster_by", "message": f"cluster_by must be 'schema', 'component' or 'none', not '{cluster_by}'"}
+        
+        snapshot = cls._schema_snapshots.get((Config.get_metabase_url(), database_id))
+        if snapshot is None or not snapshot.is_fresh(SchemaFilter(), Config.DIAGRAM_SNAPSHOT_MAX_AGE):
+            snapshot = await cls.sync_database_schema(database_id, skip_fields=True)
+            if snapshot is None or isinstance(snapshot, dict):
+                return snapshot
+        
+        graph = snapshot.relationship_graph()
+        max_tables = max_tables or Config.DIAGRAM_MAX_TABLES
+        center = None
+        if center_table is not None:
+            matches = graph.resolve_table(center_table)
+            if not matches:
+                return {"error": "Table not found", "message": f"No table matching '{center_table}' in database {database_id}"}
+            if len(matches) > 1:
+                candidates = ", ".join(f"{table.schema}.{table.name} (ID: {table.id})" for table in matches)
+                return {"error": "Ambiguous table", "message": f"'{center_table}' matches several tables: {candidates}"}
+            center = matches[0]
+            selected = list(graph.neighbourhood(center.id, max(radius, 0), max_tables))
+            omitted = None
+        else:
+            # Keep the most connected tables so the diagram shows the core of the schema
+            ranked = sorted(graph.tables, key=lambda table_id: len(graph.adjacency[table_id]), reverse=True)
+            selected = ranked[:max_tables]
+            omitted = len(ranked) - len(selected)
+        
+        if cluster_by == "component":
+            components = graph.connected_components()
+            key = lambda table: f"Component {components[table.id] + 1}"
+        elif cluster_by == "schema":
+            key = lambda table: table.schema or "(no schema)"
+        else:
+            key = lambda table: ""
+        
+        clusters: Dict[str, List[TableRecord]] = {}
+        for table in sorted((graph.tables[table_id] for table_id in selected), key=lambda table: (key(table), table.name or "")):
+            clusters.setdefault(key(table), []).append(table)
+        
+        return {
+            "database": snapshot.database,
+            "center": center,
+            "clusters": clusters,
+            "edges": graph.edges_between(selected),
+            "omitted": omitted,
+            "stale_age": snapshot.stale_age(),
+        }
+    
+    @classmethod
+    async def run_query(cls, database_id: int, query_string: str, row_limit: int = 5, timeout: Optional[float] = None,
+                        consume_row: Optional[Callable[[list], None]] = None):
         """Run a native query against a database with a row limit
         
+        The query is checked before anything is sent: only a single read-only
+        statement (SELECT, WITH, VALUES, SHOW, DESCRIBE or EXPLAIN) without
+        write keywords is run. Parsed statements are cached, so repeated
+        queries are not tokenized again.
+        
         Args:
             database_id: The ID of the database to query
             query_string: The SQL query to execute
             row_limit: Maximum number of rows to return (default: 5)
+            timeout: Seconds to wait for the query (default: Config.QUERY_TIMEOUT)
+            consume_row: Called with each result row as it is parsed, which then
+                is left out of the response (only when ijson is installed)
             
         Returns:
             Query results or error message
         """
         # Remove trailing semicolons that can cause issues with Metabase API
-        query_string = query_string.strip()
-        if query_string.endswith(';'):
-            query_string = query_string[:-1]
+        query_string = query_string.strip().rstrip(';').rstrip()
+        
+        parsed = parse_statement(query_string)
+        if parsed.error:
+            return {"error": "Query rejected", "message": parsed.error}
+        annotate(**{"query.statement": parsed.statement_type, "query.fingerprint": parsed.fingerprint})
         
         # Ensure the query has a LIMIT clause for safety
         query_string = cls._ensure_query_limit(query_string, row_limit)
         
+        # Optionally estimate the cost of the query before running it
+        cost_warning = None
+        if Config.QUERY_COST_GUARD in ("warn", "reject") and parsed.is_explainable:
+            estimate = await cls.estimate_query_cost(database_id, query_string)
+            cost = estimate.get("cost")
+            if cost is not None and cost > Config.QUERY_COST_THRESHOLD:
+                message = f"Estimated query cost {cost:,.0f} exceeds the configured threshold of {Config.QUERY_COST_THRESHOLD:,.0f}"
+                if Config.QUERY_COST_GUARD == "reject":
+                    return {"error": "Query rejected", "message": f"{message}. Narrow the query with filters or aggregation."}
+                cost_warning = message
+        
         # Prepare the query payload
         payload = {
             "database": database_id,
@@ -212,8 +1148,12 @@ class MetabaseAPI:
             }
         }
         
-        # Execute the query
-        response = await cls.post_request("dataset", payload)
+        # Execute the query; recorded sessions keep every row so they can be replayed
+        token = row_consumer.set(consume_row if session_recorder.mode == "off" else None)
+        try:
+            response = await cls.post_request("dataset", payload, timeout=timeout or Config.QUERY_TIMEOUT)
+        finally:
+            row_consumer.reset(token)
         
         # Improved error handling for Metabase error responses
         if response and isinstance(response, dict) and "error" in response:
@@ -230,21 +1170,153 @@ class MetabaseAPI:
                 if "errors" in message["data"]:
                     return {"error": "SQL Error", "message": message["data"]["errors"]}
         
+        if cost_warning and isinstance(response, dict):
+            response["cost_warning"] = cost_warning
+        
         return response
     
+    @classmethod
+    async def run_structured_query(cls, database_id: int, table: str, aggregations: Optional[List[str]] = None,
+                                   breakouts: Optional[List[str]] = None, filters: Optional[List[Dict]] = None,
+                                   order_by: Optional[List[str]] = None, limit: Optional[int] = None):
+        """Build an MBQL query for a table and run it through Metabase
+        
+        The table and every field are checked against the cached schema
+        snapshot before anything is sent, and the query is built
+        deterministically so Metabase's query cache can reuse earlier results.
+        
+        Args:
+            database_id: The ID of the database containing the table
+            table: Table ID, name or "schema.table"
+            aggregations: e.g. ["count", "sum:amount"]
+            breakouts: e.g. ["status", "created_at:month"]
+            filters: e.g. [{"field": "status", "op": "=", "value": "open"}]
+            order_by: e.g. ["count desc"]
+            limit: Maximum number of rows (default and maximum: Config.QUERY_JOB_ROW_LIMIT)
+            
+        Returns:
+            The dataset response with the "dataset_query" and its "fingerprint" added, or error dict
+        """
+        snapshot = await cls.sync_database_schema(database_id)
+        if snapshot is None or isinstance(snapshot, dict):
+            return snapshot
+        
+        matches = snapshot.relationship_graph().resolve_table(table)
+        if not matches:
+            return {"error": "Table not found", "message": f"No table matching '{table}' in database {database_id}"}
+        if len(matches) > 1:
+            candidates = ", ".join(f"{match.schema}.{match.name} (ID: {match.id})" for match in matches)
+            return {"error": "Ambiguous table", "message": f"'{table}' matches several tables: {candidates}"}
+        
+        limit = min(limit or Config.QUERY_JOB_ROW_LIMIT, Config.QUERY_JOB_ROW_LIMIT)
+        try:
+            dataset_query = build_structured_query(database_id, matches[0], aggregations, breakouts, filters, order_by, limit)
+        except ValueError as e:
+            return {"error": "Invalid query", "message": str(e)}
+        
+        response = await cls.post_request("dataset", dataset_query, timeout=Config.QUERY_TIMEOUT)
+        if response is None or (isinstance(response, dict) and "error" in response):
+            return response
+        if isinstance(response, dict) and response.get("status") == "failed":
+            return {"error": "Query failed", "message": response.get("error", "Unknown error")}
+        
+        response["dataset_query"] = dataset_query
+        response["fingerprint"] = query_fingerprint(dataset_query)
+        return response
+    
+    @classmethod
+    async def summarize_query(cls, database_id: int, query_string: str, row_limit: Optional[int] = None, sample_size: int = 5):
+        """Run a native query and summarize its result column by column
+        
+        The result is bounded by row_limit and summarized in a single pass with
+        fixed-size sketches: null counts, min/max, approximate distinct counts,
+        top values and numeric quantiles. With ijson installed the rows are fed
+        to the sketches while the response is parsed, so only sample_size rows
+        are kept in memory. Without it the response is decoded first and its
+        size is only capped by row_limit.
+        
+        Args:
+            database_id: The ID of the database to query
+            query_string: The SQL query to execute
+            row_limit: Maximum number of rows to summarize (default: Config.QUERY_SUMMARY_ROW_LIMIT)
+            sample_size: Number of rows to return as a sample
+            
+        Returns:
+            Dict with the columns, sample rows, row count, column summaries and any cost warning, or error dict
+        """
+        row_limit = row_limit or Config.QUERY_SUMMARY_ROW_LIMIT
+        summarizer = ResultSummarizer(sample_size)
+        response = await cls.run_query(database_id, query_string, row_limit=row_limit, consume_row=summarizer.add_row)
+        if response is None or (isinstance(response, dict) and "error" in response):
+            return response
+        
+        data = response.get('data') or {}
+        cols = data.get('cols', [])
+        # Rows are only left in the response when they could not be streamed
+        for row in data.get('rows') or []:
+            summarizer.add_row(row)
+        return {
+            "columns": [col.get('name', f"Column {i}") for i, col in enumerate(cols)],
+            "sample_rows": summarizer.sample_rows,
+            "row_count": response.get('row_count', summarizer.row_count),
+            "row_limit": row_limit,
+            "summaries": summarizer.summaries(cols, Config.QUERY_SUMMARY_TOP_K),
+            "cost_warning": response.get('cost_warning'),
+        }
+    
+    @classmethod
+    async def get_database_engine(cls, database_id: int) -> Optional[str]:
+        """Get the engine of a database, cached alongside column profiles"""
+        key = (Config.get_metabase_url(), "engine", database_id)
+        engine = await cls._metadata_cache.get(key)
+        if engine is None:
+            database = await cls.get_request(f"database/{database_id}")
+            if not database or not isinstance(database, dict) or "error" in database:
+                # An engine never changes, so an expired entry is as good as a fresh one
+                stale = cls._metadata_cache.get_stale(key)
+                return stale[0] if stale and is_outage(database) else None
+            engine = database.get('engine')
+            await cls._metadata_cache.set(key, engine)
+        return engine
+    
+    @classmethod
+    async def estimate_query_cost(cls, database_id: int, query_string: str) -> Dict:
+        """Estimate the cost of a native query by running the engine's EXPLAIN through Metabase
+        
+        Returns:
+            Dict with the engine and the estimated cost, which is None when the
+            engine is not supported or the plan could not be read
+        """
+        engine = await cls.get_database_engine(database_id)
+        if not supports_explain(engine):
+            return {"engine": engine, "cost": None}
+        
+        payload = {
+            "database": database_id,
+            "type": "native",
+            "native": {
+                "query": f"EXPLAIN {query_string}",
+                "template-tags": {}
+            }
+        }
+        response = await cls.post_request("dataset", payload, timeout=Config.QUERY_TIMEOUT)
+        if not response or not isinstance(response, dict) or "error" in response:
+            print(f"EXPLAIN pre-flight failed for database {database_id}: {response}")
+            return {"engine": engine, "cost": None}
+        
+        return {"engine": engine, "cost": estimate_cost(engine, response)}
+    
     @staticmethod
     def _ensure_query_limit(query: str, limit: int) -> str:
-        """Ensure the query has a LIMIT clause
+        """Ensure a SELECT, WITH or VALUES query has a LIMIT clause
         
-        This is a simple implementation and may not work for all SQL dialects
-        or complex queries. It's a basic safety measure.
+        The query is tokenized, so a LIMIT in a string, a comment or a subquery
+        does not count. The clause goes on a new line, where a trailing line
+        comment cannot swallow it.
         """
-        # Convert to uppercase for case-insensitive matching
-        query_upper = query.upper()
-        
-        # Check if query already has a LIMIT clause
-        if "LIMIT" in query_upper:
+        parsed = parse_statement(query)
+        if parsed.has_limit or not parsed.is_limitable:
             return query
         
         # Add LIMIT clause
-        return f"{query} LIMIT {limit}" 
\ No newline at end of file
+        return f"{query}\nLIMIT {limit}" 
\ No newline at end of file
@@ -0,0 +1,50 @@
+import re
+from typing import Any, Dict, Optional
+
+# Engines whose EXPLAIN output we know how to turn into a cost estimate
+POSTGRES_LIKE_ENGINES = ("postgres", "redshift")
+MYSQL_LIKE_ENGINES = ("mysql", "mariadb")
+
+_POSTGRES_COST = re.compile(r"cost=[\d.]+\.\.([\d.]+)")
+
+def supports_explain(engine: Optional[str]) -> bool:
+    """Check whether the cost of a query can be estimated for an engine"""
+    return engine in POSTGRES_LIKE_ENGINES or engine in MYSQL_LIKE_ENGINES
+
+def estimate_cost(engine: str, explain_response: Dict[str, Any]) -> Optional[float]:
+    """Extract an estimated cost from the result of an EXPLAIN query
+    
+    For Postgres-like engines this is the planner's total cost of the top plan
+    node. For MySQL-like engines it is the product of the estimated rows
+    examined at each step of the plan, which approximates the join fan-out.
+    
+    Returns:
+        The estimated cost, or None if it could not be determined
+    """
+    data = explain_response.get('data') or {}
+    rows = data.get('rows') or []
+    if not rows:
+        return None
+    
+    if engine in POSTGRES_LIKE_ENGINES:
+        # The first plan line describes the root node and carries the total cost
+        match = _POSTGRES_COST.search(str(rows[0][0]))
+        return float(match.group(1)) if match else None
+    
+    if engine in MYSQL_LIKE_ENGINES:
+        columns = [str(col.get('name', '')).lower() for col in data.get('cols', [])]
+        if 'rows' not in columns:
+            return None
+        rows_index = columns.index('rows')
+        filtered_index = columns.index('filtered') if 'filtered' in columns else None
+        
+        cost = 1.0
+        for row in rows:
+            examined = row[rows_index]
+            if examined is None:
+                continue
+            filtered = row[filtered_index] if filtered_index is not None and row[filtered_index] is not None else 100.0
+            cost *= max(float(examined) * float(filtered) / 100.0, 1.0)
+        return cost
+    
+    return None
@@ -0,0 +1,168 @@
+import asyncio
+import atexit
+import gzip
+import json
+import threading
+import time
+from collections import defaultdict, deque
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+from src.config.settings import Config
+
+# Header and body keys whose values are replaced before anything is written to the log
+SECRET_KEYS = ("api-key", "api_key", "apikey", "password", "secret", "token", "authorization", "cookie", "session")
+
+REDACTED = "[redacted]"
+
+LOG_VERSION = 1
+
+def scrub(value: Any) -> Any:
+    """Return a copy of a JSON-compatible value with secret-looking dict entries redacted"""
+    if isinstance(value, dict):
+        return {
+            key: REDACTED if isinstance(key, str) and any(secret in key.lower() for secret in SECRET_KEYS) else scrub(item)
+            for key, item in value.items()
+        }
+    if isinstance(value, list):
+        return [scrub(item) for item in value]
+    return value
+
+def _request_key(method: str, path: str, data: Optional[Dict]) -> Tuple[str, str, str]:
+    """Key matching a replayed request to the recorded ones"""
+    return method, path, json.dumps(data, sort_keys=True, separators=(",", ":")) if data is not None else ""
+
+def _api_path(url: str) -> str:
+    """Strip the Metabase base URL, so a log replays against any configured instance"""
+    index = url.find("/api/")
+    return url[index:] if index >= 0 else url
+
+def _open(path: str, mode: str):
+    """Open a log file, gzip-compressed when its name ends in .gz"""
+    if path.endswith(".gz"):
+        return gzip.open(path, mode + "t", encoding="utf-8")
+    return open(path, mode, encoding="utf-8")
+
+class SessionRecorder:
+    """Records Metabase requests and responses to a log, or serves them back from one
+    
+    In record mode every request sent to Metabase is appended to the log with
+    its scrubbed headers and body, its decoded response and how long it took.
+    Identical response bodies are written once and referenced afterwards, so
+    repeated metadata fetches barely grow the log.
+    
+    In replay mode no request reaches Metabase. Each request is answered with
+    the next recorded response for the same method, path and body, after the
+    recorded latency multiplied by latency_scale (0 answers immediately). Once
+    the recorded responses for a request run out the last one is repeated.
+    """
+    
+    def __init__(self, mode: str, path: str, latency_scale: float = 1.0):
+        self.mode = mode if mode in ("record", "replay") else "off"
+        self.path = path
+        self.latency_scale = latency_scale
+        self.recorded = 0
+        self.replayed = 0
+        self.unmatched = 0
+        self._file = None
+        self._body_ids: Dict[str, int] = {}
+        self._responses: Optional[Dict[tuple, deque]] = None
+        self._last: Dict[tuple, Tuple[Any, float]] = {}
+        # Requests are recorded from the MCP event loop and the web interface threads
+        self._lock = threading.Lock()
+        if mode not in ("off", "", self.mode):
+            print(f"Unknown RECORD_MODE {mode!r}, recording disabled")
+    
+    async def send(self, method: str, url: str, headers: Dict, data: Optional[Dict],
+                   send: Callable[[], Awaitable[Any]]) -> Any:
+        """Send a request through send(), recording it, or answer it from the log"""
+        if self.mode == "off":
+            return await send()
+        if self.mode == "replay":
+            return await self._replay(method, _api_path(url), data)
+        
+        started = time.perf_counter()
+        response = await send()
+        self._record(method, _api_path(url), headers, data, response, time.perf_counter() - started)
+        return response
+    
+    def _record(self, method: str, path: str, headers: Dict, data: Optional[Dict], response: Any, duration: float) -> None:
+        """Append a request and its response to the log"""
+        body = json.dumps(scrub(response), separators=(",", ":"))
+        with self._lock:
+            try:
+                if self._file is None:
+                    self._file = _open(self.path, "a")
+                    self._file.write(json.dumps({"version": LOG_VERSION, "started_at": time.time()}, separators=(",", ":")) + "\n")
+                    atexit.register(self.close)
+                    self._body_ids.clear()
+                body_id = self._body_ids.get(body)
+                if body_id is None:
+                    body_id = self._body_ids[body] = len(self._body_ids)
+                    self._file.write(f'{{"body":{body_id},"value":{body}}}\n')
+                entry = {
+                    "method": method,
+                    "path": path,
+                    "headers": scrub(headers),
+                    "data": scrub(data),
+                    "ms": round(duration * 1000, 2),
+                    "response": body_id,
+                }
+                self._file.write(json.dumps(entry, separators=(",", ":")) + "\n")
+                self.recorded += 1
+            except OSError as e:
+                print(f"Failed to record request to {self.path}: {e}")
+    
+    def _load(self) -> Dict[tuple, deque]:
+        """Read the log into queues of (response, seconds) per request"""
+        responses: Dict[tuple, deque] = defaultdict(deque)
+        bodies: Dict[int, str] = {}
+        try:
+            with _open(self.path, "r") as f:
+                for line in f:
+                    entry = json.loads(line)
+                    if "body" in entry:
+                        bodies[entry["body"]] = json.dumps(entry["value"])
+                    elif "version" in entry:
+                        # A header line starts each recording session and body ids restart with it
+                        bodies = {}
+                    else:
+                        key = _request_key(entry["method"], entry["path"], entry.get("data"))
+                        responses[key].append((bodies[entry["response"]], entry["ms"] / 1000))
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Failed to load recorded requests from {self.path}: {e}")
+        print(f"Loaded {sum(len(queue) for queue in responses.values())} recorded requests from {self.path}")
+        return responses
+    
+    async def _replay(self, method: str, path: str, data: Optional[Dict]) -> Any:
+        """Answer a request with its next recorded response"""
+        with self._lock:
+            if self._responses is None:
+                self._responses = self._load()
+            key = _request_key(method, path, data)
+            queue = self._responses.get(key)
+            if queue:
+                self._last[key] = queue.popleft()
+            recorded = self._last.get(key)
+            if recorded is None:
+                self.unmatched += 1
+            else:
+                self.replayed += 1
+        
+        if recorded is None:
+            return {"error": "Not recorded", "message": f"No recorded response for {method} {path}"}
+        body, seconds = recorded
+        if self.latency_scale > 0:
+            await asyncio.sleep(seconds * self.latency_scale)
+        # Decoded per request, since callers may hold on to the response
+        return json.loads(body)
+    
+    def close(self) -> None:
+        """Finish the log and report how many requests were recorded or replayed"""
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+                print(f"Recorded {self.recorded} requests to {self.path}")
+            if self._responses is not None and (self.replayed or self.unmatched):
+                print(f"Replayed {self.replayed} requests from {self.path}, {self.unmatched} not recorded")
+
+session_recorder = SessionRecorder(Config.RECORD_MODE, Config.RECORD_FILE, Config.REPLAY_LATENCY_SCALE)
@@ -0,0 +1,129 @@
+import sys
+from typing import Dict, List, Optional
+
+def _intern(value: Optional[str]) -> Optional[str]:
+    """Intern a frequently repeated string such as a type or schema name"""
+    return sys.intern(value) if isinstance(value, str) else value
+
+class FieldRecord:
+    """Compact representation of a field, keeping only the attributes the tools use"""
+    
+    __slots__ = ("id", "table_id", "name", "base_type", "semantic_type", "description", "fk_target_field_id", "visibility_type")
+    
+    def __init__(self, id, table_id, name, base_type, semantic_type, description, fk_target_field_id, visibility_type):
+        self.id = id
+        self.table_id = table_id
+        self.name = name
+        self.base_type = base_type
+        self.semantic_type = semantic_type
+        self.description = description
+        self.fk_target_field_id = fk_target_field_id
+        self.visibility_type = visibility_type
+    
+    @classmethod
+    def from_metadata(cls, field: Dict) -> "FieldRecord":
+        """Build a record from a field dict in a Metabase metadata response"""
+        return cls(
+            field.get('id'),
+            field.get('table_id'),
+            _intern(field.get('name')),
+            _intern(field.get('base_type')),
+            # Older Metabase versions call the semantic type "special_type"
+            _intern(field.get('semantic_type') or field.get('special_type')),
+            field.get('description'),
+            field.get('fk_target_field_id'),
+            _intern(field.get('visibility_type')),
+        )
+    
+    def to_compact(self) -> list:
+        """Return the record as a positional list, for shared caches"""
+        return [self.id, self.table_id, self.name, self.base_type, self.semantic_type, self.description,
+                self.fk_target_field_id, self.visibility_type]
+    
+    @classmethod
+    def from_compact(cls, values: list) -> "FieldRecord":
+        """Rebuild a record from to_compact output"""
+        id, table_id, name, base_type, semantic_type, description, fk_target_field_id, visibility_type = values
+        return cls(id, table_id, _intern(name), _intern(base_type), _intern(semantic_type), description,
+                   fk_target_field_id, _intern(visibility_type))
+    
+    def __repr__(self) -> str:
+        return f"FieldRecord(id={self.id!r}, name={self.name!r}, base_type={self.base_type!r})"
+
+class TableRecord:
+    """Compact representation of a table and its fields"""
+    
+    __slots__ = ("id", "db_id", "name", "schema", "description", "visibility_type", "fields")
+    
+    def __init__(self, id, db_id, name, schema, description, visibility_type, fields: List[FieldRecord]):
+        self.id = id
+        self.db_id = db_id
+        self.name = name
+        self.schema = schema
+        self.description = description
+        self.visibility_type = visibility_type
+        self.fields = fields
+    
+    @classmethod
+    def from_metadata(cls, table: Dict) -> "TableRecord":
+        """Build a record from a table dict in a Metabase metadata response"""
+        return cls(
+            table.get('id'),
+            table.get('db_id'),
+            table.get('name'),
+            _intern(table.get('schema')),
+            table.get('description'),
+            _intern(table.get('visibility_type')),
+            [FieldRecord.from_metadata(field) for field in table.get('fields') or []],
+        )
+    
+    def to_compact(self) -> list:
+        """Return the record and its fields as nested positional lists, for shared caches"""
+        return [self.id, self.db_id, self.name, self.schema, self.description, self.visibility_type,
+                [field.to_compact() for field in self.fields]]
+    
+    @classmethod
+    def from_compact(cls, values: list) -> "TableRecord":
+        """Rebuild a record from to_compact output"""
+        id, db_id, name, schema, description, visibility_type, fields = values
+        return cls(id, db_id, name, _intern(schema), description, _intern(visibility_type),
+                   [FieldRecord.from_compact(field) for field in fields])
+    
+    def __repr__(self) -> str:
+        return f"TableRecord(id={self.id!r}, name={self.name!r}, schema={self.schema!r}, fields={len(self.fields)})"
+
+class DatabaseRecord:
+    """Compact representation of a database schema"""
+    
+    __slots__ = ("id", "name", "engine", "is_sample", "tables", "stale_age")
+    
+    def __init__(self, id, name, engine, is_sample, tables: List[TableRecord], stale_age: Optional[float] = None):
+        self.id = id
+        self.name = name
+        self.engine = engine
+        self.is_sample = is_sample
+        self.tables = tables
+        # Seconds since the schema was synced when served from cache during an outage
+        self.stale_age = stale_age
+    
+    @classmethod
+    def from_metadata(cls, database: Dict, tables: Optional[List[TableRecord]] = None) -> "DatabaseRecord":
+        """Build a record from a database metadata response
+        
+        Tables in the response are ignored unless already converted and passed
+        in, so the caller decides which table payloads to keep.
+        """
+        return cls(
+            database.get('id'),
+            database.get('name'),
+            _intern(database.get('engine')),
+            database.get('is_sample', False),
+            tables if tables is not None else [],
+        )
+    
+    def with_tables(self, tables: List[TableRecord]) -> "DatabaseRecord":
+        """Return a copy of this record holding the given tables"""
+        return DatabaseRecord(self.id, self.name, self.engine, self.is_sample, tables)
+    
+    def __repr__(self) -> str:
+        return f"DatabaseRecord(id={self.id!r}, name={self.name!r}, engine={self.engine!r}, tables={len(self.tables)})"
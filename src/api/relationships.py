@@ -0,0 +1,191 @@
+from collections import deque
+from typing import Dict, List, NamedTuple, Optional, Union
+from src.api.records import DatabaseRecord, FieldRecord, TableRecord
+
+class JoinEdge(NamedTuple):
+    """One hop between two tables along a foreign key, in either direction"""
+    from_table: TableRecord
+    from_field: FieldRecord
+    to_table: TableRecord
+    to_field: FieldRecord
+    # True when from_field holds the foreign key, False when following it backwards
+    forward: bool
+
+class RelationshipGraph:
+    """Adjacency index of the foreign keys between the tables of a database schema
+    
+    Built once per schema version so join paths and diagrams are answered
+    from memory without walking every field of every table again.
+    """
+    
+    def __init__(self, database: DatabaseRecord):
+        self.database = database
+        self.tables: Dict[int, TableRecord] = {table.id: table for table in database.tables}
+        self.adjacency: Dict[int, List[JoinEdge]] = {table_id: [] for table_id in self.tables}
+        self.foreign_keys: List[JoinEdge] = []
+        self._components: Optional[Dict[int, int]] = None
+        
+        fields = {field.id: (field, table) for table in database.tables for field in table.fields}
+        for table in database.tables:
+            for field in table.fields:
+                target = fields.get(field.fk_target_field_id) if field.fk_target_field_id else None
+                if target is None:
+                    continue
+                target_field, target_table = target
+                edge = JoinEdge(table, field, target_table, target_field, True)
+                self.foreign_keys.append(edge)
+                self.adjacency[table.id].append(edge)
+                if target_table.id != table.id:
+                    self.adjacency[target_table.id].append(JoinEdge(target_table, target_field, table, field, False))
+    
+    def resolve_table(self, reference: Union[int, str]) -> List[TableRecord]:
+        """Find tables by id, name or schema-qualified name ("schema.table")
+        
+        Returns all matching tables, so the caller can report ambiguous names.
+        """
+        if isinstance(reference, int) or str(reference).strip().isdigit():
+            table = self.tables.get(int(reference))
+            return [table] if table else []
+        
+        reference = str(reference).strip().lower()
+        matches = [table for table in self.tables.values() if (table.name or '').lower() == reference]
+        if not matches and '.' in reference:
+            schema, name = reference.rsplit('.', 1)
+            matches = [
+                table for table in self.tables.values()
+                if (table.name or '').lower() == name and (table.schema or '').lower() == schema
+            ]
+        return matches
+    
+    def shortest_paths(self, source_id: int, target_id: int, max_paths: int = 3, max_depth: int = 6) -> List[List[JoinEdge]]:
+        """Find up to max_paths shortest join paths between two tables with a BFS
+        
+        Returns:
+            A list of paths, each a list of edges from the source to the target.
+            Empty if the tables are not connected within max_depth hops.
+        """
+        if source_id == target_id:
+            return [[]]
+        
+        # BFS recording every shortest-path predecessor edge of each table
+        depth = {source_id: 0}
+        predecessors: Dict[int, List[JoinEdge]] = {source_id: []}
+        queue = deque([source_id])
+        while queue:
+            table_id = queue.popleft()
+            if depth[table_id] >= max_depth or (target_id in depth and depth[table_id] >= depth[target_id]):
+                continue
+            for edge in self.adjacency.get(table_id, []):
+                next_id = edge.to_table.id
+                if next_id not in depth:
+                    depth[next_id] = depth[table_id] + 1
+                    predecessors[next_id] = [edge]
+                    queue.append(next_id)
+                elif depth[next_id] == depth[table_id] + 1:
+                    predecessors[next_id].append(edge)
+        
+        if target_id not in depth:
+            return []
+        
+        # Walk the predecessor lists back from the target
+        paths: List[List[JoinEdge]] = []
+        stack = [(target_id, [])]
+        while stack and len(paths) < max_paths:
+            table_id, suffix = stack.pop()
+            if table_id == source_id:
+                paths.append(suffix)
+                continue
+            for edge in reversed(predecessors[table_id]):
+                stack.append((edge.from_table.id, [edge] + suffix))
+        return paths
+    
+    def neighbourhood(self, center_id: int, radius: int, max_tables: Optional[int] = None) -> Dict[int, int]:
+        """Return the tables within radius hops of a table, mapped to their distance
+        
+        The BFS stops once max_tables tables have been collected, so the work
+        done is bounded by the requested neighbourhood, not the database size.
+        """
+        distances = {center_id: 0}
+        queue = deque([center_id])
+        while queue:
+            table_id = queue.popleft()
+            if distances[table_id] >= radius:
+                continue
+            for edge in self.adjacency.get(table_id, []):
+                if edge.to_table.id in distances:
+                    continue
+                if max_tables is not None and len(distances) >= max_tables:
+                    return distances
+                distances[edge.to_table.id] = distances[table_id] + 1
+                queue.append(edge.to_table.id)
+        return distances
+    
+    def connected_components(self) -> Dict[int, int]:
+        """Map each table id to the index of its connected component, largest component first"""
+        if self._components is None:
+            components: List[List[int]] = []
+            seen = set()
+            for table_id in self.tables:
+                if table_id in seen:
+                    continue
+                component, queue = [], deque([table_id])
+                seen.add(table_id)
+                while queue:
+                    current = queue.popleft()
+                    component.append(current)
+                    for edge in self.adjacency.get(current, []):
+                        if edge.to_table.id not in seen:
+                            seen.add(edge.to_table.id)
+                            queue.append(edge.to_table.id)
+                components.append(component)
+            components.sort(key=len, reverse=True)
+            self._components = {table_id: index for index, component in enumerate(components) for table_id in component}
+        return self._components
+    
+    def edges_between(self, table_ids) -> List[JoinEdge]:
+        """Return the foreign keys whose source and target are both in table_ids"""
+        table_ids = set(table_ids)
+        return [
+            edge for table_id in table_ids for edge in self.adjacency.get(table_id, [])
+            if edge.forward and edge.to_table.id in table_ids
+        ]
+
+def join_clause(path: List[JoinEdge], quote) -> str:
+    """Render a join path as a FROM ... JOIN ... ON clause
+    
+    Args:
+        path: Edges from the source table to the target table
+        quote: Function quoting an identifier for the database engine
+    """
+    # Tables are aliased by name; a name repeated along the path, such as
+    # public.users and audit.users, gets its schema prefixed and if need be a number
+    aliases: Dict[int, str] = {}
+    
+    def alias(table: TableRecord) -> str:
+        if table.id not in aliases:
+            candidate = table.name
+            if candidate in aliases.values():
+                base = candidate = f"{table.schema}_{table.name}" if table.schema else table.name
+                suffix = 2
+                while candidate in aliases.values():
+                    candidate = f"{base}_{suffix}"
+                    suffix += 1
+            aliases[table.id] = candidate
+        return aliases[table.id]
+    
+    def qualified(table: TableRecord) -> str:
+        name = alias(table)
+        if table.schema:
+            return f"{quote(table.schema)}.{quote(table.name)} AS {quote(name)}"
+        return quote(table.name) if name == table.name else f"{quote(table.name)} AS {quote(name)}"
+    
+    if not path:
+        return ""
+    
+    lines = [f"FROM {qualified(path[0].from_table)}"]
+    for edge in path:
+        lines.append(
+            f"JOIN {qualified(edge.to_table)} ON "
+            f"{quote(alias(edge.from_table))}.{quote(edge.from_field.name)} = {quote(alias(edge.to_table))}.{quote(edge.to_field.name)}"
+        )
+    return "\n".join(lines)
@@ -0,0 +1,101 @@
+import re
+from bisect import bisect_left
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+from src.api.relationships import RelationshipGraph
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+def _tokens(text: Optional[str]) -> List[str]:
+    """Split text into lowercase alphanumeric search tokens, so snake_case names split into words"""
+    return _TOKEN.findall((text or "").lower())
+
+class TableIndex:
+    """Inverted index over the table names, descriptions and field names of a database schema"""
+    
+    # Table name matches rank above field name matches, which rank above description matches
+    NAME_WEIGHT = 3
+    FIELD_WEIGHT = 2
+    DESCRIPTION_WEIGHT = 1
+    
+    # Score of a table named explicitly in the focus, and the share of it passed to neighbours per hop
+    EXPLICIT_SCORE = 20
+    PROXIMITY_DECAY = 0.5
+    PROXIMITY_RADIUS = 2
+    
+    def __init__(self, graph: RelationshipGraph):
+        self.graph = graph
+        self._index: Dict[str, Dict[int, int]] = defaultdict(dict)
+        for table in graph.tables.values():
+            texts = [(self.NAME_WEIGHT, table.name), (self.DESCRIPTION_WEIGHT, table.description)]
+            texts.extend((self.FIELD_WEIGHT, field.name) for field in table.fields)
+            for weight, text in texts:
+                for token in _tokens(text):
+                    postings = self._index[token]
+                    postings[table.id] = max(postings.get(table.id, 0), weight)
+        self._sorted_tokens = sorted(self._index)
+    
+    def _matching_tokens(self, prefix: str) -> List[str]:
+        """Return the indexed tokens starting with prefix, using binary search over the sorted tokens"""
+        tokens = self._sorted_tokens
+        index = bisect_left(tokens, prefix)
+        matches = []
+        while index < len(tokens) and tokens[index].startswith(prefix):
+            matches.append(tokens[index])
+            index += 1
+        return matches
+    
+    def search(self, text: str) -> Dict[int, float]:
+        """Score tables by the query terms matching their name, fields or description
+        
+        Unlike saved question search any term may match, so a focus such as
+        "orders customer email" favours tables matching several terms without
+        excluding those matching one.
+        """
+        scores: Dict[int, float] = defaultdict(float)
+        for term in set(_tokens(text)):
+            term_scores: Dict[int, int] = {}
+            for token in self._matching_tokens(term):
+                # An exact token match counts double a prefix match
+                bonus = 2 if token == term else 1
+                for table_id, weight in self._index[token].items():
+                    term_scores[table_id] = max(term_scores.get(table_id, 0), weight * bonus)
+            for table_id, score in term_scores.items():
+                scores[table_id] += score
+        return scores
+    
+    def rank(self, focus: Optional[str] = None) -> List[Tuple[int, float]]:
+        """Rank every table by relevance to the focus, most relevant first
+        
+        Tables named in the focus (by name or "schema.table") score highest,
+        then tables matching its keywords. Tables within a few foreign key hops
+        of a match inherit part of its score, so the tables needed to join the
+        matches come next. Ties, and every table when there is no focus, are
+        ordered by the number of foreign keys, most connected first.
+        
+        Returns:
+            (table_id, score) pairs; tables unrelated to the focus score 0
+        """
+        scores: Dict[int, float] = defaultdict(float)
+        if focus:
+            for table_id, score in self.search(focus).items():
+                scores[table_id] += score
+            for reference in re.split(r"[,\s]+", focus):
+                for table in self.graph.resolve_table(reference) if reference else []:
+                    scores[table.id] += self.EXPLICIT_SCORE
+            
+            proximity: Dict[int, float] = {}
+            for table_id, score in sorted(scores.items(), key=lambda item: -item[1])[:20]:
+                for neighbour_id, distance in self.graph.neighbourhood(table_id, self.PROXIMITY_RADIUS).items():
+                    if distance:
+                        inherited = score * self.PROXIMITY_DECAY ** distance
+                        proximity[neighbour_id] = max(proximity.get(neighbour_id, 0), inherited)
+            for table_id, score in proximity.items():
+                scores[table_id] += score
+        
+        adjacency = self.graph.adjacency
+        ranked = sorted(
+            self.graph.tables.values(),
+            key=lambda table: (-scores.get(table.id, 0), -len(adjacency[table.id]), table.name or "")
+        )
+        return [(table.id, scores.get(table.id, 0)) for table in ranked]
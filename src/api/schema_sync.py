@@ -0,0 +1,319 @@
+import fnmatch
+import hashlib
+import time
+from typing import Dict, List, Optional
+from src.api.records import DatabaseRecord, TableRecord
+from src.api.relationships import RelationshipGraph
+from src.api.schema_index import TableIndex
+
+# Visibility types that are left out unless hidden tables and fields are requested
+HIDDEN_TABLE_VISIBILITY = ("hidden", "technical", "cruft")
+HIDDEN_FIELD_VISIBILITY = ("sensitive", "retired")
+
+def table_signature(table: Dict, with_fields: bool = True) -> str:
+    """Build a cheap change signature for a table from database metadata
+    
+    Combines the table's updated_at timestamp with a hash of the attributes of
+    its fields, so a change is detected even when Metabase does not bump
+    updated_at after a sync. Responses fetched with skip_fields have no fields,
+    so their signatures are built with with_fields=False and tracked separately,
+    as are those of responses with and without hidden tables and fields.
+    """
+    digest = hashlib.sha1()
+    digest.update(str(table.get('updated_at')).encode())
+    digest.update(str(table.get('name')).encode())
+    digest.update(str(table.get('schema')).encode())
+    digest.update(str(table.get('visibility_type')).encode())
+    if not with_fields:
+        return digest.hexdigest()
+    
+    for field in sorted(table.get('fields') or [], key=lambda f: f.get('id') or 0):
+        digest.update(repr((
+            field.get('id'),
+            field.get('name'),
+            field.get('base_type'),
+            field.get('semantic_type') or field.get('special_type'),
+            field.get('fk_target_field_id'),
+            field.get('visibility_type'),
+        )).encode())
+    return digest.hexdigest()
+
+class SchemaFilter:
+    """Schema name, table name pattern and visibility filter for schema requests"""
+    
+    def __init__(self, schema_name: Optional[str] = None, table_pattern: Optional[str] = None, include_hidden: bool = False):
+        self.schema_name = schema_name
+        self.table_pattern = table_pattern.lower() if table_pattern else None
+        self.include_hidden = include_hidden
+    
+    @property
+    def key(self) -> tuple:
+        """Identify the set of tables the filter selects"""
+        return (self.schema_name, self.table_pattern, self.include_hidden)
+    
+    @property
+    def restricts_tables(self) -> bool:
+        """Whether the filter selects a subset of tables by schema or name"""
+        return bool(self.schema_name or self.table_pattern)
+    
+    def matches(self, name: Optional[str], schema: Optional[str], visibility_type: Optional[str]) -> bool:
+        """Check whether a table with the given attributes passes the filter"""
+        if self.schema_name and schema != self.schema_name:
+            return False
+        if self.table_pattern and not fnmatch.fnmatchcase((name or '').lower(), self.table_pattern):
+            return False
+        if not self.include_hidden and visibility_type in HIDDEN_TABLE_VISIBILITY:
+            return False
+        return True
+    
+    def matches_metadata(self, table: Dict) -> bool:
+        """Check a raw table dict from a metadata response"""
+        return self.matches(table.get('name'), table.get('schema'), table.get('visibility_type'))
+    
+    def matches_record(self, table: TableRecord) -> bool:
+        """Check a cached table record"""
+        return self.matches(table.name, table.schema, table.visibility_type)
+    
+    def apply_to_record(self, table: TableRecord) -> TableRecord:
+        """Return the table with hidden fields removed unless they were requested"""
+        if self.include_hidden or not any(field.visibility_type in HIDDEN_FIELD_VISIBILITY for field in table.fields):
+            return table
+        visible_fields = [field for field in table.fields if field.visibility_type not in HIDDEN_FIELD_VISIBILITY]
+        return TableRecord(table.id, table.db_id, table.name, table.schema, table.description, table.visibility_type, visible_fields)
+
+def diff_table_fields(old_table: TableRecord, new_table: TableRecord) -> Dict[str, List[str]]:
+    """Describe field-level differences between two versions of a table"""
+    old_fields = {field.id: field for field in old_table.fields}
+    new_fields = {field.id: field for field in new_table.fields}
+    
+    added = [new_fields[field_id].name for field_id in new_fields if field_id not in old_fields]
+    removed = [old_fields[field_id].name for field_id in old_fields if field_id not in new_fields]
+    modified = []
+    for field_id in new_fields:
+        if field_id not in old_fields:
+            continue
+        old_field, new_field = old_fields[field_id], new_fields[field_id]
+        if old_field.name != new_field.name:
+            modified.append(f"{old_field.name} renamed to {new_field.name}")
+        if old_field.base_type != new_field.base_type:
+            modified.append(f"{new_field.name} type {old_field.base_type} → {new_field.base_type}")
+        if old_field.fk_target_field_id != new_field.fk_target_field_id:
+            modified.append(f"{new_field.name} foreign key changed")
+    
+    return {"added_fields": added, "removed_fields": removed, "modified_fields": modified}
+
+def diff_table_attributes(old_table: TableRecord, new_table: TableRecord) -> List[str]:
+    """Describe differences between the table-level attributes of two versions of a table"""
+    modified = []
+    if old_table.name != new_table.name:
+        modified.append(f"renamed from {old_table.name}")
+    if old_table.schema != new_table.schema:
+        modified.append(f"moved from schema {old_table.schema} to {new_table.schema}")
+    if old_table.visibility_type != new_table.visibility_type:
+        modified.append(f"visibility {old_table.visibility_type} → {new_table.visibility_type}")
+    if old_table.description != new_table.description:
+        modified.append("description changed")
+    return modified
+
+class SchemaSnapshot:
+    """Cached schema of one database with a versioned change log"""
+    
+    def __init__(self, database_id: int, max_changes: int = 100):
+        self.database_id = database_id
+        self.max_changes = max_changes
+        self.version = 0
+        self.database: Optional[DatabaseRecord] = None
+        # Signatures keyed by (table_id, with_fields, include_hidden)
+        self.signatures: Dict[tuple, Optional[str]] = {}
+        self.tables: Dict[int, TableRecord] = {}
+        # Ids of tables whose record was fetched with hidden fields included
+        self.with_hidden_fields: set = set()
+        self.table_order: List[int] = []
+        self.changes: List[Dict] = []
+        # Filters already synced, keyed by SchemaFilter.key; tables first seen outside them are not reported as added
+        self.scopes: Dict[tuple, SchemaFilter] = {}
+        # Time of the last sync of each filter, keyed by SchemaFilter.key
+        self.scope_synced_at: Dict[tuple, float] = {}
+        # Bumped whenever the cached tables change, including quiet additions that are not versioned
+        self.revision = 0
+        self.synced_at: Optional[float] = None
+        # Set while the snapshot is served because Metabase could not be reached
+        self.stale = False
+        self._graph: Optional[tuple] = None
+        self._index: Optional[tuple] = None
+    
+    def stale_table_ids(self, metadata_tables: List[Dict], with_fields: bool = True, include_hidden: bool = False) -> List[int]:
+        """Return the ids of tables whose signature differs from the snapshot"""
+        return [
+            table.get('id') for table in metadata_tables
+            if table.get('id') is not None
+            and self.signatures.get((table.get('id'), with_fields, include_hidden)) != table_signature(table, with_fields)
+        ]
+    
+    def apply(self, database: DatabaseRecord, metadata_tables: List[Dict], refreshed: Dict[int, TableRecord],
+              with_fields: bool = True, scope: Optional[SchemaFilter] = None) -> Optional[Dict]:
+        """Update the snapshot from a metadata response and refetched tables
+        
+        A table missing from the snapshot is reported as added only when an
+        earlier sync covered it. Tables that merely came into view because
+        the filter widened, e.g. another schema or hidden tables, join the
+        snapshot without a change entry.
+        
+        Args:
+            database: Database record built from the metadata response (without tables)
+            metadata_tables: Raw tables from the metadata response, used for signatures
+            refreshed: Records of the detailed table metadata of changed tables
+            with_fields: Whether the metadata response included fields
+            scope: Filter the response was limited to; cached tables outside it are kept
+            
+        Returns:
+            The recorded change entry, or None if nothing changed
+        """
+        self.database = database
+        self.synced_at = time.time()
+        self.stale = False
+        
+        response_ids = [table.get('id') for table in metadata_tables if table.get('id') is not None]
+        current_ids = set(response_ids)
+        added, removed, changed, hidden = [], [], [], []
+        include_hidden = scope.include_hidden if scope is not None else False
+        first_sync = not self.scopes
+        covered = list(self.scopes.values())
+        covering = scope if scope is not None else SchemaFilter(include_hidden=True)
+        self.scopes[covering.key] = covering
+        self.scope_synced_at[covering.key] = self.synced_at
+        
+        for table in metadata_tables:
+            table_id = table.get('id')
+            if table_id is None:
+                continue
+            signature = table_signature(table, with_fields)
+            previous_signature = self.signatures.get((table_id, with_fields, include_hidden))
+            if previous_signature == signature:
+                continue
+            
+            if table_id in self.tables:
+                if table_id not in refreshed:
+                    # Keep the previous record and signatures; the changed signature makes the next sync retry
+                    continue
+                details = refreshed[table_id]
+                previous = self.tables[table_id]
+                visible_diff = diff_table_fields(SchemaFilter().apply_to_record(previous), SchemaFilter().apply_to_record(details))
+                # Hidden fields are only compared when both versions include them
+                field_diff = diff_table_fields(previous, details) if include_hidden and table_id in self.with_hidden_fields else visible_diff
+                attribute_diff = diff_table_attributes(previous, details)
+                if attribute_diff or any(field_diff.values()):
+                    changed.append({
+                        "table": details.name,
+                        "table_id": table_id,
+                        "modified_attributes": attribute_diff,
+                        **field_diff,
+                        # The field changes shown to callers that do not include hidden fields
+                        "visible_fields": visible_diff,
+                    })
+                    if details.visibility_type in HIDDEN_TABLE_VISIBILITY:
+                        hidden.append(details.name)
+                elif not include_hidden and table_id in self.with_hidden_fields:
+                    # Nothing visible changed, so keep the record that also holds the hidden fields
+                    details = self.tables[table_id]
+            else:
+                details = refreshed.get(table_id) or TableRecord.from_metadata(table)
+                if first_sync or any(covered_scope.matches_metadata(table) for covered_scope in covered):
+                    added.append(details.name)
+                    if details.visibility_type in HIDDEN_TABLE_VISIBILITY:
+                        hidden.append(details.name)
+            
+            # Tables that could not be refetched keep no signature so the next sync retries them
+            self.signatures[(table_id, with_fields, include_hidden)] = signature if table_id in refreshed else None
+            if with_fields:
+                self.signatures[(table_id, False, include_hidden)] = table_signature(table, False) if table_id in refreshed else None
+            else:
+                # The field signature is unknown until the next full sync
+                self.signatures.pop((table_id, True, include_hidden), None)
+            if include_hidden and table_id in refreshed:
+                self.with_hidden_fields.add(table_id)
+            elif details is not self.tables.get(table_id):
+                # The record lacks hidden fields now, so the next sync including them refetches it
+                self.with_hidden_fields.discard(table_id)
+                self.signatures.pop((table_id, True, True), None)
+                self.signatures.pop((table_id, False, True), None)
+            self.tables[table_id] = details
+            self.revision += 1
+        
+        in_scope = scope.matches_record if scope is not None else (lambda table: True)
+        for table_id in [table_id for table_id in self.tables if table_id not in current_ids and in_scope(self.tables[table_id])]:
+            removed.append(self.tables[table_id].name)
+            if self.tables[table_id].visibility_type in HIDDEN_TABLE_VISIBILITY:
+                hidden.append(self.tables[table_id].name)
+            del self.tables[table_id]
+            self.revision += 1
+            self.with_hidden_fields.discard(table_id)
+            for key in [(table_id, with_fields_key, hidden_key) for with_fields_key in (True, False) for hidden_key in (True, False)]:
+                self.signatures.pop(key, None)
+        
+        if scope is None:
+            self.table_order = response_ids
+        else:
+            known_ids = set(self.table_order)
+            self.table_order = [table_id for table_id in self.table_order if table_id in self.tables]
+            self.table_order += [table_id for table_id in response_ids if table_id not in known_ids]
+        
+        if not (added or removed or changed):
+            return None
+        
+        self.version += 1
+        entry = {
+            "version": self.version,
+            "timestamp": self.synced_at,
+            "initial": self.version == 1,
+            "added_tables": added,
+            "removed_tables": removed,
+            "changed_tables": changed,
+            # Names of hidden tables in this entry, left out for callers that do not include them
+            "hidden_tables": hidden,
+        }
+        self.changes.append(entry)
+        del self.changes[:-self.max_changes]
+        return entry
+    
+    def changes_since(self, version: int) -> List[Dict]:
+        """Return the change entries recorded after the given version"""
+        return [entry for entry in self.changes if entry["version"] > version]
+    
+    def is_truncated_since(self, version: int) -> bool:
+        """Check whether changes after version were dropped from the bounded log"""
+        return bool(self.changes) and self.changes[0]["version"] > version + 1
+    
+    def is_fresh(self, scope: SchemaFilter, max_age: float) -> bool:
+        """Check whether the tables matching scope were synced within max_age seconds"""
+        if self.stale:
+            return False
+        # A sync of every schema covers the scope too, if it included at least the same visibility
+        synced = [
+            synced_at for key, synced_at in self.scope_synced_at.items()
+            if key == scope.key or (key[:2] == (None, None) and key[2] >= scope.include_hidden)
+        ]
+        return bool(synced) and time.time() - max(synced) <= max_age
+    
+    def stale_age(self) -> Optional[float]:
+        """Return the seconds since the last successful sync if the snapshot is stale, else None"""
+        return time.time() - self.synced_at if self.stale else None
+    
+    def as_record(self, schema_filter: Optional[SchemaFilter] = None) -> DatabaseRecord:
+        """Return the snapshot as a database record holding its tables in metadata order"""
+        tables = [self.tables[table_id] for table_id in self.table_order]
+        if schema_filter is not None:
+            tables = [schema_filter.apply_to_record(table) for table in tables if schema_filter.matches_record(table)]
+        return self.database.with_tables(tables)
+    
+    def relationship_graph(self) -> RelationshipGraph:
+        """Return the foreign key index of the visible tables, rebuilt only when the tables change"""
+        if self._graph is None or self._graph[0] != self.revision:
+            self._graph = (self.revision, RelationshipGraph(self.as_record(SchemaFilter())))
+        return self._graph[1]
+    
+    def table_index(self) -> TableIndex:
+        """Return the search index of the visible tables, rebuilt only when the tables change"""
+        if self._index is None or self._index[0] != self.revision:
+            self._index = (self.revision, TableIndex(self.relationship_graph()))
+        return self._index[1]
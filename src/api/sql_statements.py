@@ -0,0 +1,292 @@
+import hashlib
+import re
+from itertools import product
+from typing import Dict, List, Optional, Tuple
+from src.api.cache import TTLCache
+from src.config.settings import Config
+
+# Statements run_query accepts, by their first keyword
+READ_ONLY_STATEMENTS = ("SELECT", "WITH", "VALUES", "SHOW", "DESCRIBE", "DESC", "EXPLAIN")
+
+# Statements a row limit is appended to when they have none
+LIMITABLE_STATEMENTS = ("SELECT", "WITH", "VALUES")
+
+# Statements the cost guard can prefix with EXPLAIN; SHOW, DESCRIBE and EXPLAIN itself cannot be explained
+EXPLAINABLE_STATEMENTS = ("SELECT", "WITH")
+
+# Keywords that write data or change the schema. Statements starting with any
+# other keyword are refused by READ_ONLY_STATEMENTS already; these are also
+# rejected inside a statement, since engines allow writes inside read-looking
+# ones: Postgres data-modifying CTEs, SELECT ... INTO, EXPLAIN ANALYZE
+# running the statement it explains.
+WRITE_KEYWORDS = frozenset((
+    "INSERT", "UPDATE", "DELETE", "MERGE", "INTO", "CREATE", "DROP", "ALTER", "TRUNCATE",
+    "GRANT", "REVOKE", "COPY", "CALL", "EXEC", "EXECUTE",
+))
+
+# Keywords written in upper case in the normalized form; other words keep their case,
+# since some engines compare unquoted table names case-sensitively
+KEYWORDS = READ_ONLY_STATEMENTS + tuple(WRITE_KEYWORDS) + (
+    "ALL", "AND", "ANY", "AS", "ASC", "BETWEEN", "BY", "CASE", "CAST", "CROSS", "CURRENT", "DISTINCT", "ELSE",
+    "END", "EXCEPT", "EXISTS", "FALSE", "FETCH", "FILTER", "FIRST", "FOLLOWING", "FOR", "FROM", "FULL", "GROUP",
+    "HAVING", "ILIKE", "IN", "INNER", "INTERSECT", "INTERVAL", "IS", "JOIN", "LATERAL", "LEFT", "LIKE", "LIMIT",
+    "NATURAL", "NEXT", "NOT", "NULL", "NULLS", "OFFSET", "ON", "ONLY", "OR", "ORDER", "OUTER", "OVER",
+    "PARTITION", "PRECEDING", "RANGE", "RECURSIVE", "RIGHT", "ROW", "ROWS", "SOME", "THEN", "TOP", "TRUE",
+    "UNBOUNDED", "UNION", "USING", "WHEN", "WHERE", "WINDOW",
+)
+_KEYWORD_SET = frozenset(KEYWORDS)
+
+_WORD = re.compile(r"[A-Za-z_][A-Za-z0-9_$]*")
+_NUMBER = re.compile(r"(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?")
+_SPACE = re.compile(r"\s+")
+_DOLLAR_QUOTE = re.compile(r"\$(?:[A-Za-z_][A-Za-z0-9_]*)?\$")
+
+# Lexical rules engines disagree on, with the text that brings each into play.
+# A statement is read under every combination of the rules its text touches.
+READING_RULES = {
+    "backslash_escapes": "\\",     # MySQL, BigQuery, Snowflake strings; Postgres E'' strings
+    "hash_comments": "#",          # MySQL, BigQuery
+    "dash_comment_space": "--",    # MySQL starts a "--" comment only before whitespace
+    "nested_comments": "/*",       # Postgres and Snowflake nest block comments
+    "dollar_quotes": "$",          # Postgres and Snowflake $tag$ strings
+    "slash_comments": "//",        # Snowflake
+}
+
+class SQLSyntaxError(ValueError):
+    """Raised when a statement cannot be tokenized, e.g. an unterminated string or comment"""
+
+def _quoted_end(sql: str, start: int, quote: str, backslash_escapes: bool) -> int:
+    """Return the index just past the quoted string or identifier opening at start"""
+    index = start + 1
+    while index < len(sql):
+        char = sql[index]
+        if char == "\\" and backslash_escapes and quote != "`":
+            index += 2
+            continue
+        if char == quote:
+            # A doubled quote is an escaped quote
+            if index + 1 < len(sql) and sql[index + 1] == quote:
+                index += 2
+                continue
+            return index + 1
+        index += 1
+    what = "string" if quote == "'" else "quoted identifier"
+    raise SQLSyntaxError(f"Unterminated {what} starting at position {start}")
+
+def _comment_end(sql: str, start: int, nested: bool) -> int:
+    """Return the index just past the block comment opening at start"""
+    depth = 0
+    index = start
+    while index < len(sql) - 1:
+        pair = sql[index:index + 2]
+        if pair == "/*" and (nested or depth == 0):
+            depth += 1
+            index += 2
+        elif pair == "*/":
+            depth -= 1
+            index += 2
+            if depth == 0:
+                return index
+        else:
+            index += 1
+    raise SQLSyntaxError(f"Unterminated comment starting at position {start}")
+
+def tokenize(sql: str, backslash_escapes: bool = False, hash_comments: bool = False, dash_comment_space: bool = False,
+             nested_comments: bool = False, dollar_quotes: bool = False, slash_comments: bool = False) -> List[Tuple[str, str]]:
+    """Split SQL into (kind, text) tokens, dropping comments and whitespace
+    
+    Kinds are "word", "number", "string", "identifier" (quoted) and "punct".
+    The keyword arguments switch on the lexical rules of READING_RULES; with
+    none set, the statement is read as standard SQL.
+    
+    Raises:
+        SQLSyntaxError: If a string, quoted identifier or comment is not terminated
+    """
+    tokens = []
+    index = 0
+    length = len(sql)
+    while index < length:
+        char = sql[index]
+        if char.isspace():
+            index = _SPACE.match(sql, index).end()
+        elif (sql.startswith("--", index) and (not dash_comment_space or index + 2 == length or sql[index + 2].isspace())) \
+                or (char == "#" and hash_comments) or (sql.startswith("//", index) and slash_comments):
+            newline = sql.find("\n", index)
+            index = length if newline < 0 else newline + 1
+        elif sql.startswith("/*", index):
+            index = _comment_end(sql, index, nested_comments)
+        elif char in "'\"`":
+            end = _quoted_end(sql, index, char, backslash_escapes)
+            tokens.append(("string" if char == "'" else "identifier", sql[index:end]))
+            index = end
+        elif char == "$" and dollar_quotes and _DOLLAR_QUOTE.match(sql, index):
+            delimiter = _DOLLAR_QUOTE.match(sql, index).group()
+            end = sql.find(delimiter, index + len(delimiter))
+            if end < 0:
+                raise SQLSyntaxError(f"Unterminated dollar-quoted string starting at position {index}")
+            end += len(delimiter)
+            tokens.append(("string", sql[index:end]))
+            index = end
+        elif char.isdigit() or (char == "." and index + 1 < length and sql[index + 1].isdigit()):
+            end = _NUMBER.match(sql, index).end()
+            tokens.append(("number", sql[index:end]))
+            index = end
+        else:
+            match = _WORD.match(sql, index)
+            if match:
+                tokens.append(("word", match.group()))
+                index = match.end()
+            else:
+                tokens.append(("punct", char))
+                index += 1
+    return tokens
+
+def _readings(sql: str) -> List[Dict[str, bool]]:
+    """Return the combinations of READING_RULES to read sql under, standard SQL first"""
+    rules = [rule for rule, trigger in READING_RULES.items() if trigger in sql]
+    return [dict(zip(rules, values)) for values in product((False, True), repeat=len(rules))]
+
+def _split_statements(tokens: List[Tuple[str, str]]) -> List[List[Tuple[str, str]]]:
+    """Split tokens at semicolons, dropping empty statements"""
+    statements = [[]]
+    for token in tokens:
+        if token == ("punct", ";"):
+            statements.append([])
+        else:
+            statements[-1].append(token)
+    return [statement for statement in statements if statement]
+
+def _join(tokens: List[Tuple[str, str]]) -> str:
+    """Join token texts with single spaces, except around dots, inside parentheses, before commas and after function names"""
+    parts = []
+    previous = None
+    for kind, text in tokens:
+        function_call = text == "(" and previous is not None and previous[0] == "word" and previous[1].upper() not in _KEYWORD_SET
+        if parts and previous[1] not in ("(", ".") and text not in (")", ",", ".") and not function_call:
+            parts.append(" ")
+        parts.append(text)
+        previous = (kind, text)
+    return "".join(parts)
+
+class ParsedStatement:
+    """A tokenized SQL statement with its normalized form and read-only verdict
+    
+    normalized drops comments, collapses whitespace and upper-cases keywords,
+    so formatting differences do not matter; with the literals kept it keys
+    results. fingerprint hashes the normalized form with literals replaced by
+    "?", so it identifies the shape of a query, e.g. for metrics.
+    """
+    
+    __slots__ = ("statement_type", "normalized", "fingerprint", "has_limit", "error")
+    
+    def __init__(self, statement_type: Optional[str], normalized: str, fingerprint: str, has_limit: bool, error: Optional[str]):
+        self.statement_type = statement_type
+        self.normalized = normalized
+        self.fingerprint = fingerprint
+        self.has_limit = has_limit
+        self.error = error
+    
+    @property
+    def is_limitable(self) -> bool:
+        """Whether a LIMIT clause may be appended to the statement"""
+        return self.statement_type in LIMITABLE_STATEMENTS
+    
+    @property
+    def is_explainable(self) -> bool:
+        """Whether the statement can be prefixed with EXPLAIN to estimate its cost"""
+        return self.statement_type in EXPLAINABLE_STATEMENTS
+
+def _check_read_only(statements: List[List[Tuple[str, str]]]) -> Optional[str]:
+    """Return why the statements are not a single read-only statement, or None"""
+    if not statements:
+        return "The query is empty"
+    if len(statements) > 1:
+        return f"Only a single statement is allowed, found {len(statements)}"
+    
+    tokens = statements[0]
+    # A statement may open with parentheses, as in "(SELECT ...) UNION (SELECT ...)"
+    start = 0
+    while start < len(tokens) - 1 and tokens[start] == ("punct", "("):
+        start += 1
+    kind, first = tokens[start]
+    if kind != "word" or first.upper() not in READ_ONLY_STATEMENTS:
+        return f"Only read-only statements are allowed ({', '.join(READ_ONLY_STATEMENTS)}), not {first.upper()}"
+    
+    for index, (kind, text) in enumerate(tokens):
+        # A word after a dot is the column or table part of a qualified name
+        if kind == "word" and text.upper() in WRITE_KEYWORDS and (index == 0 or tokens[index - 1] != ("punct", ".")):
+            return f"{text.upper()} is not allowed in a read-only query; quote it if it is a column or table name"
+    return None
+
+def _parse(sql: str) -> ParsedStatement:
+    """Tokenize a statement and check that it is read-only under every way an engine might read it
+    
+    Where engines disagree on strings and comments, text one engine sees as
+    inside a string another may run as code. So the statement is tokenized
+    under each combination of the rules its text touches, and it must be
+    read-only under all of them. Readings in which it does not tokenize are
+    ignored, since an engine reading it that way fails with a syntax error.
+    """
+    if "/*!" in sql:
+        return ParsedStatement(None, sql.strip(), "", False, "MySQL executable comments (/*! ... */) are not allowed")
+    
+    statements = None
+    error = None
+    syntax_error = None
+    for rules in _readings(sql):
+        try:
+            reading = _split_statements(tokenize(sql, **rules))
+        except SQLSyntaxError as e:
+            syntax_error = syntax_error or str(e)
+            continue
+        if statements is None:
+            statements = reading
+        error = _check_read_only(reading)
+        if error is not None:
+            break
+    if statements is None:
+        return ParsedStatement(None, sql.strip(), "", False, syntax_error)
+    
+    tokens = [token for statement in statements for token in statement]
+    words = [text.upper() for kind, text in tokens if kind == "word"]
+    # Words after a dot are parts of qualified names, not keywords
+    normalized = [
+        (kind, text.upper() if kind == "word" and text.upper() in _KEYWORD_SET and (index == 0 or tokens[index - 1][1] != ".") else text)
+        for index, (kind, text) in enumerate(tokens)
+    ]
+    shape = [(kind, "?") if kind in ("string", "number") else (kind, text) for kind, text in normalized]
+    
+    # A LIMIT, FETCH FIRST or TOP outside parentheses limits the whole result
+    depth = 0
+    has_limit = False
+    for kind, text in tokens:
+        if text == "(":
+            depth += 1
+        elif text == ")":
+            depth -= 1
+        elif depth == 0 and kind == "word" and text.upper() in ("LIMIT", "FETCH", "TOP"):
+            has_limit = True
+    
+    return ParsedStatement(
+        words[0] if words else None,
+        _join(normalized),
+        hashlib.sha256(_join(shape).encode()).hexdigest()[:16],
+        has_limit,
+        error,
+    )
+
+# Parsed statements keyed by a hash of the SQL text; parsing is deterministic, so entries never expire
+_parse_cache = TTLCache(ttl=float("inf"), max_entries=Config.SQL_PARSE_CACHE_SIZE)
+
+def parse_statement(sql: str) -> ParsedStatement:
+    """Parse a SQL statement, reusing the result for SQL parsed before"""
+    key = hashlib.blake2b(sql.encode(), digest_size=16).digest()
+    parsed = _parse_cache.get(key)
+    if parsed is None:
+        parsed = _parse(sql)
+        _parse_cache.set(key, parsed)
+    return parsed
+
+def parse_cache_stats() -> dict:
+    """Return the hits and misses of the parse cache"""
+    return {"hits": _parse_cache.hits, "misses": _parse_cache.misses}
@@ -0,0 +1,241 @@
+import hashlib
+import math
+import random
+from typing import Any, Dict, List, Optional, Tuple
+
+# HyperLogLog registers are 2 ** HLL_PRECISION bytes per column, about 1.6% standard error
+HLL_PRECISION = 12
+
+# Numeric values kept per column to estimate quantiles; exact below this many rows
+QUANTILE_SAMPLE_SIZE = 1024
+
+# Counters kept per column by the top-k sketch
+TOP_K_CAPACITY = 64
+
+SUMMARY_QUANTILES = (0.05, 0.25, 0.5, 0.75, 0.95)
+
+def _is_number(value: Any) -> bool:
+    """Check for a JSON number, excluding booleans"""
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+def _hashable(value: Any) -> Any:
+    """Return a hashable stand-in for a JSON value (lists and objects become their repr)"""
+    return repr(value) if isinstance(value, (list, dict)) else value
+
+class HyperLogLog:
+    """Approximate distinct counter using a fixed number of registers"""
+    
+    __slots__ = ('precision', 'registers')
+    
+    def __init__(self, precision: int = HLL_PRECISION):
+        self.precision = precision
+        self.registers = bytearray(1 << precision)
+    
+    def add(self, value: Any) -> None:
+        """Record a value"""
+        digest = hashlib.blake2b(repr(value).encode(), digest_size=8).digest()
+        x = int.from_bytes(digest, 'big')
+        index = x >> (64 - self.precision)
+        remainder = x & ((1 << (64 - self.precision)) - 1)
+        # Position of the first 1 bit in the remaining bits, counting from 1
+        rank = (64 - self.precision) - remainder.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+    
+    def estimate(self) -> int:
+        """Estimate the number of distinct values recorded"""
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        raw = alpha * m * m / sum(2.0 ** -register for register in self.registers)
+        zeros = self.registers.count(0)
+        if raw <= 2.5 * m and zeros:
+            # Linear counting is more accurate while many registers are still empty
+            return round(m * math.log(m / zeros))
+        return round(raw)
+
+class TopK:
+    """Space-Saving sketch of the most frequent values with a bounded number of counters"""
+    
+    __slots__ = ('capacity', 'counts', 'errors')
+    
+    def __init__(self, capacity: int = TOP_K_CAPACITY):
+        self.capacity = capacity
+        self.counts: Dict[Any, int] = {}
+        # Upper bound on how much each count overestimates the true frequency
+        self.errors: Dict[Any, int] = {}
+    
+    def add(self, value: Any) -> None:
+        """Count one occurrence of a value"""
+        counts = self.counts
+        if value in counts:
+            counts[value] += 1
+        elif len(counts) < self.capacity:
+            counts[value] = 1
+            self.errors[value] = 0
+        else:
+            # Replace the least frequent value, inheriting its count as the error bound
+            smallest = min(counts, key=counts.get)
+            floor = counts.pop(smallest)
+            del self.errors[smallest]
+            counts[value] = floor + 1
+            self.errors[value] = floor
+    
+    @property
+    def is_exact(self) -> bool:
+        """Whether no value was ever evicted, so every count is exact"""
+        return not any(self.errors.values())
+    
+    def top(self, k: int) -> List[Tuple[Any, int]]:
+        """Return up to k values that surely occurred more than once, most frequent first
+        
+        Each count is a guaranteed lower bound, and exact while is_exact holds.
+        """
+        repeated = [(value, count - self.errors[value]) for value, count in self.counts.items() if count - self.errors[value] > 1]
+        return sorted(repeated, key=lambda item: item[1], reverse=True)[:k]
+
+class Reservoir:
+    """Uniform random sample of a stream of numbers, used to estimate quantiles"""
+    
+    __slots__ = ('size', 'seen', 'values', '_random')
+    
+    def __init__(self, size: int = QUANTILE_SAMPLE_SIZE):
+        self.size = size
+        self.seen = 0
+        self.values: List[float] = []
+        self._random = random.Random(0)
+    
+    def add(self, value: float) -> None:
+        """Offer a value to the sample"""
+        self.seen += 1
+        if len(self.values) < self.size:
+            self.values.append(value)
+        else:
+            slot = self._random.randrange(self.seen)
+            if slot < self.size:
+                self.values[slot] = value
+    
+    def quantiles(self, fractions=SUMMARY_QUANTILES) -> Dict[float, float]:
+        """Estimate the given quantiles from the sample"""
+        if not self.values:
+            return {}
+        ordered = sorted(self.values)
+        last = len(ordered) - 1
+        result = {}
+        for fraction in fractions:
+            # Linear interpolation between the closest ranks
+            position = fraction * last
+            lower = int(position)
+            upper = min(lower + 1, last)
+            result[fraction] = ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+        return result
+
+class ColumnSummary:
+    """Running statistics for one result column, updated one value at a time in constant memory"""
+    
+    __slots__ = ('name', 'base_type', 'count', 'nulls', 'min', 'max', '_min_key', '_max_key',
+                 'distinct', 'top_values', 'numbers')
+    
+    def __init__(self, name: str, base_type: Optional[str] = None):
+        self.name = name
+        self.base_type = base_type
+        self.count = 0
+        self.nulls = 0
+        self.min = None
+        self.max = None
+        self._min_key = None
+        self._max_key = None
+        self.distinct = HyperLogLog()
+        self.top_values = TopK()
+        self.numbers = Reservoir()
+    
+    def add(self, value: Any) -> None:
+        """Update the statistics with the next value of the column"""
+        self.count += 1
+        if value is None:
+            self.nulls += 1
+            return
+        
+        # Order numbers before strings before anything else, so mixed columns still compare
+        if _is_number(value):
+            key = (0, value)
+            self.numbers.add(value)
+        elif isinstance(value, str):
+            key = (1, value)
+        else:
+            key = (2, repr(value))
+        if self._min_key is None or key < self._min_key:
+            self._min_key, self.min = key, value
+        if self._max_key is None or key > self._max_key:
+            self._max_key, self.max = key, value
+        
+        value = _hashable(value)
+        self.distinct.add(value)
+        self.top_values.add(value)
+    
+    def as_dict(self, top_k: int) -> Dict:
+        """Return the statistics, with quantiles only for all-numeric columns"""
+        non_null = self.count - self.nulls
+        numeric = self.numbers.seen > 0 and self.numbers.seen == non_null
+        return {
+            "name": self.name,
+            "base_type": self.base_type,
+            "count": self.count,
+            "nulls": self.nulls,
+            "distinct": min(self.distinct.estimate(), non_null),
+            "min": self.min,
+            "max": self.max,
+            "quantiles": self.numbers.quantiles() if numeric else {},
+            "top_values": self.top_values.top(top_k),
+            "top_values_exact": self.top_values.is_exact,
+        }
+
+class ResultSummarizer:
+    """Summarize result rows one at a time, keeping only the first few as a sample
+    
+    Column statistics are created as rows arrive, since a streamed response
+    may list its column metadata only after the rows.
+    """
+    
+    def __init__(self, sample_size: int = 5):
+        self.sample_size = sample_size
+        self.sample_rows: List[list] = []
+        self.row_count = 0
+        self._columns: List[ColumnSummary] = []
+    
+    def add_row(self, row: list) -> None:
+        """Update every column's statistics with the next row"""
+        self.row_count += 1
+        if len(self.sample_rows) < self.sample_size:
+            self.sample_rows.append(row)
+        while len(self._columns) < len(row):
+            self._columns.append(ColumnSummary(f"Column {len(self._columns)}"))
+        for summary, value in zip(self._columns, row):
+            summary.add(value)
+    
+    def summaries(self, cols: List[Dict], top_k: int = 5) -> List[Dict]:
+        """Return one statistics dict per column, named after the column metadata"""
+        while len(self._columns) < len(cols):
+            self._columns.append(ColumnSummary(f"Column {len(self._columns)}"))
+        for i, col in enumerate(cols):
+            self._columns[i].name = col.get('name', f"Column {i}")
+            self._columns[i].base_type = col.get('base_type')
+        return [summary.as_dict(top_k) for summary in self._columns[:len(cols)]]
+
+def summarize_rows(cols: List[Dict], rows, top_k: int = 5) -> List[Dict]:
+    """Compute per-column statistics in a single pass over result rows
+    
+    Memory per column is fixed by the sketch sizes, so rows can be consumed
+    from any iterable without keeping them.
+    
+    Args:
+        cols: Column metadata from a Metabase dataset response
+        rows: Iterable of result rows
+        top_k: Number of most frequent values to report per column
+        
+    Returns:
+        A list with one statistics dict per column
+    """
+    summarizer = ResultSummarizer(sample_size=0)
+    for row in rows:
+        summarizer.add_row(row)
+    return summarizer.summaries(cols, top_k)
@@ -0,0 +1,237 @@
+import asyncio
+import contextvars
+import functools
+import json
+import os
+import random
+import time
+from typing import Any, Callable, Dict, List, Optional
+from src.config.settings import Config
+
+# Span of the running tool call or request, None outside a sampled trace
+_current_span: contextvars.ContextVar = contextvars.ContextVar("current_span", default=None)
+
+class _NoopSpan:
+    """Stand-in returned when tracing is disabled or the trace was not sampled"""
+    
+    __slots__ = ()
+    
+    def __enter__(self) -> "_NoopSpan":
+        return self
+    
+    def __exit__(self, *exc) -> bool:
+        return False
+    
+    def set_attribute(self, key: str, value: Any) -> None:
+        pass
+    
+    def set_error(self, message: str) -> None:
+        pass
+
+NOOP_SPAN = _NoopSpan()
+
+class Span:
+    """A timed operation within a trace, following the OpenTelemetry span model"""
+    
+    __slots__ = ("name", "trace_id", "span_id", "parent_id", "start_ns", "end_ns", "attributes", "error", "_token", "_phase")
+    
+    def __init__(self, name: str, trace_id: str, parent_id: Optional[str], attributes: Dict[str, Any]):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.attributes = attributes
+        self.error: Optional[str] = None
+        self._token = None
+        self._phase: Optional["Span"] = None
+    
+    def __enter__(self) -> "Span":
+        self._token = _current_span.set(self)
+        return self
+    
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        if exc_type is not None and self.error is None:
+            self.error = f"{exc_type.__name__}: {exc}"
+        _current_span.reset(self._token)
+        self.end()
+        return False
+    
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+    
+    def set_error(self, message: str) -> None:
+        self.error = message
+    
+    def end(self) -> None:
+        """Finish the span and any phase still open within it, then hand it to the exporter"""
+        if self.end_ns is not None:
+            return
+        if self._phase is not None:
+            self._phase.end()
+        self.end_ns = time.time_ns()
+        tracer.finish(self)
+
+class Tracer:
+    """Collects finished spans and exports them to a file or an OTLP/HTTP collector
+    
+    Spans are buffered and written whenever a trace's root span ends. The
+    file exporter appends one OTLP JSON export request per line, which
+    collectors and most trace viewers can import.
+    """
+    
+    def __init__(self, exporter: str, sample_rate: float, file_path: str, otlp_endpoint: str):
+        self.exporter = exporter
+        self.enabled = exporter in ("file", "otlp") and sample_rate > 0
+        self.sample_rate = sample_rate
+        self.file_path = file_path
+        self.otlp_endpoint = otlp_endpoint
+        self._buffer: List[Span] = []
+        self._exports: set = set()
+        self._client = None
+        if exporter and not self.enabled and sample_rate > 0:
+            print(f"Unknown TRACE_EXPORTER {exporter!r}, tracing disabled")
+    
+    def finish(self, span: Span) -> None:
+        """Buffer a finished span, exporting the buffer when a trace is complete"""
+        self._buffer.append(span)
+        if span.parent_id is None or len(self._buffer) >= 512:
+            self.flush()
+    
+    def flush(self) -> None:
+        """Export the buffered spans"""
+        if not self._buffer:
+            return
+        payload = json.dumps(_export_request(self._buffer), separators=(",", ":"))
+        self._buffer = []
+        
+        if self.exporter == "file":
+            try:
+                with open(self.file_path, "a") as f:
+                    f.write(payload + "\n")
+            except OSError as e:
+                print(f"Failed to write traces to {self.file_path}: {e}")
+            return
+        
+        try:
+            task = asyncio.get_running_loop().create_task(self._post(payload))
+        except RuntimeError:
+            print("Dropping spans finished outside an event loop")
+            return
+        self._exports.add(task)
+        task.add_done_callback(self._exports.discard)
+    
+    async def _post(self, payload: str) -> None:
+        """Send an export request to the OTLP/HTTP collector"""
+        import httpx
+        
+        if self._client is None:
+            self._client = httpx.AsyncClient(timeout=5.0)
+        try:
+            response = await self._client.post(self.otlp_endpoint, content=payload, headers={"Content-Type": "application/json"})
+            response.raise_for_status()
+        except Exception as e:
+            print(f"Failed to export traces to {self.otlp_endpoint}: {e}")
+    
+    async def shutdown(self) -> None:
+        """Export what is left and wait for pending exports"""
+        self.flush()
+        if self._exports:
+            await asyncio.gather(*self._exports, return_exceptions=True)
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+def _attribute_value(value: Any) -> Dict:
+    """Encode an attribute value as an OTLP AnyValue"""
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+def _export_request(spans: List[Span]) -> Dict:
+    """Build an OTLP JSON trace export request"""
+    encoded = []
+    for span in spans:
+        record = {
+            "traceId": span.trace_id,
+            "spanId": span.span_id,
+            "name": span.name,
+            "kind": 1,
+            "startTimeUnixNano": str(span.start_ns),
+            "endTimeUnixNano": str(span.end_ns),
+            "attributes": [{"key": key, "value": _attribute_value(value)} for key, value in span.attributes.items()],
+            "status": {"code": 2, "message": span.error} if span.error else {"code": 1},
+        }
+        if span.parent_id:
+            record["parentSpanId"] = span.parent_id
+        encoded.append(record)
+    return {
+        "resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": Config.MCP_NAME}}]},
+            "scopeSpans": [{"scope": {"name": "metabase-mcp"}, "spans": encoded}],
+        }]
+    }
+
+tracer = Tracer(Config.TRACE_EXPORTER, Config.TRACE_SAMPLE_RATE, Config.TRACE_FILE, Config.TRACE_OTLP_ENDPOINT)
+
+def start_trace(name: str, **attributes):
+    """Start the root span of a trace, subject to the sampling rate
+    
+    Returns a no-op span when tracing is disabled or the trace is not sampled,
+    in which case every span nested in it is a no-op too.
+    """
+    if not tracer.enabled or random.random() >= tracer.sample_rate:
+        return NOOP_SPAN
+    return Span(name, os.urandom(16).hex(), None, attributes)
+
+def span(name: str, **attributes):
+    """Start a span nested in the current one, or a no-op span outside a sampled trace"""
+    parent = _current_span.get()
+    if parent is None:
+        return NOOP_SPAN
+    return Span(name, parent.trace_id, parent.span_id, attributes)
+
+def annotate(**attributes) -> None:
+    """Set attributes on the current span, if any"""
+    current = _current_span.get()
+    if current is not None:
+        current.attributes.update(attributes)
+
+def start_phase(name: str, **attributes) -> None:
+    """Mark the start of a phase of the current span, such as rendering a tool's output
+    
+    The phase is recorded as a child span that lasts until the next phase
+    starts or the current span ends, so no block has to be wrapped.
+    """
+    parent = _current_span.get()
+    if parent is None:
+        return
+    if parent._phase is not None:
+        parent._phase.end()
+    parent._phase = Span(name, parent.trace_id, parent.span_id, attributes)
+
+def traced_tool(fn: Callable) -> Callable:
+    """Wrap an MCP tool so each call is the root span of a trace
+    
+    Returns the tool unchanged when tracing is disabled, so it costs nothing.
+    Tool results starting with "Error" mark the span as failed.
+    """
+    if not tracer.enabled:
+        return fn
+    
+    @functools.wraps(fn)
+    async def wrapper(*args, **kwargs):
+        with start_trace(f"tool {fn.__name__}", **{"mcp.tool": fn.__name__}) as root:
+            result = await fn(*args, **kwargs)
+            if isinstance(result, str):
+                root.set_attribute("mcp.result_chars", len(result))
+                if result.startswith("Error"):
+                    root.set_error(result[:200])
+            return result
+    
+    return wrapper
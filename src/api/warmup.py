@@ -0,0 +1,112 @@
+import asyncio
+import sys
+import time
+from typing import Dict, Optional
+from src.config.settings import Config
+from src.api.metabase import MetabaseAPI
+from src.api.tracing import span, start_trace
+
+class ConnectionWarmer:
+    """Warms up the connection to Metabase at startup and keeps pooled connections alive
+    
+    The warm-up opens several pooled connections at once, paying DNS
+    resolution and the TCP and TLS handshakes up front. It then requests
+    "session/properties", which includes the Metabase version, and "database",
+    so Metabase has loaded the code behind its metadata endpoints before the
+    first tool call.
+    
+    Afterwards a health check is sent over each pooled connection every
+    interval seconds, so proxies and load balancers do not close them for
+    being idle. Timings of every step are kept in timings and logged.
+    """
+    
+    def __init__(self, connections: int, interval: float):
+        self.connections = max(connections, 1)
+        self.interval = interval
+        # Milliseconds taken by each warm-up step, and the latest keepalive round
+        self.timings: Dict[str, float] = {}
+        self.errors: Dict[str, str] = {}
+        self.started = False
+        self.ready = False
+        self._task: Optional[asyncio.Task] = None
+    
+    def start(self) -> None:
+        """Warm up in a background task, so the server accepts calls meanwhile"""
+        if self._task is None:
+            self.started = True
+            self._task = asyncio.ensure_future(self._run())
+    
+    async def stop(self) -> None:
+        """Stop warming up and sending keepalive pings"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+    
+    async def _ping(self, count: int) -> None:
+        """Send count concurrent health checks, so each one uses a separate pooled connection
+        
+        The health endpoint needs no authentication and no database work, and
+        the requests bypass coalescing, which would merge them into one.
+        """
+        metabase_url = Config.get_metabase_url()
+        client = MetabaseAPI._get_client(metabase_url)
+        responses = await asyncio.gather(
+            *(client.get(f"{metabase_url}/api/health", timeout=10.0) for _ in range(count)),
+            return_exceptions=True
+        )
+        for response in responses:
+            if isinstance(response, Exception):
+                raise response
+            response.raise_for_status()
+    
+    async def _step(self, name: str, coroutine) -> None:
+        """Run one warm-up step, recording how long it took or why it failed"""
+        started = time.perf_counter()
+        with span(f"warmup.{name}"):
+            try:
+                response = await coroutine
+                if isinstance(response, dict) and "error" in response:
+                    self.errors[name] = str(response.get("message") or response["error"])
+            except Exception as e:
+                self.errors[name] = str(e)
+        self.timings[name] = round((time.perf_counter() - started) * 1000, 1)
+    
+    async def warm_up(self) -> None:
+        """Open pooled connections and request the session properties and database list"""
+        started = time.perf_counter()
+        with start_trace("warmup", **{"warmup.connections": self.connections}):
+            await self._step("connect", self._ping(self.connections))
+            await self._step("properties", MetabaseAPI.get_request("session/properties"))
+            await self._step("database", MetabaseAPI.get_request("database"))
+        self.timings["total"] = round((time.perf_counter() - started) * 1000, 1)
+        self.ready = True
+        
+        steps = ", ".join(f"{name} {ms:.0f} ms" for name, ms in self.timings.items() if name != "total")
+        # Diagnostics go to stderr, since stdout carries the stdio transport's messages
+        print(f"Metabase warm-up finished in {self.timings['total']:.0f} ms ({steps})", file=sys.stderr)
+        for name, error in self.errors.items():
+            print(f"Metabase warm-up step {name} failed: {error}", file=sys.stderr)
+    
+    async def _run(self) -> None:
+        """Warm up, then send keepalive pings every interval seconds until stopped"""
+        await self.warm_up()
+        if self.interval <= 0:
+            return
+        while True:
+            await asyncio.sleep(self.interval)
+            started = time.perf_counter()
+            try:
+                await self._ping(self.connections)
+                self.errors.pop("keepalive", None)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.errors["keepalive"] = str(e)
+                print(f"Metabase keepalive ping failed: {e}", file=sys.stderr)
+            self.timings["keepalive"] = round((time.perf_counter() - started) * 1000, 1)
+
+connection_warmer = ConnectionWarmer(Config.WARMUP_CONNECTIONS, Config.KEEPALIVE_INTERVAL)
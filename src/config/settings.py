@@ -1,6 +1,5 @@
 import os
 import base64
-from cryptography.fernet import Fernet
 from dotenv import load_dotenv
 
 # Load environment variables from .env file
@@ -10,7 +9,8 @@ load_dotenv()
 class Config:
     # Secret key for encryption (generate once and store securely)
     # In production, this should be set as an environment variable
-    SECRET_KEY = os.environ.get("SECRET_KEY") or Fernet.generate_key().decode()
+    # Generated the same way as Fernet.generate_key(), without importing cryptography at startup
+    SECRET_KEY = os.environ.get("SECRET_KEY") or base64.urlsafe_b64encode(os.urandom(32)).decode()
     
     # Metabase settings
     METABASE_URL = os.environ.get("METABASE_URL", "http://localhost:3000")
@@ -24,17 +24,97 @@ class Config:
     # MCP settings
     MCP_NAME = os.environ.get("MCP_NAME", "metabase")
     
+    # Column profiling settings
+    PROFILE_CACHE_TTL = int(os.environ.get("PROFILE_CACHE_TTL", "3600"))
+    PROFILE_CACHE_SIZE = int(os.environ.get("PROFILE_CACHE_SIZE", "20000"))
+    PROFILE_SAMPLE_VALUES = int(os.environ.get("PROFILE_SAMPLE_VALUES", "10"))
+    
+    # Schema sync settings
+    SCHEMA_SYNC_CONCURRENCY = int(os.environ.get("SCHEMA_SYNC_CONCURRENCY", "8"))
+    SCHEMA_CHANGE_LOG_SIZE = int(os.environ.get("SCHEMA_CHANGE_LOG_SIZE", "100"))
+    DIAGRAM_MAX_TABLES = int(os.environ.get("DIAGRAM_MAX_TABLES", "100"))
+    DIAGRAM_SNAPSHOT_MAX_AGE = int(os.environ.get("DIAGRAM_SNAPSHOT_MAX_AGE", "60"))
+    SCHEMA_PACK_TOKEN_BUDGET = int(os.environ.get("SCHEMA_PACK_TOKEN_BUDGET", "4000"))
+    OVERVIEW_CONCURRENCY = int(os.environ.get("OVERVIEW_CONCURRENCY", "8"))
+    
+    # JSON decoding settings
+    JSON_DECODER = os.environ.get("JSON_DECODER", "auto")
+    JSON_THREAD_THRESHOLD = int(os.environ.get("JSON_THREAD_THRESHOLD", "1048576"))
+    JSON_STREAM_DECODE = os.environ.get("JSON_STREAM_DECODE", "False").lower() == "true"
+    
+    # Query execution settings
+    QUERY_TIMEOUT = float(os.environ.get("QUERY_TIMEOUT", "30"))
+    QUERY_COST_GUARD = os.environ.get("QUERY_COST_GUARD", "off").lower()
+    QUERY_COST_THRESHOLD = float(os.environ.get("QUERY_COST_THRESHOLD", "1000000"))
+    QUERY_SUMMARY_ROW_LIMIT = int(os.environ.get("QUERY_SUMMARY_ROW_LIMIT", "2000"))
+    QUERY_SUMMARY_TOP_K = int(os.environ.get("QUERY_SUMMARY_TOP_K", "5"))
+    SQL_PARSE_CACHE_SIZE = int(os.environ.get("SQL_PARSE_CACHE_SIZE", "512"))
+    
+    # Saved question settings
+    CARD_CATALOG_TTL = int(os.environ.get("CARD_CATALOG_TTL", "300"))
+    CARD_RESULT_CACHE_TTL = int(os.environ.get("CARD_RESULT_CACHE_TTL", "60"))
+    CARD_RESULT_CACHE_SIZE = int(os.environ.get("CARD_RESULT_CACHE_SIZE", "32"))
+    
+    # Action settings
+    ACTION_IDEMPOTENCY_WINDOW = int(os.environ.get("ACTION_IDEMPOTENCY_WINDOW", "600"))
+    ACTION_IDEMPOTENCY_SIZE = int(os.environ.get("ACTION_IDEMPOTENCY_SIZE", "256"))
+    ACTION_RETRY_WINDOW = int(os.environ.get("ACTION_RETRY_WINDOW", "30"))
+    
+    # Cache backend settings ("memory" or "redis", to share caches between replicas)
+    CACHE_BACKEND = os.environ.get("CACHE_BACKEND", "memory").lower()
+    CACHE_REDIS_URL = os.environ.get("CACHE_REDIS_URL", "redis://localhost:6379/0")
+    CACHE_KEY_PREFIX = os.environ.get("CACHE_KEY_PREFIX", "metabase-mcp")
+    
+    # Circuit breaker settings
+    CIRCUIT_FAILURE_THRESHOLD = int(os.environ.get("CIRCUIT_FAILURE_THRESHOLD", "5"))
+    CIRCUIT_RESET_TIMEOUT = float(os.environ.get("CIRCUIT_RESET_TIMEOUT", "30"))
+    
+    # Background query job settings
+    QUERY_JOB_TIMEOUT = float(os.environ.get("QUERY_JOB_TIMEOUT", "600"))
+    QUERY_JOB_ROW_LIMIT = int(os.environ.get("QUERY_JOB_ROW_LIMIT", "2000"))
+    QUERY_JOB_MAX_JOBS = int(os.environ.get("QUERY_JOB_MAX_JOBS", "50"))
+    QUERY_JOB_RESULT_TTL = int(os.environ.get("QUERY_JOB_RESULT_TTL", "3600"))
+    
+    # Tracing settings (TRACE_EXPORTER "file" or "otlp" enables tracing)
+    TRACE_EXPORTER = os.environ.get("TRACE_EXPORTER", "").lower()
+    TRACE_SAMPLE_RATE = float(os.environ.get("TRACE_SAMPLE_RATE", "1.0"))
+    TRACE_FILE = os.environ.get("TRACE_FILE", "traces.jsonl")
+    TRACE_OTLP_ENDPOINT = os.environ.get("TRACE_OTLP_ENDPOINT", "http://localhost:4318/v1/traces")
+    
+    # Request recording settings (RECORD_MODE "record" logs Metabase responses, "replay" serves them from the log)
+    RECORD_MODE = os.environ.get("RECORD_MODE", "off").lower()
+    RECORD_FILE = os.environ.get("RECORD_FILE", "metabase-session.jsonl.gz")
+    REPLAY_LATENCY_SCALE = float(os.environ.get("REPLAY_LATENCY_SCALE", "1.0"))
+    
+    # Web interface load test limits
+    LOAD_TEST_MAX_CONCURRENCY = int(os.environ.get("LOAD_TEST_MAX_CONCURRENCY", "50"))
+    LOAD_TEST_MAX_DURATION = float(os.environ.get("LOAD_TEST_MAX_DURATION", "300"))
+    
+    # Connection warm-up settings (keepalive pings run while warm-up is enabled; 0 disables them)
+    WARMUP_ENABLED = os.environ.get("WARMUP_ENABLED", "False").lower() == "true"
+    WARMUP_CONNECTIONS = int(os.environ.get("WARMUP_CONNECTIONS", "4"))
+    KEEPALIVE_INTERVAL = float(os.environ.get("KEEPALIVE_INTERVAL", "30"))
+    
+    # Seconds between checks of the .env file for changes (0 disables hot reload)
+    CONFIG_WATCH_INTERVAL = float(os.environ.get("CONFIG_WATCH_INTERVAL", "2"))
+    
     # File paths
     CONFIG_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), '.env')
     TEMPLATE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'templates')
     
+    @classmethod
+    def _cipher_suite(cls):
+        """Create the Fernet cipher for the secret key, importing cryptography on first use"""
+        from cryptography.fernet import Fernet
+        return Fernet(cls.SECRET_KEY.encode())
+    
     @classmethod
     def encrypt_api_key(cls, api_key):
         """Encrypt the API key"""
         if not api_key:
             return ""
         
-        cipher_suite = Fernet(cls.SECRET_KEY.encode())
+        cipher_suite = cls._cipher_suite()
         encrypted_key = cipher_suite.encrypt(api_key.encode())
         return base64.urlsafe_b64encode(encrypted_key).decode()
     
@@ -45,7 +125,7 @@ class Config:
             return ""
         
         try:
-            cipher_suite = Fernet(cls.SECRET_KEY.encode())
+            cipher_suite = cls._cipher_suite()
             decoded = base64.urlsafe_b64decode(encrypted_key.encode())
             decrypted_key = cipher_suite.decrypt(decoded)
             return decrypted_key.decode()
@@ -59,10 +139,7 @@ class Config:
         # Encrypt the API key before saving
         encrypted_key = cls.encrypt_api_key(api_key)
         
-        with open(cls.CONFIG_FILE, 'w') as f:
-            f.write(f"METABASE_URL={metabase_url}\n")
-            f.write(f"METABASE_API_KEY={encrypted_key}\n")
-            f.write(f"SECRET_KEY={cls.SECRET_KEY}\n")
+        cls.write_config_file(metabase_url, encrypted_key)
         
         # Update current environment
         os.environ['METABASE_URL'] = metabase_url
@@ -72,6 +149,36 @@ class Config:
         cls.METABASE_URL = metabase_url
         cls._METABASE_API_KEY = encrypted_key
 
+    @classmethod
+    def write_config_file(cls, metabase_url, encrypted_key):
+        """Write the .env file in one step, so a watching MCP server never reads it half written"""
+        temp_file = f"{cls.CONFIG_FILE}.tmp"
+        with open(temp_file, 'w') as f:
+            f.write(f"METABASE_URL={metabase_url}\n")
+            f.write(f"METABASE_API_KEY={encrypted_key}\n")
+            f.write(f"SECRET_KEY={cls.SECRET_KEY}\n")
+        os.replace(temp_file, cls.CONFIG_FILE)
+    
+    @classmethod
+    def reload_metabase_config(cls, values):
+        """Apply the Metabase settings read from the .env file by another process
+        
+        The URL, API key and secret key are swapped together without awaiting,
+        so no request can see a new URL with an old key or vice versa.
+        
+        Returns:
+            The Metabase URL that was in use before the reload
+        """
+        old_url = cls.get_metabase_url()
+        for name in ("METABASE_URL", "METABASE_API_KEY", "SECRET_KEY"):
+            if values.get(name) is not None:
+                os.environ[name] = values[name]
+        
+        cls.METABASE_URL = os.environ.get("METABASE_URL", cls.METABASE_URL)
+        cls._METABASE_API_KEY = os.environ.get("METABASE_API_KEY", cls._METABASE_API_KEY)
+        cls.SECRET_KEY = os.environ.get("SECRET_KEY", cls.SECRET_KEY)
+        return old_url
+    
     @classmethod
     def get_metabase_url(cls):
         """Get the current Metabase URL, refreshing from environment if needed"""
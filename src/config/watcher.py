@@ -0,0 +1,60 @@
+import asyncio
+import os
+from typing import Awaitable, Callable, Dict, Optional
+from dotenv import dotenv_values
+
+class ConfigWatcher:
+    """Poll the .env file and pass its values to a callback whenever it changes
+    
+    Polling the modification time needs no extra dependency and also works
+    where inotify is unavailable, such as on macOS or network file systems.
+    """
+    
+    def __init__(self, path: str, interval: float, on_change: Callable[[Dict[str, Optional[str]]], Awaitable[None]]):
+        self.path = path
+        self.interval = interval
+        self.on_change = on_change
+        self._stamp = self._file_stamp()
+        self._task: Optional[asyncio.Task] = None
+    
+    def _file_stamp(self) -> Optional[tuple]:
+        """Return the modification time and size of the file, or None if it does not exist"""
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+    
+    def start(self) -> None:
+        """Start polling in a background task, unless the interval is 0"""
+        if self._task is None and self.interval > 0:
+            self._task = asyncio.ensure_future(self._poll())
+    
+    async def stop(self) -> None:
+        """Stop polling"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+    
+    async def check(self) -> bool:
+        """Reload the file if it changed since the last check, returning whether it did"""
+        stamp = self._file_stamp()
+        if stamp is None or stamp == self._stamp:
+            return False
+        
+        self._stamp = stamp
+        await self.on_change(dotenv_values(self.path))
+        return True
+    
+    async def _poll(self) -> None:
+        """Check the file every interval seconds until stopped"""
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.check()
+            except Exception as e:
+                print(f"Error reloading configuration from {self.path}: {e}")
@@ -0,0 +1,215 @@
+import asyncio
+import random
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+from src.config.settings import Config
+
+# Read-only tools the load test can call, with the arguments each one needs.
+# execute_action is left out on purpose: it writes to the database.
+TOOL_ARGUMENTS = {
+    "list_databases": (),
+    "databases_overview": (),
+    "get_database_metadata": ("database_id",),
+    "db_overview": ("database_id",),
+    "table_detail": ("database_id", "table_id"),
+    "profile_table_columns": ("database_id", "table_id"),
+    "run_database_query": ("database_id", "query"),
+    "list_cards": ("database_id",),
+}
+
+DEFAULT_MIX = {"db_overview": 1, "table_detail": 1, "run_database_query": 1}
+
+def _tool_function(name: str) -> Callable:
+    """Import a tool by name"""
+    if name == "list_cards":
+        from src.tools import metabase_card_tools
+        return getattr(metabase_card_tools, name)
+    from src.tools import metabase_tools
+    return getattr(metabase_tools, name)
+
+def percentiles(latencies: List[float]) -> Dict[str, float]:
+    """Return the count, p50, p90, p95, p99 and max of latencies, in milliseconds"""
+    if not latencies:
+        return {"count": 0}
+    ordered = sorted(latencies)
+    summary: Dict[str, float] = {"count": len(ordered)}
+    for p in (50, 90, 95, 99):
+        # Nearest-rank percentile
+        index = max(0, -(-len(ordered) * p // 100) - 1)
+        summary[f"p{p}"] = round(ordered[index] * 1000, 1)
+    summary["max"] = round(ordered[-1] * 1000, 1)
+    return summary
+
+def _counter_delta(current: Dict, baseline: Dict) -> Dict:
+    """Subtract nested counter dicts"""
+    return {
+        key: _counter_delta(value, baseline.get(key, {})) if isinstance(value, dict) else value - baseline.get(key, 0)
+        for key, value in current.items()
+    }
+
+class LoadTest:
+    """One run of a load pattern: workers calling a weighted mix of tools until the duration ends"""
+    
+    def __init__(self, mix: Dict[str, float], concurrency: int, duration: float, database_id: Optional[int],
+                 table_ids: List[int], query: str):
+        self.mix = mix
+        self.concurrency = concurrency
+        self.duration = duration
+        self.database_id = database_id
+        self.table_ids = table_ids
+        self.query = query
+        self.status = "running"
+        self.error: Optional[str] = None
+        self.started_at = time.time()
+        self.finished_at: Optional[float] = None
+        self.latencies: Dict[str, List[float]] = {name: [] for name in mix}
+        self.errors: Dict[str, int] = {name: 0 for name in mix}
+        self._stop = False
+        self._baseline = self._metabase_stats()
+        self._final_stats: Optional[Dict] = None
+    
+    @staticmethod
+    def _metabase_stats() -> Dict:
+        from src.api.metabase import MetabaseAPI
+        return MetabaseAPI.stats()
+    
+    @property
+    def elapsed(self) -> float:
+        return (self.finished_at or time.time()) - self.started_at
+    
+    def stop(self) -> None:
+        """Ask the workers to finish their current call and stop"""
+        self._stop = True
+    
+    async def run(self) -> None:
+        """Run the workers, then release the connections of this event loop"""
+        from src.api.metabase import MetabaseAPI
+        
+        try:
+            if self.table_ids == [] and any("table_id" in TOOL_ARGUMENTS[name] for name in self.mix):
+                await self._discover_tables()
+            deadline = time.monotonic() + self.duration
+            await asyncio.gather(*(self._worker(deadline) for _ in range(self.concurrency)))
+            self.status = "stopped" if self._stop else "completed"
+        except Exception as e:
+            self.status = "failed"
+            self.error = str(e)
+        finally:
+            self.finished_at = time.time()
+            self._final_stats = self._metabase_stats()
+            await MetabaseAPI.close_loop_clients()
+    
+    async def _discover_tables(self) -> None:
+        """Pick the tables of the database for tools that need a table"""
+        from src.api.metabase import MetabaseAPI
+        
+        record = await MetabaseAPI.get_database_schema(self.database_id)
+        if isinstance(record, dict):
+            raise RuntimeError(f"Could not list the tables of database {self.database_id}: {record.get('message')}")
+        self.table_ids = [table.id for table in record.tables]
+        if not self.table_ids:
+            raise RuntimeError(f"Database {self.database_id} has no tables")
+    
+    def _arguments(self, name: str) -> List[Any]:
+        values = {"database_id": self.database_id, "query": self.query}
+        if "table_id" in TOOL_ARGUMENTS[name]:
+            values["table_id"] = random.choice(self.table_ids)
+        return [values[argument] for argument in TOOL_ARGUMENTS[name]]
+    
+    async def _worker(self, deadline: float) -> None:
+        names = list(self.mix)
+        weights = [self.mix[name] for name in names]
+        tools = {name: _tool_function(name) for name in names}
+        while not self._stop and time.monotonic() < deadline:
+            name = random.choices(names, weights)[0]
+            started = time.perf_counter()
+            try:
+                result = await tools[name](*self._arguments(name))
+                failed = isinstance(result, str) and result.startswith("Error")
+            except Exception as e:
+                print(f"Load test call to {name} raised: {e}")
+                failed = True
+            self.latencies[name].append(time.perf_counter() - started)
+            if failed:
+                self.errors[name] += 1
+    
+    def to_dict(self) -> Dict:
+        """Return the settings, latency percentiles, Metabase request counts and cache hit rates"""
+        tools = {}
+        for name in self.mix:
+            tools[name] = percentiles(self.latencies[name])
+            tools[name]["errors"] = self.errors[name]
+        all_latencies = [latency for values in self.latencies.values() for latency in values]
+        overall = percentiles(all_latencies)
+        overall["errors"] = sum(self.errors.values())
+        overall["throughput"] = round(len(all_latencies) / self.elapsed, 1) if self.elapsed > 0 else 0
+        
+        stats = _counter_delta(self._final_stats or self._metabase_stats(), self._baseline)
+        for cache in stats["caches"].values():
+            lookups = cache["hits"] + cache["misses"]
+            cache["hit_rate"] = round(cache["hits"] / lookups, 3) if lookups else None
+        
+        return {
+            "status": self.status,
+            "error": self.error,
+            "mix": self.mix,
+            "concurrency": self.concurrency,
+            "duration": self.duration,
+            "elapsed": round(self.elapsed, 1),
+            "overall": overall,
+            "tools": tools,
+            "metabase_requests": stats["requests"],
+            "caches": stats["caches"],
+        }
+
+class LoadTestRunner:
+    """Runs one load test at a time in a background thread with its own event loop
+    
+    The web interface runs each request in a short-lived event loop, so the
+    test gets a thread of its own and the dashboard polls its progress.
+    """
+    
+    def __init__(self, max_concurrency: int, max_duration: float):
+        self.max_concurrency = max_concurrency
+        self.max_duration = max_duration
+        self.current: Optional[LoadTest] = None
+        self._lock = threading.Lock()
+    
+    def start(self, mix: Dict[str, float], concurrency: int, duration: float, database_id: Optional[int] = None,
+              table_ids: Optional[List[int]] = None, query: str = "SELECT 1") -> LoadTest:
+        """Validate the load pattern and start it
+        
+        Raises:
+            ValueError: If the pattern is invalid or a test is already running
+        """
+        unknown = [name for name in mix if name not in TOOL_ARGUMENTS]
+        if unknown:
+            raise ValueError(f"Unsupported tools: {', '.join(unknown)}. Choose from: {', '.join(TOOL_ARGUMENTS)}")
+        mix = {name: weight for name, weight in mix.items() if weight > 0}
+        if not mix:
+            raise ValueError("The mix needs at least one tool with a positive weight")
+        if not 1 <= concurrency <= self.max_concurrency:
+            raise ValueError(f"Concurrency must be between 1 and {self.max_concurrency}")
+        if not 0 < duration <= self.max_duration:
+            raise ValueError(f"Duration must be between 1 and {self.max_duration:g} seconds")
+        if database_id is None and any("database_id" in TOOL_ARGUMENTS[name] for name in mix):
+            raise ValueError("A database ID is required for the selected tools")
+        
+        with self._lock:
+            if self.current is not None and self.current.status == "running":
+                raise ValueError("A load test is already running")
+            test = LoadTest(mix, concurrency, duration, database_id, list(table_ids or []), query)
+            self.current = test
+        threading.Thread(target=asyncio.run, args=(test.run(),), name="load-test", daemon=True).start()
+        return test
+    
+    def stop(self) -> bool:
+        """Stop the running test, returning False if none is running"""
+        test = self.current
+        if test is None or test.status != "running":
+            return False
+        test.stop()
+        return True
+
+load_test_runner = LoadTestRunner(Config.LOAD_TEST_MAX_CONCURRENCY, Config.LOAD_TEST_MAX_DURATION)
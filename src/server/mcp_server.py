@@ -1,56 +1,161 @@
+import sys
+from contextlib import asynccontextmanager
+from io import TextIOWrapper
+import anyio
 from mcp.server.fastmcp import FastMCP
+from mcp.server.stdio import stdio_server
 from src.config.settings import Config
-from src.tools.metabase_tools import list_databases, get_database_metadata, db_overview, table_detail, visualize_database_relationships, run_database_query
+from src.config.watcher import ConfigWatcher
+from src.api.metabase import MetabaseAPI
+from src.api.recording import session_recorder
+from src.api.warmup import connection_warmer
+from src.api.tracing import traced_tool, tracer
+from src.tools.metabase_tools import list_databases, get_database_metadata, db_overview, databases_overview, table_detail, visualize_database_relationships, run_database_query, profile_table_columns, get_schema_changes, find_join_path, generate_relationship_diagram, run_structured_query, get_server_stats
 from src.tools.metabase_action_tools import list_actions, get_action_details, execute_action
+from src.tools.metabase_job_tools import submit_query_job, get_query_job_status, fetch_query_job_results, cancel_query_job
+from src.tools.metabase_card_tools import list_cards, search_cards, run_card
+
+@asynccontextmanager
+async def server_lifespan(server):
+    """Watch the .env file for configuration saved by the web interface while the server runs
+    
+    With Config.WARMUP_ENABLED, connections to Metabase are warmed up in the
+    background and kept alive with periodic pings. On shutdown, connections
+    are closed, remaining trace spans exported and the request log, if
+    recording, finished.
+    """
+    watcher = ConfigWatcher(Config.CONFIG_FILE, Config.CONFIG_WATCH_INTERVAL, MetabaseAPI.reload_config)
+    watcher.start()
+    if Config.WARMUP_ENABLED:
+        connection_warmer.start()
+    try:
+        yield
+    finally:
+        await watcher.stop()
+        await connection_warmer.stop()
+        await MetabaseAPI.close_clients()
+        await tracer.shutdown()
+        session_recorder.close()
 
 def create_mcp_server():
     """Create and configure an MCP server instance."""
-    mcp = FastMCP(Config.MCP_NAME)
+    mcp = FastMCP(Config.MCP_NAME, lifespan=server_lifespan)
     
     # Register database tools
     mcp.tool(
         description="List all databases configured in Metabase"
-    )(list_databases)
+    )(traced_tool(list_databases))
     
     mcp.tool(
-        description="Get detailed metadata for a specific database"
-    )(get_database_metadata)
+        description="Get detailed metadata for a specific database. Pass a focus (keywords or table names) and/or a token_budget to get the most relevant tables packed into a bounded response"
+    )(traced_tool(get_database_metadata))
     
     mcp.tool(
         description="Get a high-level overview of all tables in a database"
-    )(db_overview)
+    )(traced_tool(db_overview))
+    
+    mcp.tool(
+        description="Get a combined overview of all or selected databases at once: engines, table counts, sizes and largest tables"
+    )(traced_tool(databases_overview))
 
     mcp.tool(
         description="Get detailed information about a specific table"
-    )(table_detail)
+    )(traced_tool(table_detail))
 
     mcp.tool(
         description="Generate a visual representation of database relationships"
-    )(visualize_database_relationships)
+    )(traced_tool(visualize_database_relationships))
 
     mcp.tool(
-        description="Run a read-only SQL query against a database"
-    )(run_database_query)
+        description="Run a read-only SQL query against a database; set summarize to add per-column statistics of the result"
+    )(traced_tool(run_database_query))
+    
+    mcp.tool(
+        description="Run a structured query (aggregations, breakouts, filters, order, limit) on one table, validated against its fields and cacheable by Metabase"
+    )(traced_tool(run_structured_query))
 
+    mcp.tool(
+        description="Profile the columns of a table: distinct counts, null rates, min/max and sample values (cached)"
+    )(traced_tool(profile_table_columns))
+    
+    mcp.tool(
+        description="Incrementally sync a database schema and list table and field changes since a schema version"
+    )(traced_tool(get_schema_changes))
+    
+    mcp.tool(
+        description="Find the shortest foreign key join paths between two tables and generate the JOIN clause"
+    )(traced_tool(find_join_path))
+    
+    mcp.tool(
+        description="Generate a Mermaid or Graphviz DOT diagram of table relationships, centered on a table or clustered by schema or component"
+    )(traced_tool(generate_relationship_diagram))
+    
     # Register action tools
     mcp.tool(
         description="List all actions configured in Metabase"
-    )(list_actions)
+    )(traced_tool(list_actions))
 
     mcp.tool(
         description="Get detailed information about a specific action"
-    )(get_action_details)
+    )(traced_tool(get_action_details))
 
     mcp.tool(
-        description="Execute a Metabase action with parameters"
-    )(execute_action)
+        description="Execute a Metabase action with parameters; pass the same idempotency_key when retrying so the action runs only once"
+    )(traced_tool(execute_action))
+    
+    # Register saved question tools
+    mcp.tool(
+        description="List saved Metabase questions (cards), optionally filtered by database or collection"
+    )(traced_tool(list_cards))
+    
+    mcp.tool(
+        description="Search saved Metabase questions (cards) by name and description"
+    )(traced_tool(search_cards))
+    
+    mcp.tool(
+        description="Run a saved Metabase question (card) with parameter values; prefer this over writing new SQL when a card fits"
+    )(traced_tool(run_card))
+    
+    # Register background query job tools
+    mcp.tool(
+        description="Start a slow read-only SQL query in the background and return a job ID immediately"
+    )(traced_tool(submit_query_job))
+    
+    mcp.tool(
+        description="Get the status of a background query job"
+    )(traced_tool(get_query_job_status))
+    
+    mcp.tool(
+        description="Fetch a page of results from a completed background query job"
+    )(traced_tool(fetch_query_job_results))
+    
+    mcp.tool(
+        description="Cancel a running background query job"
+    )(traced_tool(cancel_query_job))
+    
+    # Register server diagnostics tools
+    mcp.tool(
+        description="Get this server's connection warm-up timings, Metabase request counts and cache hit rates"
+    )(traced_tool(get_server_stats))
     
     return mcp
 
+async def _run_stdio(mcp: FastMCP, protocol_stdout) -> None:
+    """Serve MCP over stdin and the given stdout"""
+    async with stdio_server(stdout=protocol_stdout) as (read_stream, write_stream):
+        await mcp._mcp_server.run(read_stream, write_stream, mcp._mcp_server.create_initialization_options())
+
 def run_mcp_server():
-    """Run the MCP server"""
+    """Run the MCP server
+    
+    stdout carries the protocol's messages, so the transport keeps the real
+    stdout and everything else printed by the server goes to stderr. Output
+    printed to stdout could otherwise end up in the middle of a message.
+    """
     mcp = create_mcp_server()
-    mcp.run(transport='stdio')
+    protocol_stdout = anyio.wrap_file(TextIOWrapper(sys.stdout.buffer, encoding="utf-8"))
+    sys.stdout = sys.stderr
+    anyio.run(_run_stdio, mcp, protocol_stdout)
 
 if __name__ == "__main__":
     run_mcp_server() 
\ No newline at end of file
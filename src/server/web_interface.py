@@ -1,7 +1,6 @@
 import os
 from flask import Flask, request, render_template, redirect, url_for, flash, jsonify
 from src.config.settings import Config
-from src.api.metabase import MetabaseAPI
 
 def create_app():
     """Create and configure the Flask application"""
@@ -38,10 +37,7 @@ def create_app():
             flash('Configuration saved successfully!')
         else:
             # Only update URL if API key wasn't changed
-            with open(Config.CONFIG_FILE, 'w') as f:
-                f.write(f"METABASE_URL={metabase_url}\n")
-                f.write(f"METABASE_API_KEY={Config._METABASE_API_KEY}\n")
-                f.write(f"SECRET_KEY={Config.SECRET_KEY}\n")
+            Config.write_config_file(metabase_url, Config._METABASE_API_KEY)
             
             # Update current environment and class attribute
             os.environ['METABASE_URL'] = metabase_url
@@ -65,6 +61,8 @@ def create_app():
         old_key = Config.get_metabase_api_key()
         Config.METABASE_URL = metabase_url
         
+        from src.api.metabase import MetabaseAPI
+        
         try:
             success, message = await MetabaseAPI.test_connection()
             
@@ -116,6 +114,7 @@ def create_app():
     async def test_list_actions():
         """Test the list_actions tool"""
         from src.tools.metabase_action_tools import list_actions
+        from src.api.metabase import MetabaseAPI
         
         try:
             # Get version info
@@ -252,6 +251,64 @@ def create_app():
             print(f"Error in test_table_detail: {str(e)}\n{error_traceback}")
             return jsonify({'success': False, 'error': str(e)})
     
+    @app.route('/dashboard')
+    def dashboard():
+        """Performance dashboard with the load test runner"""
+        from src.server.load_test import TOOL_ARGUMENTS, DEFAULT_MIX, load_test_runner
+        
+        return render_template(
+            'dashboard.html',
+            tools=list(TOOL_ARGUMENTS),
+            default_mix=DEFAULT_MIX,
+            max_concurrency=load_test_runner.max_concurrency,
+            max_duration=load_test_runner.max_duration
+        )
+    
+    @app.route('/load_test', methods=['POST'])
+    def start_load_test():
+        """Start a load test with the concurrency, duration and tool mix from the form"""
+        from src.server.load_test import TOOL_ARGUMENTS, load_test_runner
+        
+        try:
+            mix = {}
+            for name in TOOL_ARGUMENTS:
+                weight = request.form.get(f'weight_{name}', '').strip()
+                if weight:
+                    mix[name] = float(weight)
+            database_id = request.form.get('database_id', '').strip()
+            table_ids = request.form.get('table_ids', '').strip()
+            
+            test = load_test_runner.start(
+                mix,
+                int(request.form.get('concurrency', '1')),
+                float(request.form.get('duration', '30')),
+                int(database_id) if database_id else None,
+                [int(table_id) for table_id in table_ids.split(',') if table_id.strip()],
+                request.form.get('query', '').strip() or "SELECT 1"
+            )
+            return jsonify({'success': True, 'result': test.to_dict()})
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)})
+    
+    @app.route('/load_test')
+    def load_test_status():
+        """Return the progress and statistics of the current or last load test"""
+        from src.server.load_test import load_test_runner
+        
+        test = load_test_runner.current
+        if test is None:
+            return jsonify({'success': False, 'error': 'No load test has been run'})
+        return jsonify({'success': True, 'result': test.to_dict()})
+    
+    @app.route('/load_test/stop', methods=['POST'])
+    def stop_load_test():
+        """Stop the running load test"""
+        from src.server.load_test import load_test_runner
+        
+        if not load_test_runner.stop():
+            return jsonify({'success': False, 'error': 'No load test is running'})
+        return jsonify({'success': True, 'result': 'Stopping load test'})
+    
     return app
 
 if __name__ == '__main__':
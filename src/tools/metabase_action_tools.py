@@ -1,5 +1,6 @@
 from src.api.metabase import MetabaseAPI
-from typing import Dict, Any
+from src.api.tracing import start_phase
+from typing import Dict, Any, Optional
 
 async def list_actions() -> str:
     """
@@ -23,6 +24,7 @@ async def list_actions() -> str:
     if not response:
         return "No actions found in Metabase. You may need to create some actions first."
     
+    start_phase("render")
     result = "## Actions in Metabase\n\n"
     for action in response:
         result += f"- **ID**: {action.get('id')}\n"
@@ -48,6 +50,7 @@ async def get_action_details(action_id: int) -> str:
     if response is None or "error" in response:
         return f"Error fetching action details: {response.get('message', 'Unknown error')}"
     
+    start_phase("render")
     result = f"## Action: {response.get('name')}\n\n"
     result += f"**ID**: {response.get('id')}\n"
     result += f"**Type**: {response.get('type')}\n"
@@ -70,13 +73,20 @@ async def get_action_details(action_id: int) -> str:
     
     return result
 
-async def execute_action(action_id: int, parameters: Dict[str, Any] = None) -> str:
+async def execute_action(action_id: int, parameters: Dict[str, Any] = None, idempotency_key: Optional[str] = None) -> str:
     """
     Execute a Metabase action with the provided parameters.
     
+    Executing again with the same idempotency key within the idempotency
+    window returns the recorded result instead of running the action twice.
+    Without a key, only a retry with the same parameters within a few seconds
+    is answered this way.
+    
     Args:
         action_id: The ID of the action to execute
         parameters: Dictionary of parameter values to use when executing the action
+        idempotency_key: Key identifying this logical execution; pass the same key when retrying.
+            Defaults to a key derived from the parameters that only covers quick retries
         
     Returns:
         A formatted string with the execution results.
@@ -90,18 +100,25 @@ async def execute_action(action_id: int, parameters: Dict[str, Any] = None) -> s
         return f"Error: Action with ID {action_id} not found. {action_details.get('message', '')}"
     
     # Execute the action
-    response = await MetabaseAPI.make_request(
-        f"action/{action_id}/execute", 
-        method="POST",
-        data={"parameters": parameters}
-    )
+    execution = await MetabaseAPI.execute_action(action_id, parameters, idempotency_key)
     
-    if response is None or "error" in response:
-        error_msg = response.get('message', 'Unknown error') if response else 'No response'
+    if execution is None or "error" in execution:
+        error_msg = execution.get('message', 'Unknown error') if execution else 'No response'
         return f"Error executing action: {error_msg}"
     
+    response = execution['response']
+    
     # Format the successful response
+    start_phase("render")
     result = f"## Action Execution Results for '{action_details.get('name')}'\n\n"
+    if execution['replayed']:
+        result += (f"**Status**: Replayed, not executed. This execution already ran {execution['recorded_age']:.0f}s ago "
+                   "and its recorded result is shown; pass a new idempotency_key to run the action again.\n")
+    else:
+        result += "**Status**: Executed\n"
+    if execution['idempotency_key']:
+        result += f"**Idempotency Key**: `{execution['idempotency_key']}`\n"
+    result += "\n"
     
     # Format the response based on what was returned
     if isinstance(response, dict):
@@ -0,0 +1,136 @@
+from typing import Any, Dict, Optional
+from src.api.metabase import MetabaseAPI
+from src.api.tracing import start_phase
+from src.tools.metabase_tools import stale_note
+
+# Maximum number of cards shown by list_cards
+MAX_LISTED_CARDS = 100
+
+def _format_card(card) -> str:
+    """Format one saved question as a markdown list entry"""
+    result = f"- **{card.name}** (ID: {card.id})\n"
+    result += f"  Collection: {card.collection} | Database ID: {card.database_id} | Type: {card.query_type} | Display: {card.display}\n"
+    if card.description:
+        result += f"  {card.description}\n"
+    if card.parameters:
+        parameters = ", ".join(
+            f"{parameter.slug} ({parameter.type}{', required' if parameter.required and parameter.default is None else ''})"
+            for parameter in card.parameters
+        )
+        result += f"  Parameters: {parameters}\n"
+    return result
+
+async def list_cards(database_id: Optional[int] = None, collection: Optional[str] = None) -> str:
+    """
+    List saved questions (cards), optionally for one database or collection.
+    
+    Args:
+        database_id: Only list cards querying this database (optional)
+        collection: Only list cards in the collection with this name (optional)
+        
+    Returns:
+        A formatted string with the cards grouped by collection.
+    """
+    catalog = await MetabaseAPI.get_card_catalog()
+    
+    if catalog is None or isinstance(catalog, dict):
+        return f"Error fetching cards: {catalog.get('message', 'Unknown error') if catalog else 'No response'}"
+    
+    cards = catalog.filter(database_id, collection)
+    if not cards:
+        return "No saved questions found."
+    
+    start_phase("render")
+    result = f"## Saved Questions ({len(cards)})\n\n"
+    result += stale_note("card list", catalog.stale_age())
+    current_collection = None
+    for card in cards[:MAX_LISTED_CARDS]:
+        if card.collection != current_collection:
+            if current_collection is not None:
+                result += "\n"
+            current_collection = card.collection
+            result += f"### {current_collection}\n\n"
+        result += _format_card(card)
+    
+    if len(cards) > MAX_LISTED_CARDS:
+        result += f"\n*Showing {MAX_LISTED_CARDS} of {len(cards)} cards. Use search_cards or filter by database or collection.*\n"
+    
+    return result
+
+async def search_cards(query: str, limit: int = 10) -> str:
+    """
+    Search saved questions (cards) by name and description.
+    
+    Args:
+        query: Words to search for; each word matches by prefix, e.g. "monthly rev"
+        limit: Maximum number of cards to return (default: 10)
+        
+    Returns:
+        A formatted string with the best matching cards and their parameters.
+    """
+    catalog = await MetabaseAPI.get_card_catalog()
+    
+    if catalog is None or isinstance(catalog, dict):
+        return f"Error searching cards: {catalog.get('message', 'Unknown error') if catalog else 'No response'}"
+    
+    matches = catalog.search(query, limit)
+    if not matches:
+        return f"No saved questions match '{query}'."
+    
+    start_phase("render")
+    result = f"## Saved Questions matching '{query}'\n\n"
+    result += stale_note("card list", catalog.stale_age())
+    for card, _ in matches:
+        result += _format_card(card)
+    
+    return result
+
+async def run_card(card_id: int, parameters: Optional[Dict[str, Any]] = None, refresh: bool = False, row_limit: int = 20) -> str:
+    """
+    Run a saved question (card) with optional parameter values.
+    
+    Args:
+        card_id: The ID of the card to run
+        parameters: Parameter values keyed by parameter slug or name, e.g. {"start_date": "2024-01-01"} (optional)
+        refresh: Run the card again instead of returning a recently cached result (default: False)
+        row_limit: Maximum number of rows to show (default: 20)
+        
+    Returns:
+        A formatted string with the card's results.
+    """
+    response = await MetabaseAPI.run_card(card_id, parameters, refresh)
+    
+    if response is None or "error" in response:
+        return f"Error running card: {response.get('message', 'Unknown error') if response else 'No response'}"
+    
+    card = response['card']
+    query_response = response['response']
+    start_phase("render")
+    result = f"## {card.name}\n\n"
+    result += f"**Card ID**: {card.id}\n"
+    if parameters:
+        result += f"**Parameters**: {', '.join(f'{key}={value}' for key, value in parameters.items())}\n"
+    if response['cached']:
+        result += "**Source**: local result cache\n"
+    elif query_response.get('cached'):
+        result += "**Source**: Metabase result cache\n"
+    result += "\n"
+    
+    data = query_response.get('data') or {}
+    columns = [col.get('display_name') or col.get('name', f"Column {i}") for i, col in enumerate(data.get('cols', []))]
+    rows = data.get('rows') or []
+    if not columns or not rows:
+        result += "No data returned by the card.\n"
+        return result
+    
+    shown = rows[:max(row_limit, 1)]
+    result += "| " + " | ".join(columns) + " |\n"
+    result += "| " + " | ".join(["---"] * len(columns)) + " |\n"
+    for row in shown:
+        result += "| " + " | ".join("NULL" if cell is None else str(cell).replace('\n', ' ').replace('|', '\\|') for cell in row) + " |\n"
+    
+    row_count = query_response.get('row_count', len(rows))
+    if row_count > len(shown):
+        result += f"\n*Showing {len(shown)} of {row_count} rows*\n"
+    
+    return result
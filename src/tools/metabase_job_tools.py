@@ -0,0 +1,123 @@
+from typing import Optional
+from src.api.jobs import query_jobs
+from src.api.sql_statements import parse_statement
+from src.config.settings import Config
+
+async def submit_query_job(database_id: int, query: str, row_limit: Optional[int] = None) -> str:
+    """
+    Start a read-only SQL query in the background and return a job ID immediately.
+    
+    Args:
+        database_id: The ID of the database to query
+        query: The SQL query to execute
+        row_limit: Maximum number of rows to keep (default: QUERY_JOB_ROW_LIMIT)
+        
+    Returns:
+        A formatted string with the job ID to poll with get_query_job_status.
+    """
+    if row_limit is not None and row_limit <= 0:
+        return "Error: row_limit must be a positive integer"
+    
+    # Reject writes now rather than in the background
+    parsed = parse_statement(query.strip().rstrip(';').rstrip())
+    if parsed.error:
+        return f"Error: Query rejected: {parsed.error}"
+    
+    job = query_jobs.submit(database_id, query, row_limit=min(row_limit or Config.QUERY_JOB_ROW_LIMIT, Config.QUERY_JOB_ROW_LIMIT))
+    if job is None:
+        return f"Error: Too many running query jobs (limit {query_jobs.max_jobs}). Wait for one to finish or cancel one."
+    
+    result = "## Query Job Submitted\n\n"
+    result += f"**Job ID**: {job.job_id}\n"
+    result += f"**Database ID**: {job.database_id}\n"
+    result += f"**Row Limit**: {job.row_limit}\n"
+    result += f"**Timeout**: {job.timeout:g}s\n\n"
+    result += "Use get_query_job_status to check progress and fetch_query_job_results to read the rows.\n"
+    return result
+
+async def get_query_job_status(job_id: str) -> str:
+    """
+    Get the status of a background query job.
+    
+    Args:
+        job_id: The ID returned by submit_query_job
+        
+    Returns:
+        A formatted string with the job status, runtime and row count.
+    """
+    job = query_jobs.get(job_id)
+    if job is None:
+        return f"Error: Query job {job_id} not found. It may have expired."
+    
+    result = f"## Query Job {job.job_id}\n\n"
+    result += f"**Status**: {job.status}\n"
+    result += f"**Database ID**: {job.database_id}\n"
+    result += f"**Elapsed**: {job.elapsed:.1f}s\n"
+    if job.status == "completed":
+        result += f"**Rows**: {len(job.rows)}\n"
+    if job.error:
+        result += f"**Error**: {job.error}\n"
+    result += f"\n```sql\n{job.query}\n```\n"
+    return result
+
+async def fetch_query_job_results(job_id: str, page: int = 1, page_size: int = 50) -> str:
+    """
+    Fetch one page of rows from a completed background query job.
+    
+    Args:
+        job_id: The ID returned by submit_query_job
+        page: The page number to fetch, starting at 1
+        page_size: Number of rows per page (default: 50)
+        
+    Returns:
+        A formatted string with the requested rows as a markdown table.
+    """
+    job = query_jobs.get(job_id)
+    if job is None:
+        return f"Error: Query job {job_id} not found. It may have expired."
+    
+    if job.status != "completed":
+        return f"Query job {job.job_id} is {job.status}." + (f" Error: {job.error}" if job.error else "")
+    
+    if page < 1 or page_size < 1:
+        return "Error: page and page_size must be positive integers"
+    
+    total = len(job.rows)
+    page_count = max((total + page_size - 1) // page_size, 1)
+    start = (page - 1) * page_size
+    rows = job.rows[start:start + page_size]
+    
+    result = f"## Query Job {job.job_id} Results (page {page} of {page_count})\n\n"
+    if not rows:
+        result += "No rows on this page.\n" if total else "No data returned by the query.\n"
+        return result
+    
+    result += "| " + " | ".join(job.columns) + " |\n"
+    result += "| " + " | ".join(["---"] * len(job.columns)) + " |\n"
+    for row in rows:
+        result += "| " + " | ".join([str(cell) for cell in row]) + " |\n"
+    
+    result += f"\n*Showing rows {start + 1}-{start + len(rows)} of {total}*\n"
+    if total >= job.row_limit:
+        result += f"*Results were capped at the job's row limit of {job.row_limit}*\n"
+    return result
+
+async def cancel_query_job(job_id: str) -> str:
+    """
+    Cancel a running background query job.
+    
+    Args:
+        job_id: The ID returned by submit_query_job
+        
+    Returns:
+        A formatted string confirming the cancellation or describing the job state.
+    """
+    job = query_jobs.get(job_id)
+    if job is None:
+        return f"Error: Query job {job_id} not found. It may have expired."
+    
+    if job.is_finished:
+        return f"Query job {job.job_id} already {job.status}."
+    
+    query_jobs.cancel(job_id)
+    return f"Query job {job.job_id} is being cancelled."
@@ -1,5 +1,25 @@
+import json
+import time
+from typing import Dict, List, Optional
 from src.api.metabase import MetabaseAPI
+from src.api.schema_sync import SchemaFilter
+from src.api.tracing import start_phase
+from src.api.warmup import connection_warmer
 from src.config.settings import Config
+from src.tools.relationship_diagrams import render_dot, render_mermaid
+from src.tools.schema_packing import CHARS_PER_TOKEN, pack_tables
+
+def stale_note(what: str, age: Optional[float]) -> str:
+    """Return a note that cached data is shown because Metabase is unavailable, or "" if it is fresh"""
+    if age is None:
+        return ""
+    if age < 120:
+        elapsed = f"{age:.0f}s"
+    elif age < 7200:
+        elapsed = f"{age / 60:.0f} min"
+    else:
+        elapsed = f"{age / 3600:.1f} h"
+    return f"*Note: Metabase is unavailable; showing the cached {what} from {elapsed} ago.*\n\n"
 
 async def list_databases() -> str:
     """
@@ -39,6 +59,7 @@ async def list_databases() -> str:
         return f"Error: Expected a list of databases, but got {type(response).__name__}: {response}"
     
     # Now we should have a list of databases
+    start_phase("render")
     result = "## Databases in Metabase\n\n"
     
     for db in response:
@@ -60,65 +81,83 @@ async def list_databases() -> str:
     
     return result
 
-async def get_database_metadata(database_id: int) -> str:
+async def get_database_metadata(database_id: int, schema_name: Optional[str] = None, table_pattern: Optional[str] = None, include_hidden: bool = False,
+                                focus: Optional[str] = None, token_budget: Optional[int] = None, char_budget: Optional[int] = None) -> str:
     """
     Get metadata for a specific database in Metabase, including table relationships.
     
+    Giving a focus or a budget switches to packed mode: tables are ranked by
+    relevance to the focus and foreign key proximity to the matching tables,
+    the most relevant are shown in full and the rest as one-line summaries,
+    all within the budget.
+    
     Args:
         database_id: The ID of the database to fetch metadata for
+        schema_name: Only include tables in this schema (optional)
+        table_pattern: Only include tables whose name matches this glob pattern, e.g. "order*" (optional)
+        include_hidden: Include tables and fields hidden in Metabase (default: False)
+        focus: Keywords or table names the question is about, e.g. "orders customer email" (optional)
+        token_budget: Approximate maximum size of the output in tokens (optional, default: SCHEMA_PACK_TOKEN_BUDGET)
+        char_budget: Maximum size of the output in characters, instead of token_budget (optional)
         
     Returns:
         A formatted string with the database's metadata including tables, fields, and relationships.
     """
-    response = await MetabaseAPI.get_database_schema(database_id)
+    if focus or token_budget or char_budget:
+        return await _packed_database_metadata(database_id, schema_name, table_pattern, include_hidden, focus,
+                                               char_budget or (token_budget or Config.SCHEMA_PACK_TOKEN_BUDGET) * CHARS_PER_TOKEN)
     
-    if response is None or "error" in response:
-        return f"Error fetching database metadata: {response.get('message', 'Unknown error')}"
+    response = await MetabaseAPI.get_database_schema(database_id, schema_name, table_pattern, include_hidden)
     
-    result = f"## Metadata for Database: {response.get('name')}\n\n"
+    if response is None or isinstance(response, dict):
+        return f"Error fetching database metadata: {response.get('message', 'Unknown error') if response else 'No response'}"
+    
+    start_phase("render")
+    result = f"## Metadata for Database: {response.name}\n\n"
+    result += stale_note("metadata", response.stale_age)
     
     # Add database details
-    result += f"**ID**: {response.get('id')}\n"
-    result += f"**Engine**: {response.get('engine')}\n"
-    result += f"**Is Sample**: {response.get('is_sample', False)}\n\n"
+    result += f"**ID**: {response.id}\n"
+    result += f"**Engine**: {response.engine}\n"
+    result += f"**Is Sample**: {response.is_sample}\n\n"
     
     # Add tables information
-    tables = response.get('tables', [])
+    tables = response.tables
     result += f"### Tables ({len(tables)})\n\n"
     
     # Create a map of table IDs to names for reference
-    table_map = {table.get('id'): table.get('name') for table in tables}
+    table_map = {table.id: table.name for table in tables}
     
     for table in tables:
-        result += f"#### {table.get('name')}\n"
-        result += f"**ID**: {table.get('id')}\n"
-        result += f"**Schema**: {table.get('schema', 'N/A')}\n"
-        result += f"**Description**: {table.get('description', 'No description')}\n\n"
+        result += f"#### {table.name}\n"
+        result += f"**ID**: {table.id}\n"
+        result += f"**Schema**: {table.schema or 'N/A'}\n"
+        result += f"**Description**: {table.description or 'No description'}\n\n"
         
         # Add fields for this table
-        fields = table.get('fields', [])
+        fields = table.fields
         result += f"##### Fields ({len(fields)})\n\n"
         
         # Track foreign keys for relationship section
         foreign_keys = []
         
         for field in fields:
-            result += f"- **{field.get('name')}**\n"
-            result += f"  - Type: {field.get('base_type')}\n"
-            result += f"  - Description: {field.get('description', 'No description')}\n"
+            result += f"- **{field.name}**\n"
+            result += f"  - Type: {field.base_type}\n"
+            result += f"  - Description: {field.description or 'No description'}\n"
             
             # Check if this is a foreign key
-            fk_target_field_id = field.get('fk_target_field_id')
+            fk_target_field_id = field.fk_target_field_id
             if fk_target_field_id:
                 foreign_keys.append({
-                    'source_field': field.get('name'),
-                    'source_field_id': field.get('id'),
+                    'source_field': field.name,
+                    'source_field_id': field.id,
                     'target_field_id': fk_target_field_id
                 })
                 result += f"  - **Foreign Key** to another table\n"
             
-            if field.get('special_type'):
-                result += f"  - Special Type: {field.get('special_type')}\n"
+            if field.semantic_type:
+                result += f"  - Special Type: {field.semantic_type}\n"
         
         # Add relationships section if there are foreign keys
         if foreign_keys:
@@ -131,10 +170,10 @@ async def get_database_metadata(database_id: int) -> str:
                 
                 # Search all tables for the target field
                 for t in tables:
-                    for f in t.get('fields', []):
-                        if f.get('id') == fk['target_field_id']:
-                            target_field_info = f.get('name')
-                            target_table_name = t.get('name')
+                    for f in t.fields:
+                        if f.id == fk['target_field_id']:
+                            target_field_info = f.name
+                            target_table_name = t.name
                             break
                 
                 result += f"- **{fk['source_field']}** → **{target_table_name}.{target_field_info}**\n"
@@ -147,19 +186,19 @@ async def get_database_metadata(database_id: int) -> str:
     
     # Create a simple text-based diagram of relationships
     for table in tables:
-        table_name = table.get('name')
+        table_name = table.name
         result += f"{table_name}\n"
         
-        for field in table.get('fields', []):
-            fk_target_field_id = field.get('fk_target_field_id')
+        for field in table.fields:
+            fk_target_field_id = field.fk_target_field_id
             if fk_target_field_id:
                 # Find target field information
                 for t in tables:
-                    for f in t.get('fields', []):
-                        if f.get('id') == fk_target_field_id:
-                            target_field = f.get('name')
-                            target_table = t.get('name')
-                            result += f"  └── {field.get('name')} → {target_table}.{target_field}\n"
+                    for f in t.fields:
+                        if f.id == fk_target_field_id:
+                            target_field = f.name
+                            target_table = t.name
+                            result += f"  └── {field.name} → {target_table}.{target_field}\n"
         
         result += "\n"
     
@@ -167,26 +206,58 @@ async def get_database_metadata(database_id: int) -> str:
     
     return result
 
-async def visualize_database_relationships(database_id: int) -> str:
+async def _packed_database_metadata(database_id: int, schema_name: Optional[str], table_pattern: Optional[str],
+                                    include_hidden: bool, focus: Optional[str], budget: int) -> str:
+    """Render the tables most relevant to the focus within a character budget"""
+    response = await MetabaseAPI.rank_schema_tables(database_id, focus, schema_name, table_pattern, include_hidden)
+    
+    if response is None or "error" in response:
+        return f"Error fetching database metadata: {response.get('message', 'Unknown error') if response else 'No response'}"
+    
+    ranked = response['tables']
+    if not ranked:
+        return "No tables found in this database."
+    
+    start_phase("render")
+    database = response['database']
+    result = f"## Metadata for Database: {database.name}\n\n"
+    result += stale_note("metadata", response['stale_age'])
+    result += f"**ID**: {database.id} | **Engine**: {database.engine} | **Tables**: {len(ranked)}\n"
+    if focus:
+        result += f"Tables ranked by relevance to: {focus}\n"
+    result += "\n"
+    
+    result += pack_tables(ranked, response['graph'], max(budget - len(result), 0))
+    return result
+
+async def visualize_database_relationships(database_id: int, schema_name: Optional[str] = None, table_pattern: Optional[str] = None, include_hidden: bool = False) -> str:
     """
     Generate a visual representation of database relationships.
     
     Args:
         database_id: The ID of the database to visualize
+        schema_name: Only include tables in this schema (optional)
+        table_pattern: Only include tables whose name matches this glob pattern, e.g. "order*" (optional)
+        include_hidden: Include tables and fields hidden in Metabase (default: False)
         
     Returns:
         A formatted string with a visualization of table relationships.
     """
-    response = await MetabaseAPI.get_database_schema(database_id)
+    response = await MetabaseAPI.get_database_schema(database_id, schema_name, table_pattern, include_hidden)
     
-    if response is None or "error" in response:
-        return f"Error fetching database schema: {response.get('message', 'Unknown error')}"
+    if response is None or isinstance(response, dict):
+        return f"Error fetching database schema: {response.get('message', 'Unknown error') if response else 'No response'}"
     
-    tables = response.get('tables', [])
+    tables = response.tables
     if not tables:
         return "No tables found in this database."
     
-    result = f"## Database Relationship Diagram for: {response.get('name')}\n\n"
+    # Index fields by ID so each foreign key target is found without scanning every table
+    field_index = {f.id: (t.name, f.name) for t in tables for f in t.fields}
+    
+    start_phase("render")
+    result = f"## Database Relationship Diagram for: {response.name}\n\n"
+    result += stale_note("schema", response.stale_age)
     
     # Generate a text-based ER diagram
     result += "```\n"
@@ -194,24 +265,19 @@ async def visualize_database_relationships(database_id: int) -> str:
     # First list all tables
     result += "Tables:\n"
     for table in tables:
-        result += f"  {table.get('name')}\n"
+        result += f"  {table.name}\n"
     
     result += "\nRelationships:\n"
     
     # Then show all relationships
     for table in tables:
-        table_name = table.get('name')
+        table_name = table.name
         
-        for field in table.get('fields', []):
-            fk_target_field_id = field.get('fk_target_field_id')
-            if fk_target_field_id:
-                # Find target field information
-                for t in tables:
-                    for f in t.get('fields', []):
-                        if f.get('id') == fk_target_field_id:
-                            target_field = f.get('name')
-                            target_table = t.get('name')
-                            result += f"  {table_name}.{field.get('name')} → {target_table}.{target_field}\n"
+        for field in table.fields:
+            fk_target_field_id = field.fk_target_field_id
+            if fk_target_field_id in field_index:
+                target_table, target_field = field_index[fk_target_field_id]
+                result += f"  {table_name}.{field.name} → {target_table}.{target_field}\n"
     
     result += "```\n\n"
     
@@ -219,42 +285,43 @@ async def visualize_database_relationships(database_id: int) -> str:
     result += "### Detailed Relationships\n\n"
     
     for table in tables:
-        table_name = table.get('name')
+        table_name = table.name
         has_relationships = False
         
-        for field in table.get('fields', []):
-            fk_target_field_id = field.get('fk_target_field_id')
+        for field in table.fields:
+            fk_target_field_id = field.fk_target_field_id
             if fk_target_field_id:
                 if not has_relationships:
                     result += f"**{table_name}** has the following relationships:\n\n"
                     has_relationships = True
                 
-                # Find target field information
-                for t in tables:
-                    for f in t.get('fields', []):
-                        if f.get('id') == fk_target_field_id:
-                            target_field = f.get('name')
-                            target_table = t.get('name')
-                            result += f"- Field **{field.get('name')}** references **{target_table}.{target_field}**\n"
+                if fk_target_field_id in field_index:
+                    target_table, target_field = field_index[fk_target_field_id]
+                    result += f"- Field **{field.name}** references **{target_table}.{target_field}**\n"
         
         if has_relationships:
             result += "\n"
     
     return result
 
-async def run_database_query(database_id: int, query: str) -> str:
+async def run_database_query(database_id: int, query: str, summarize: bool = False) -> str:
     """
     Run a read-only SQL query against a database and return the first 5 rows.
     
     Args:
         database_id: The ID of the database to query
         query: The SQL query to execute (will be limited to 5 rows)
+        summarize: Also summarize up to QUERY_SUMMARY_ROW_LIMIT rows per column:
+            nulls, min/max, approximate distinct count, top values and quantiles (default: False)
         
     Returns:
         A formatted string with the query results or error message
     """
-    # Execute the query with a limit of 5 rows
-    response = await MetabaseAPI.run_query(database_id, query, row_limit=5)
+    if summarize:
+        response = await MetabaseAPI.summarize_query(database_id, query)
+    else:
+        # Execute the query with a limit of 5 rows
+        response = await MetabaseAPI.run_query(database_id, query, row_limit=5)
     
     if response is None:
         return "Error: No response received from Metabase API"
@@ -286,9 +353,16 @@ async def run_database_query(database_id: int, query: str) -> str:
         return f"Error executing query: {error_message}"
     
     # Format the results
+    start_phase("render")
     result = f"## Query Results\n\n"
     result += f"```sql\n{query}\n```\n\n"
     
+    if response.get("cost_warning"):
+        result += f"**Warning**: {response['cost_warning']}\n\n"
+    
+    if summarize:
+        return result + _format_query_summary(response)
+    
     # Extract and format the data
     try:
         # Get column names
@@ -325,31 +399,68 @@ async def run_database_query(database_id: int, query: str) -> str:
     
     return result
 
-async def db_overview(database_id: int) -> str:
+def _format_query_summary(response: dict) -> str:
+    """Format the sample rows and column summaries of a summarized query"""
+    columns = response['columns']
+    rows = response['sample_rows']
+    if not columns or not rows:
+        return "No data returned by the query.\n"
+    
+    result = "| " + " | ".join(columns) + " |\n"
+    result += "| " + " | ".join(["---"] * len(columns)) + " |\n"
+    for row in rows:
+        result += "| " + " | ".join("NULL" if cell is None else _format_stat(cell) for cell in row) + " |\n"
+    
+    row_count = response['row_count']
+    result += f"\n*Showing {len(rows)} of {row_count} rows*"
+    if row_count >= response['row_limit']:
+        result += f" *(summary limited to the first {response['row_limit']} rows)*"
+    result += "\n\n### Column Summary\n\n"
+    
+    result += "| Column | Nulls | Distinct (approx.) | Min | Max | Quantiles (p5 / p25 / p50 / p75 / p95) | Top Values |\n"
+    result += "| ------ | ----- | ------------------ | --- | --- | ------------------------------------- | ---------- |\n"
+    for summary in response['summaries']:
+        quantiles = " / ".join(_format_stat(value) for value in summary['quantiles'].values()) or "N/A"
+        prefix = "" if summary['top_values_exact'] else "≥"
+        top_values = ", ".join(f"{_format_stat(value)} ({prefix}{count})" for value, count in summary['top_values']) or "N/A"
+        result += (
+            f"| {summary['name']} | {summary['nulls']} | {summary['distinct']} "
+            f"| {_format_stat(summary['min'])} | {_format_stat(summary['max'])} "
+            f"| {quantiles} | {top_values} |\n"
+        )
+    
+    return result
+
+async def db_overview(database_id: int, schema_name: Optional[str] = None, table_pattern: Optional[str] = None, include_hidden: bool = False) -> str:
     """
     Get an overview of all tables in a database without detailed field information.
     
     Args:
         database_id: The ID of the database to get the overview for
+        schema_name: Only include tables in this schema (optional)
+        table_pattern: Only include tables whose name matches this glob pattern, e.g. "order*" (optional)
+        include_hidden: Include tables and fields hidden in Metabase (default: False)
         
     Returns:
         A formatted string with basic information about all tables in the database.
     """
-    response = await MetabaseAPI.get_database_schema(database_id)
+    response = await MetabaseAPI.get_database_schema(database_id, schema_name, table_pattern, include_hidden)
     
-    if response is None or "error" in response:
-        return f"Error fetching database schema: {response.get('message', 'Unknown error')}"
+    if response is None or isinstance(response, dict):
+        return f"Error fetching database schema: {response.get('message', 'Unknown error') if response else 'No response'}"
     
-    tables = response.get('tables', [])
+    tables = response.tables
     if not tables:
         return "No tables found in this database."
     
-    result = f"## Database Overview: {response.get('name')}\n\n"
+    start_phase("render")
+    result = f"## Database Overview: {response.name}\n\n"
+    result += stale_note("schema", response.stale_age)
     
     # Add database details
-    result += f"**ID**: {response.get('id')}\n"
-    result += f"**Engine**: {response.get('engine')}\n"
-    result += f"**Is Sample**: {response.get('is_sample', False)}\n\n"
+    result += f"**ID**: {response.id}\n"
+    result += f"**Engine**: {response.engine}\n"
+    result += f"**Is Sample**: {response.is_sample}\n\n"
     
     # Add tables information in a tabular format
     result += "### Tables\n\n"
@@ -360,23 +471,70 @@ async def db_overview(database_id: int) -> str:
     
     # Add each table as a row
     for table in tables:
-        table_id = table.get('id', 'Unknown')
-        name = table.get('name', 'Unknown')
-        schema = table.get('schema', 'N/A')
-        description = table.get('description', 'No description')
-        field_count = len(table.get('fields', []))
-        
-        # Add null check before using string methods
-        if description is None:
-            description = 'No description'
-        else:
-            # Clean up description for table display (remove newlines but keep full text)
-            description = description.replace('\n', ' ').strip()
+        table_id = table.id or 'Unknown'
+        name = table.name or 'Unknown'
+        schema = table.schema or 'N/A'
+        # Clean up description for table display (remove newlines but keep full text)
+        description = (table.description or 'No description').replace('\n', ' ').strip()
+        field_count = len(table.fields)
         
         result += f"| {table_id} | {name} | {schema} | {description} | {field_count} |\n"
     
     return result
 
+def _format_count(value) -> str:
+    """Format an estimated row count compactly, e.g. 1.2M"""
+    if value is None:
+        return "?"
+    for divisor, suffix in ((1e9, "B"), (1e6, "M"), (1e3, "k")):
+        if value >= divisor:
+            return f"{value / divisor:.1f}{suffix}"
+    return str(value)
+
+async def databases_overview(database_ids: Optional[List[int]] = None, top_tables: int = 5) -> str:
+    """
+    Get a combined overview of several databases at once: engines, table and schema counts, sizes and largest tables.
+    
+    Args:
+        database_ids: IDs of the databases to include (optional, default: all databases)
+        top_tables: Number of largest tables to list per database (default: 5)
+        
+    Returns:
+        A formatted string with a summary table of the databases and the top tables of each.
+    """
+    started = time.perf_counter()
+    response = await MetabaseAPI.get_databases_overview(database_ids, max(top_tables, 0))
+    
+    if response is None or isinstance(response, dict):
+        return f"Error fetching databases overview: {response.get('message', 'Unknown error') if response else 'No response'}"
+    
+    if not response:
+        return "No databases found in Metabase."
+    
+    start_phase("render")
+    elapsed = time.perf_counter() - started
+    result = f"## Databases Overview\n\n{len(response)} database(s) summarized in {elapsed:.1f}s.\n\n"
+    
+    result += "| ID | Name | Engine | Tables | Schemas | Est. Rows |\n"
+    result += "| -- | ---- | ------ | ------ | ------- | --------- |\n"
+    for db in response:
+        if "error" in db:
+            result += f"| {db['id']} | {db['name']} | {db['engine']} | Error: {db['error']} | | |\n"
+        else:
+            result += f"| {db['id']} | {db['name']} | {db['engine']} | {db['tables']} | {db['schemas']} | {_format_count(db['rows'])} |\n"
+    
+    for db in response:
+        if not db.get('top_tables'):
+            continue
+        result += f"\n### {db['name']} (ID: {db['id']})\n\n"
+        for table in db['top_tables']:
+            name = f"{table['schema']}.{table['name']}" if table['schema'] else table['name']
+            rows = f" (~{_format_count(table['rows'])} rows)" if table['rows'] is not None else ""
+            result += f"- {name}{rows}\n"
+    
+    result += "\nUse db_overview or get_database_metadata with a database ID for the tables and fields of one database.\n"
+    return result
+
 async def table_detail(database_id: int, table_id: int) -> str:
     """
     Get detailed information about a specific table.
@@ -394,6 +552,7 @@ async def table_detail(database_id: int, table_id: int) -> str:
     if response is None or "error" in response:
         return f"Error fetching table metadata: {response.get('message', 'Unknown error')}"
     
+    start_phase("render")
     # Extract table information
     table_name = response.get('name', 'Unknown')
     result = f"## Table Details: {table_name}\n\n"
@@ -467,4 +626,321 @@ async def table_detail(database_id: int, table_id: int) -> str:
     result += "\n### Referenced By\n\n"
     result += "*Note: To see all references to this table, use the database visualization tool.*\n"
     
-    return result 
\ No newline at end of file
+    return result
+
+
+async def profile_table_columns(database_id: int, table_id: int, refresh: bool = False) -> str:
+    """
+    Get column statistics and sample values for every field in a table.
+    
+    Args:
+        database_id: The ID of the database containing the table
+        table_id: The ID of the table to profile
+        refresh: Ignore cached profiles and rebuild them from Metabase
+        
+    Returns:
+        A formatted string with per-column statistics and sample values.
+    """
+    response = await MetabaseAPI.profile_table(database_id, table_id, refresh=refresh)
+    
+    if response is None or "error" in response:
+        return f"Error profiling table: {response.get('message', 'Unknown error') if response else 'No response'}"
+    
+    start_phase("render")
+    result = f"## Column Profile: {response.get('name')}\n\n"
+    result += stale_note("profile", response.get('stale_age'))
+    result += f"**ID**: {response.get('id')}\n"
+    result += f"**Schema**: {response.get('schema', 'N/A')}\n"
+    
+    age = int(time.time() - response.get('profiled_at', time.time()))
+    if response.get('cached'):
+        result += f"**Profiled**: {age}s ago (cached)\n\n"
+    else:
+        result += "**Profiled**: just now\n\n"
+    
+    fields = response.get('fields', [])
+    result += f"### Fields ({len(fields)})\n\n"
+    result += "| Field ID | Field Name | Type | Distinct | Null % | Min | Max | Avg | Sample Values | Source |\n"
+    result += "| -------- | ---------- | ---- | -------- | ------ | --- | --- | --- | ------------- | ------ |\n"
+    
+    for profile in fields:
+        null_fraction = profile.get('null_fraction')
+        null_percent = f"{null_fraction * 100:.1f}%" if null_fraction is not None else "N/A"
+        avg = profile.get('avg')
+        avg = f"{avg:.2f}" if isinstance(avg, (int, float)) else "N/A"
+        samples = ", ".join(str(value) for value in profile.get('sample_values', [])) or "N/A"
+        
+        result += (
+            f"| {profile.get('field_id')} | {profile.get('name')} | {profile.get('base_type')} "
+            f"| {_format_stat(profile.get('distinct_count'))} | {null_percent} "
+            f"| {_format_stat(profile.get('min'))} | {_format_stat(profile.get('max'))} | {avg} "
+            f"| {samples} | {profile.get('source') or 'not profiled'} |\n"
+        )
+    
+    return result
+
+def _format_stat(value) -> str:
+    """Format a single profile statistic for a markdown table cell"""
+    if value is None:
+        return "N/A"
+    if isinstance(value, float):
+        return f"{value:.4g}"
+    return str(value).replace('\n', ' ').replace('|', '\\|')
+
+async def get_schema_changes(database_id: int, since_version: int = 0, include_hidden: bool = False) -> str:
+    """
+    Sync the cached schema of a database and report what changed since a version.
+    
+    Args:
+        database_id: The ID of the database to check
+        since_version: Report changes recorded after this schema version (0 for all)
+        include_hidden: Include hidden tables and fields (default: False)
+        
+    Returns:
+        A formatted string with the current schema version and the table and field changes.
+    """
+    schema_filter = SchemaFilter(include_hidden=include_hidden)
+    snapshot = await MetabaseAPI.sync_database_schema(database_id, schema_filter)
+    
+    if snapshot is None or isinstance(snapshot, dict):
+        return f"Error syncing database schema: {snapshot.get('message', 'Unknown error') if snapshot else 'No response'}"
+    
+    start_phase("render")
+    result = f"## Schema Changes: {snapshot.database.name}\n\n"
+    result += stale_note("schema", snapshot.stale_age())
+    result += f"**Current Version**: {snapshot.version}\n"
+    result += f"**Tables**: {len(snapshot.as_record(schema_filter).tables)}\n\n"
+    
+    changes = snapshot.changes_since(since_version)
+    truncated = snapshot.is_truncated_since(since_version)
+    sections = []
+    for change in changes:
+        # Hidden tables are only listed for callers that include them
+        skipped = set() if include_hidden else set(change.get('hidden_tables', []))
+        added_tables = [name for name in change['added_tables'] if name not in skipped]
+        removed_tables = [name for name in change['removed_tables'] if name not in skipped]
+        changed_tables = [
+            table_change if include_hidden else {**table_change, **table_change.get('visible_fields', {})}
+            for table_change in change['changed_tables'] if table_change['table'] not in skipped
+        ]
+        changed_tables = [
+            table_change for table_change in changed_tables
+            if table_change.get('modified_attributes') or table_change['added_fields'] or table_change['removed_fields'] or table_change['modified_fields']
+        ]
+        
+        if change['initial']:
+            lines = f"Initial snapshot with {len(added_tables)} tables.\n"
+        else:
+            lines = ""
+            for table_name in added_tables:
+                lines += f"- **Added table** {table_name}\n"
+            for table_name in removed_tables:
+                lines += f"- **Removed table** {table_name}\n"
+            for table_change in changed_tables:
+                lines += f"- **Changed table** {table_change['table']} (ID: {table_change['table_id']})\n"
+                for description in table_change.get('modified_attributes', []):
+                    lines += f"  - Table {description}\n"
+                for field_name in table_change['added_fields']:
+                    lines += f"  - Added field {field_name}\n"
+                for field_name in table_change['removed_fields']:
+                    lines += f"  - Removed field {field_name}\n"
+                for description in table_change['modified_fields']:
+                    lines += f"  - {description}\n"
+        if not lines:
+            continue
+        
+        timestamp = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(change['timestamp']))
+        sections.append(f"### Version {change['version']} ({timestamp})\n\n{lines}\n")
+    
+    if not sections:
+        result += f"No changes since version {since_version}.\n"
+        return result
+    
+    if truncated:
+        result += f"*Note: Changes before version {changes[0]['version']} are no longer retained; use db_overview for a full listing.*\n\n"
+    
+    return result + "".join(sections)
+
+async def find_join_path(database_id: int, source_table: str, target_table: str, max_paths: int = 3) -> str:
+    """
+    Find the shortest foreign key join paths between two tables and the JOIN clause to use.
+    
+    Args:
+        database_id: The ID of the database containing both tables
+        source_table: ID, name or "schema.table" of the table to start from
+        target_table: ID, name or "schema.table" of the table to reach
+        max_paths: Maximum number of equally short paths to return (default: 3)
+        
+    Returns:
+        A formatted string with each join path and its generated JOIN clause.
+    """
+    response = await MetabaseAPI.find_join_paths(database_id, source_table, target_table, max_paths)
+    
+    if response is None or "error" in response:
+        return f"Error finding join path: {response.get('message', 'Unknown error') if response else 'No response'}"
+    
+    source = response['source']
+    target = response['target']
+    paths = response['paths']
+    start_phase("render")
+    result = f"## Join Path: {source.name} → {target.name}\n\n"
+    result += stale_note("schema", response['stale_age'])
+    
+    if not paths:
+        result += f"No foreign key path connects **{source.name}** (ID: {source.id}) and **{target.name}** (ID: {target.id}).\n"
+        return result
+    
+    if not paths[0]['edges']:
+        result += "Source and target are the same table; no join is needed.\n"
+        return result
+    
+    result += f"Found {len(paths)} shortest path(s) with {len(paths[0]['edges'])} join(s).\n\n"
+    
+    for index, path in enumerate(paths, start=1):
+        result += f"### Path {index}\n\n"
+        for edge in path['edges']:
+            direction = "references" if edge.forward else "is referenced by"
+            result += f"- **{edge.from_table.name}.{edge.from_field.name}** {direction} **{edge.to_table.name}.{edge.to_field.name}**\n"
+        result += f"\n```sql\n{path['sql']}\n```\n\n"
+    
+    return result
+
+async def generate_relationship_diagram(database_id: int, output_format: str = "mermaid", center_table: Optional[str] = None,
+                                        radius: int = 1, cluster_by: str = "schema", max_tables: Optional[int] = None) -> str:
+    """
+    Generate a Mermaid or Graphviz DOT diagram of the foreign keys between tables, bounded in size.
+    
+    Args:
+        database_id: The ID of the database to diagram
+        output_format: "mermaid" or "dot" (default: "mermaid")
+        center_table: ID, name or "schema.table" of a table to center the diagram on (optional)
+        radius: Number of foreign key hops to include around the center table (default: 1)
+        cluster_by: Group tables by "schema", connected "component" or "none" (default: "schema")
+        max_tables: Maximum number of tables to draw (default: DIAGRAM_MAX_TABLES)
+        
+    Returns:
+        A formatted string with the diagram source in a code block.
+    """
+    renderers = {"mermaid": render_mermaid, "dot": render_dot}
+    if output_format not in renderers:
+        return f"Error generating diagram: output_format must be 'mermaid' or 'dot', not '{output_format}'"
+    
+    response = await MetabaseAPI.get_relationship_subgraph(database_id, center_table, radius, cluster_by, max_tables)
+    
+    if response is None or "error" in response:
+        return f"Error generating diagram: {response.get('message', 'Unknown error') if response else 'No response'}"
+    
+    clusters = response['clusters']
+    edges = response['edges']
+    center = response['center']
+    if not clusters:
+        return "No tables found in this database."
+    
+    table_count = sum(len(tables) for tables in clusters.values())
+    start_phase("render")
+    result = f"## Relationship Diagram for: {response['database'].name}\n\n"
+    result += stale_note("schema", response['stale_age'])
+    if center is not None:
+        result += f"Centered on **{center.name}** (ID: {center.id}) with a radius of {radius} hop(s).\n"
+    result += f"{table_count} table(s) and {len(edges)} relationship(s)"
+    if response['omitted']:
+        result += f"; {response['omitted']} less connected table(s) omitted, use center_table to explore them"
+    result += ".\n\n"
+    
+    render = renderers[output_format]
+    result += f"```{output_format}\n{render(clusters, edges, center.id if center else None)}\n```\n"
+    
+    return result
+
+async def run_structured_query(database_id: int, table: str, aggregations: Optional[List[str]] = None,
+                               breakouts: Optional[List[str]] = None, filters: Optional[List[Dict]] = None,
+                               order_by: Optional[List[str]] = None, limit: Optional[int] = None) -> str:
+    """
+    Build a structured (MBQL) query for a table and run it, so Metabase's query cache applies.
+    
+    Args:
+        database_id: The ID of the database containing the table
+        table: ID, name or "schema.table" of the table to query
+        aggregations: "count" or "<op>:<field>" with op one of sum, avg, min, max, distinct, median, stddev,
+            e.g. ["count", "sum:amount"] (optional)
+        breakouts: Fields to group by, with an optional temporal unit, e.g. ["status", "created_at:month"] (optional)
+        filters: Filters combined with AND, e.g. [{"field": "status", "op": "=", "value": "open"}];
+            ops: =, !=, <, <=, >, >=, between, contains, does-not-contain, starts-with, ends-with,
+            is-null, not-null, is-empty, not-empty (optional)
+        order_by: Fields or aggregations with an optional direction, e.g. ["count desc"] (optional)
+        limit: Maximum number of rows (default and maximum: QUERY_JOB_ROW_LIMIT)
+        
+    Returns:
+        A formatted string with the generated MBQL, its fingerprint and the results.
+    """
+    response = await MetabaseAPI.run_structured_query(database_id, table, aggregations, breakouts, filters, order_by, limit)
+    
+    if response is None or "error" in response:
+        return f"Error running structured query: {response.get('message', 'Unknown error') if response else 'No response'}"
+    
+    start_phase("render")
+    result = "## Structured Query Results\n\n"
+    # One top-level clause per line keeps the MBQL readable without nesting every list
+    clauses = ",\n".join(f"  {json.dumps(key)}: {json.dumps(value)}" for key, value in response['dataset_query']['query'].items())
+    result += f"```json\n{{\n{clauses}\n}}\n```\n\n"
+    result += f"**Fingerprint**: {response['fingerprint']}"
+    if response.get('cached'):
+        result += " (served from Metabase's cache)"
+    result += "\n\n"
+    
+    data = response.get('data') or {}
+    columns = [col.get('display_name') or col.get('name', f"Column {i}") for i, col in enumerate(data.get('cols', []))]
+    rows = data.get('rows') or []
+    if not columns or not rows:
+        result += "No data returned by the query.\n"
+        return result
+    
+    shown = rows[:50]
+    result += "| " + " | ".join(columns) + " |\n"
+    result += "| " + " | ".join(["---"] * len(columns)) + " |\n"
+    for row in shown:
+        result += "| " + " | ".join("NULL" if cell is None else _format_stat(cell) for cell in row) + " |\n"
+    
+    row_count = response.get('row_count', len(rows))
+    if row_count > len(shown):
+        result += f"\n*Showing {len(shown)} of {row_count} rows*\n"
+    
+    return result
+
+async def get_server_stats() -> str:
+    """
+    Get the connection warm-up timings, Metabase request counters and cache hit rates of this server process.
+    
+    Returns:
+        A formatted string with the warm-up steps, request counts and cache statistics.
+    """
+    stats = MetabaseAPI.stats()
+    
+    start_phase("render")
+    result = "## Server Statistics\n\n"
+    
+    result += "### Connection Warm-up\n\n"
+    if not connection_warmer.started:
+        result += "Warm-up is disabled; set WARMUP_ENABLED=true to enable it.\n\n"
+    else:
+        result += f"**Status**: {'finished' if connection_warmer.ready else 'in progress'}\n\n"
+        for name, ms in connection_warmer.timings.items():
+            result += f"- {name}: {ms:.0f} ms\n"
+        for name, error in connection_warmer.errors.items():
+            result += f"- {name} failed: {error}\n"
+        result += "\n"
+    
+    result += "### Metabase Requests\n\n"
+    for name, count in stats["requests"].items():
+        result += f"- {name}: {count}\n"
+    result += "\n"
+    
+    result += "### Caches\n\n"
+    result += "| Cache | Hits | Misses | Hit Rate |\n"
+    result += "| --- | --- | --- | --- |\n"
+    for name, cache in stats["caches"].items():
+        lookups = cache["hits"] + cache["misses"]
+        hit_rate = f"{cache['hits'] / lookups:.0%}" if lookups else "-"
+        result += f"| {name} | {cache['hits']} | {cache['misses']} | {hit_rate} |\n"
+    
+    return result
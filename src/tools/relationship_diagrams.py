@@ -0,0 +1,54 @@
+from typing import Dict, List
+from src.api.relationships import JoinEdge
+from src.api.records import TableRecord
+
+def _mermaid_label(text: str) -> str:
+    """Escape text for use inside a quoted Mermaid label"""
+    return str(text).replace('"', '#quot;')
+
+def _dot_label(text: str) -> str:
+    """Escape text for use inside a quoted Graphviz label"""
+    return str(text).replace('\\', '\\\\').replace('"', '\\"')
+
+def render_mermaid(clusters: Dict[str, List[TableRecord]], edges: List[JoinEdge], highlight_id=None) -> str:
+    """Render tables grouped into clusters and their foreign keys as a Mermaid flowchart"""
+    lines = ["flowchart LR"]
+    for index, (cluster, tables) in enumerate(clusters.items()):
+        indent = "    "
+        if cluster:
+            lines.append(f'    subgraph cluster_{index}["{_mermaid_label(cluster)}"]')
+            indent = "        "
+        for table in tables:
+            lines.append(f'{indent}t{table.id}["{_mermaid_label(table.name)}"]')
+        if cluster:
+            lines.append("    end")
+    
+    for edge in edges:
+        label = _mermaid_label(f"{edge.from_field.name} → {edge.to_field.name}")
+        lines.append(f'    t{edge.from_table.id} -->|"{label}"| t{edge.to_table.id}')
+    
+    if highlight_id is not None:
+        lines.append(f"    style t{highlight_id} stroke-width:3px")
+    return "\n".join(lines)
+
+def render_dot(clusters: Dict[str, List[TableRecord]], edges: List[JoinEdge], highlight_id=None) -> str:
+    """Render tables grouped into clusters and their foreign keys as a Graphviz DOT digraph"""
+    lines = ["digraph relationships {", "    rankdir=LR;", "    node [shape=box];"]
+    for index, (cluster, tables) in enumerate(clusters.items()):
+        indent = "    "
+        if cluster:
+            lines.append(f"    subgraph cluster_{index} {{")
+            lines.append(f'        label="{_dot_label(cluster)}";')
+            indent = "        "
+        for table in tables:
+            style = ", penwidth=3" if table.id == highlight_id else ""
+            lines.append(f'{indent}t{table.id} [label="{_dot_label(table.name)}"{style}];')
+        if cluster:
+            lines.append("    }")
+    
+    for edge in edges:
+        label = _dot_label(f"{edge.from_field.name} → {edge.to_field.name}")
+        lines.append(f'    t{edge.from_table.id} -> t{edge.to_table.id} [label="{label}"];')
+    
+    lines.append("}")
+    return "\n".join(lines)
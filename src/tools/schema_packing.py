@@ -0,0 +1,102 @@
+from typing import List, Tuple
+from src.api.relationships import RelationshipGraph
+from src.api.records import TableRecord
+
+# Rough number of characters per token of an assistant's tokenizer, for turning token budgets into characters
+CHARS_PER_TOKEN = 4
+
+# Expected length of a summary line, used to keep room for the tables that are not shown in full
+SUMMARY_LINE_CHARS = 48
+
+# Longest table or field description kept in packed output
+MAX_DESCRIPTION_CHARS = 160
+
+# Most incoming foreign keys listed per table
+MAX_REFERENCES = 5
+
+def _short_type(base_type) -> str:
+    """Strip the "type/" prefix of a Metabase base type"""
+    return str(base_type or "unknown").replace("type/", "")
+
+def _short_description(description) -> str:
+    """Return a description on one line, truncated to MAX_DESCRIPTION_CHARS"""
+    text = " ".join((description or "").split())
+    return text if len(text) <= MAX_DESCRIPTION_CHARS else text[:MAX_DESCRIPTION_CHARS - 1] + "…"
+
+def render_packed_table(table: TableRecord, graph: RelationshipGraph) -> str:
+    """Render a table with its fields and foreign keys in a compact form"""
+    location = f"ID: {table.id}, {table.schema}" if table.schema else f"ID: {table.id}"
+    lines = [f"#### {table.name} ({location})"]
+    if table.description:
+        lines.append(_short_description(table.description))
+    
+    targets = {}
+    references = []
+    for edge in graph.adjacency.get(table.id, []):
+        if edge.forward:
+            targets[edge.from_field.id] = f"{edge.to_table.name}.{edge.to_field.name}"
+        else:
+            references.append(f"{edge.to_table.name}.{edge.to_field.name}")
+    
+    for field in table.fields:
+        line = f"- {field.name}: {_short_type(field.base_type)}"
+        if field.semantic_type == "type/PK":
+            line += ", PK"
+        if field.id in targets:
+            line += f" → {targets[field.id]}"
+        if field.description:
+            line += f" — {_short_description(field.description)}"
+        lines.append(line)
+    
+    if references:
+        shown = ", ".join(references[:MAX_REFERENCES])
+        more = f" and {len(references) - MAX_REFERENCES} more" if len(references) > MAX_REFERENCES else ""
+        lines.append(f"- referenced by: {shown}{more}")
+    return "\n".join(lines) + "\n\n"
+
+def render_summary_line(table: TableRecord) -> str:
+    """Render a one-line summary of a table left out of the detailed section"""
+    qualified = f"{table.schema}.{table.name}" if table.schema else table.name
+    return f"- {qualified} (ID: {table.id}): {len(table.fields)} fields\n"
+
+def pack_tables(ranked: List[Tuple[TableRecord, float]], graph: RelationshipGraph, budget: int) -> str:
+    """Render ranked tables into at most budget characters
+    
+    Tables are rendered in full, most relevant first, until the next one no
+    longer fits while leaving room for summary lines of the rest. The rest are
+    listed one line each until the budget runs out, and whatever is left is
+    counted in a final line. Rendering stops at the first table that does not
+    fit, so the cost is bounded by the budget rather than the schema size.
+    """
+    parts = []
+    used = 0
+    detailed = 0
+    for index, (table, _) in enumerate(ranked):
+        remaining = len(ranked) - index - 1
+        reserve = min(remaining * SUMMARY_LINE_CHARS, budget // 5)
+        block = render_packed_table(table, graph)
+        if used + len(block) > budget - reserve:
+            break
+        parts.append(block)
+        used += len(block)
+        detailed += 1
+    
+    rest = ranked[detailed:]
+    if rest:
+        heading = f"### Other Tables ({len(rest)})\n\n"
+        parts.append(heading)
+        used += len(heading)
+        # Room for the line counting the tables that do not fit
+        footer_room = 80
+        listed = 0
+        for table, _ in rest:
+            line = render_summary_line(table)
+            if used + len(line) > budget - footer_room:
+                break
+            parts.append(line)
+            used += len(line)
+            listed += 1
+        if listed < len(rest):
+            parts.append(f"- … and {len(rest) - listed} more; raise the budget or narrow the focus to see them\n")
+    
+    return "".join(parts)